@@ -0,0 +1,408 @@
+"""
+End-to-end benchmark: the Flask API and the Django app in one process, on generated data.
+
+Usage (from the project root):
+    python benchmarks/e2e.py                                     # 10 stories x 2047 pages, 200 readers, 50 authors
+    python benchmarks/e2e.py --readers 1000 --output /tmp/after.json --compare /tmp/before.json
+
+Flask (create_app) and Django run against temporary SQLite files. Django talks to Flask through its
+usual HTTP client (djangoapp/api_client.py) with a transport adapter that hands each request to the
+Flask WSGI app, so upstream calls are counted and still pay for serialization, minus the network.
+
+Journeys replayed (each one is a fresh logged-in browser):
+    reader: story list -> start -> choices until an ending (or --max-choices) -> stats page
+    author: dashboard -> builder -> page edit form -> save page -> publish (validation)
+
+Reported per journey type: p50/p95/p99 latency, throughput, and per journey the number of requests,
+SQL statements (Flask and Django separately) and upstream HTTP calls; plus latency per step (view).
+Results are written as JSON (--output) so runs can be compared across commits (--compare).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "flask_api"))
+sys.path.insert(0, os.path.join(ROOT, "django", "djangoproject"))
+
+API_KEY = "benchmark-key"
+
+
+# --- Measurements ---
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return None
+    ms = [s * 1000 for s in seconds]
+    return {
+        "p50": round(percentile(ms, 50), 2),
+        "p95": round(percentile(ms, 95), 2),
+        "p99": round(percentile(ms, 99), 2),
+        "mean": round(sum(ms) / len(ms), 2),
+        "max": round(max(ms), 2),
+    }
+
+
+class Counter:
+    """Thread-safe event counter (SQL statements run from request threads and sync_to_async workers)"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.value += 1
+
+
+class Journey:
+    """One replayed journey: wall time, and per step (view) latency"""
+
+    def __init__(self, bench, client):
+        self.bench = bench
+        self.client = client
+        self.steps = []  # (label, seconds)
+
+    def step(self, label, method, url, data=None, expect=(200,)):
+        started = time.perf_counter()
+        response = getattr(self.client, method)(url, data=data)
+        self.steps.append((label, time.perf_counter() - started))
+        if response.status_code not in expect:
+            raise RuntimeError(f"{label}: {method.upper()} {url} returned {response.status_code}")
+        return response
+
+
+class Bench:
+    def __init__(self, flask_app, flask_sql, django_sql, upstream):
+        self.flask_app = flask_app
+        self.flask_sql = flask_sql
+        self.django_sql = django_sql
+        self.upstream = upstream
+        self.results = {}   # journey type -> list of {"seconds", "requests", "flask_sql", "django_sql", "upstream"}
+        self.steps = {}     # label -> [seconds]
+
+    def run(self, kind, client, script, record=True):
+        journey = Journey(self, client)
+        before = (self.flask_sql.value, self.django_sql.value, self.upstream())
+        started = time.perf_counter()
+        script(journey)
+        seconds = time.perf_counter() - started
+        after = (self.flask_sql.value, self.django_sql.value, self.upstream())
+        if not record:
+            return
+        self.results.setdefault(kind, []).append({
+            "seconds": seconds,
+            "requests": len(journey.steps),
+            "flask_sql": after[0] - before[0],
+            "django_sql": after[1] - before[1],
+            "upstream": after[2] - before[2],
+        })
+        for label, step_seconds in journey.steps:
+            self.steps.setdefault(label, []).append(step_seconds)
+
+    def report(self):
+        journeys = {}
+        for kind, runs in self.results.items():
+            total = sum(r["seconds"] for r in runs)
+            requests = sum(r["requests"] for r in runs)
+            journeys[kind] = {
+                "journeys": len(runs),
+                "seconds": round(total, 3),
+                "journeys_per_second": round(len(runs) / total, 2),
+                "requests_per_second": round(requests / total, 2),
+                "latency_ms": latency_summary([r["seconds"] for r in runs]),
+                "per_journey": {
+                    key: round(sum(r[key] for r in runs) / len(runs), 2)
+                    for key in ("requests", "flask_sql", "django_sql", "upstream")
+                },
+            }
+        steps = {
+            label: {"count": len(seconds), "latency_ms": latency_summary(seconds)}
+            for label, seconds in sorted(self.steps.items())
+        }
+        return journeys, steps
+
+
+# --- Setup ---
+
+def boot_flask(db_path, args):
+    from config import Config
+    from sqlalchemy import event
+    from app import create_app
+    from app.extensions import db
+    from app.seed import seed_synthetic
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        API_KEY = API_KEY
+
+    app = create_app(BenchConfig)
+    started = time.perf_counter()
+    with app.app_context():
+        totals = seed_synthetic(args.stories, args.pages, args.shapes, seed=args.seed)
+        sql = Counter()
+        event.listen(db.engine, "before_cursor_execute", sql)
+    totals["seconds"] = round(time.perf_counter() - started, 2)
+    return app, sql, totals
+
+
+class FlaskTransport:
+    """requests transport adapter: sends the request to the Flask app in-process (WSGI) instead of a socket"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+
+    def send(self, request, **kwargs):
+        import requests
+        from urllib.parse import urlsplit
+        url = urlsplit(request.url)
+        result = self.flask_app.test_client().open(
+            url.path, query_string=url.query, method=request.method, headers=dict(request.headers), data=request.body,
+        )
+        response = requests.Response()
+        response.status_code = result.status_code
+        response.headers = requests.structures.CaseInsensitiveDict(result.headers)
+        response._content = result.get_data()
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+def boot_django(db_path, flask_app):
+    import django
+    from django.conf import settings
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    django.setup()
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.ALLOWED_HOSTS.append("testserver")
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+    sql = Counter()
+
+    def count(execute, sql_text, params, many, context):
+        sql()
+        return execute(sql_text, params, many, context)
+
+    def instrument(connection, **kwargs):
+        if count not in connection.execute_wrappers:
+            connection.execute_wrappers.append(count)
+
+    connection_created.connect(instrument, weak=False)
+    for connection in connections.all():
+        instrument(connection)
+
+    from djangoapp.api_client import client
+    transport = FlaskTransport(flask_app)
+    client.session.mount("http://", transport)
+    client.session.mount("https://", transport)
+
+    def upstream_calls():
+        return sum(s["calls"] for s in client.stats().values())
+
+    return sql, upstream_calls
+
+
+def story_plans(flask_app, story_ids):
+    """Choice ids per page for every story (read straight from Flask, outside the measurements)"""
+    client = flask_app.test_client()
+    plans = {}
+    for story_id in story_ids:
+        bundle = client.get(f"/stories/{story_id}/bundle").get_json()
+        plans[story_id] = {
+            "start_page_id": bundle["story"]["start_page_id"],
+            "pages": [int(page_id) for page_id in bundle["pages"]],
+            "texts": {int(page_id): page for page_id, page in bundle["pages"].items()},
+            "choices": {int(page_id): edges for page_id, edges in bundle["choices"].items()},
+        }
+    return plans
+
+
+# --- Journeys ---
+
+def reader_journey(story_id, plan, rng, max_choices):
+    from django.urls import reverse
+
+    def script(j):
+        j.step("story_list", "get", reverse("story_list"))
+        response = j.step("start_story", "get", reverse("start_story", args=[story_id]), expect=(302,))
+        j.step("play_page", "get", response["Location"])
+        page_id = plan["start_page_id"]
+        for _ in range(max_choices):
+            edges = plan["choices"].get(page_id)
+            if not edges:
+                break
+            choice = rng.choice(edges)
+            response = j.step(
+                "choose_page", "post", reverse("choose_page", args=[story_id, page_id, choice["id"]]), expect=(302,)
+            )
+            j.step("play_page", "get", response["Location"])
+            page_id = choice["next_page_id"]
+        j.step("stats_view", "get", reverse("stats_view", args=[story_id]))
+
+    return script
+
+
+def author_journey(story_id, plan, rng):
+    from django.urls import reverse
+
+    def script(j):
+        page_id = rng.choice(plan["pages"])
+        page = plan["texts"][page_id]
+        edit_url = reverse("page_edit", args=[story_id, page_id])
+        j.step("author_story_list", "get", reverse("author_story_list"))
+        j.step("story_structure", "get", reverse("story_structure", args=[story_id]))
+        j.step("page_edit", "get", edit_url)
+        form = {"update_page": "1", "text": page["text"]}
+        if page["is_ending"]:
+            form["is_ending"] = "on"
+        j.step("page_save", "post", edit_url, data=form, expect=(302,))
+        j.step("story_publish", "post", reverse("story_publish", args=[story_id]), expect=(302,))
+
+    return script
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stories", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=2047, help="Pages per story (2^k - 1 gives valid binary trees)")
+    parser.add_argument("--shapes", nargs="+", default=["binary_tree", "layered_dag"],
+                        choices=["binary_tree", "layered_dag", "chain", "with_cycles"])
+    parser.add_argument("--readers", type=int, default=200, help="Reader journeys")
+    parser.add_argument("--authors", type=int, default=50, help="Author journeys")
+    parser.add_argument("--max-choices", type=int, default=30, help="Choices per reader journey at most")
+    parser.add_argument("--warmup", type=int, default=5, help="Unrecorded journeys of each type first")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON results here")
+    parser.add_argument("--compare", help="Previous JSON results to compare p50/p95 against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nahb-bench-")
+    os.environ["FLASK_API_KEY"] = API_KEY
+    os.environ.setdefault("DJANGO_SECRET_KEY", "benchmark")
+    os.environ["DJANGO_SETTINGS_MODULE"] = "djangoproject.settings"
+
+    flask_app, flask_sql, seeded = boot_flask(os.path.join(workdir, "flask.sqlite3"), args)
+    django_sql, upstream_calls = boot_django(os.path.join(workdir, "django.sqlite3"), flask_app)
+    print(f"Seeded {seeded['stories']} stories / {seeded['pages']} pages / {seeded['choices']} choices "
+          f"in {seeded['seconds']}s ({workdir})")
+
+    from django.contrib.auth.models import Group, User
+    from django.test import Client
+    from djangoapp.progress import progress_buffer
+    from djangoapp.stats import play_recorder
+
+    # Synthetic stories belong to author id 1: make that user the author
+    author = User.objects.create_user("bench_author", password="x")
+    author.groups.add(Group.objects.get_or_create(name="Author")[0])
+    readers = [User(username=f"bench_reader_{i}") for i in range(max(1, min(args.readers, 100)))]
+    User.objects.bulk_create(readers)
+    readers = list(User.objects.filter(username__startswith="bench_reader_"))
+
+    story_ids = list(range(1, seeded["stories"] + 1))
+    plans = story_plans(flask_app, story_ids)
+    rng = random.Random(args.seed)
+    bench = Bench(flask_app, flask_sql, django_sql, upstream_calls)
+
+    def browser(user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    for n in range(args.warmup + args.readers):
+        story_id = rng.choice(story_ids)
+        script = reader_journey(story_id, plans[story_id], rng, args.max_choices)
+        bench.run("reader", browser(rng.choice(readers)), script, record=n >= args.warmup)
+
+    for n in range(args.warmup + args.authors):
+        story_id = rng.choice(story_ids)
+        plans[story_id]["texts"] = story_plans(flask_app, [story_id])[story_id]["texts"]  # Current text
+        bench.run("author", browser(author), author_journey(story_id, plans[story_id], rng), record=n >= args.warmup)
+
+    play_recorder.flush()
+    progress_buffer.flush()
+
+    journeys, steps = bench.report()
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "seed": seeded,
+        "journeys": journeys,
+        "steps": steps,
+        "background": {"play_recorder": play_recorder.stats(), "progress_buffer": progress_buffer.stats()},
+    }
+
+    print_report(results, load(args.compare) if args.compare else None)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_report(results, baseline=None):
+    print(f"\n{'journey':<8} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'j/s':>7} "
+          f"{'req':>5} {'flask sql':>9} {'django sql':>10} {'upstream':>8}")
+    for kind, j in results["journeys"].items():
+        lat, per = j["latency_ms"], j["per_journey"]
+        print(f"{kind:<8} {j['journeys']:>5} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9} "
+              f"{j['journeys_per_second']:>7} {per['requests']:>5} {per['flask_sql']:>9} "
+              f"{per['django_sql']:>10} {per['upstream']:>8}")
+
+    print(f"\n{'step':<18} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, s in results["steps"].items():
+        lat = s["latency_ms"]
+        print(f"{label:<18} {s['count']:>6} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9}")
+
+    if baseline:
+        print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta'].get('created_at')})")
+        for kind, j in results["journeys"].items():
+            old = baseline["journeys"].get(kind)
+            if not old:
+                continue
+            deltas = "  ".join(
+                f"{p} {old['latency_ms'][p]} -> {j['latency_ms'][p]} ms "
+                f"({(j['latency_ms'][p] - old['latency_ms'][p]) / old['latency_ms'][p] * 100:+.0f}%)"
+                for p in ("p50", "p95")
+            )
+            print(f"{kind:<8} {deltas}")
+
+
+if __name__ == "__main__":
+    main()
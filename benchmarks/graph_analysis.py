@@ -0,0 +1,40 @@
+"""
+Benchmark the story graph analysis (flask_api/app/analysis.py) on synthetic graphs.
+
+Usage (from the project root):
+    python benchmarks/graph_analysis.py                 # 10^5 and 10^6 pages
+    python benchmarks/graph_analysis.py --sizes 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "flask_api"))
+
+from app.analysis import analyze  # noqa: E402
+from app.seed import SHAPES  # noqa: E402  (pages {id: is_ending}, edges [(src, dst)], start_page_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--graphs", nargs="+", choices=SHAPES, default=list(SHAPES))
+    args = parser.parse_args()
+
+    print(f"{'graph':<12} {'pages':>9} {'edges':>9} {'seconds':>8}  endings  paths")
+    for size in args.sizes:
+        for name in args.graphs:
+            pages, edges, start = SHAPES[name](size)
+            t0 = time.perf_counter()
+            report = analyze(pages, edges, start)
+            elapsed = time.perf_counter() - t0
+
+            paths = report["path_count"]
+            if paths[0].isdigit() and len(paths) > 12:
+                paths = f"~10^{len(paths) - 1}"
+            print(f"{name:<12} {len(pages):>9} {len(edges):>9} {elapsed:>8.2f}  {report['ending_count']:>7}  {paths}")
+
+
+if __name__ == "__main__":
+    main()
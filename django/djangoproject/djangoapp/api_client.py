@@ -0,0 +1,89 @@
+# Shared HTTP client for the Flask API (used by services.py)
+#
+# One requests.Session for the whole process, so connections to Flask are kept alive and reused
+# instead of doing a TCP handshake on every call. The urllib3 pool underneath is thread-safe;
+# the only non thread-safe part of a Session is its cookie jar, which we disable (the API is stateless).
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from http.cookiejar import DefaultCookiePolicy
+from django.conf import settings
+
+
+class FlaskClient:
+    def __init__(self, base_url, pool_size=10, timeout=(2, 5), retries=2, backoff=0.1):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout  # (connect, read) seconds, applied unless the caller passes one
+
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        # Only idempotent reads are retried; writes fail fast so we never apply them twice
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Counters per HTTP method: calls, errors (exception or 5xx), cumulative seconds
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self._record(method, time.perf_counter() - start, failed)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def _record(self, method, seconds, failed):
+        with self._lock:
+            s = self._stats.setdefault(method, {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0})
+            s["calls"] += 1
+            s["errors"] += failed
+            s["seconds"] += seconds
+            s["max_seconds"] = max(s["max_seconds"], seconds)
+
+    def stats(self):
+        """Snapshot of the counters, e.g. {"GET": {"calls", "errors", "seconds", "max_seconds", "avg_ms"}}"""
+        with self._lock:
+            snapshot = {m: dict(s) for m, s in self._stats.items()}
+        for s in snapshot.values():
+            s["avg_ms"] = round(s["seconds"] / s["calls"] * 1000, 2) if s["calls"] else 0
+        return snapshot
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+client = FlaskClient(
+    getattr(settings, 'FLASK_API_URL', 'http://localhost:5000'),
+    pool_size=getattr(settings, 'FLASK_POOL_SIZE', 10),
+    timeout=(getattr(settings, 'FLASK_CONNECT_TIMEOUT', 2), getattr(settings, 'FLASK_READ_TIMEOUT', 5)),
+    retries=getattr(settings, 'FLASK_RETRIES', 2),
+)
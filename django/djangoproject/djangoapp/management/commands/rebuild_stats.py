@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from djangoapp.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the StoryStat / StoryEndingStat / StoryPathStat aggregates from the Play history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--story", type=int, help="Only rebuild this story id")
+
+    def handle(self, *args, **options):
+        count = rebuild_stats(options["story"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {count} stories."))
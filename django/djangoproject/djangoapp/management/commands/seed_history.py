@@ -0,0 +1,106 @@
+import json
+import random
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from djangoapp.models import Play, PlaySession
+from djangoapp.progress import encode_path
+from djangoapp.stats import rebuild_stats
+
+BATCH = 5000
+
+
+def random_walk(choices, start_page_id, rng, max_steps):
+    """(pages visited, choice indices taken) from the start page to an ending, or None if max_steps is hit (cycles)"""
+    pages, path = [start_page_id], []
+    while len(path) < max_steps:
+        targets = choices.get(str(pages[-1]))
+        if not targets:
+            return pages, path
+        index = rng.randrange(len(targets))
+        path.append(index)
+        pages.append(targets[index])
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate Play / PlaySession history for the stories in a `flask seed-synthetic --manifest` file. "
+        "Readers walk random paths, so endings, funnels and resume points look like real traffic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--manifest", required=True, help="NDJSON written by `flask seed-synthetic --manifest`")
+        parser.add_argument("--plays", type=int, default=100, help="Finished plays per story")
+        parser.add_argument("--sessions", type=int, default=20, help="Plays in progress per story")
+        parser.add_argument("--users", type=int, default=50, help="Synthetic readers (created if missing)")
+        parser.add_argument("--max-steps", type=int, default=1000, help="Give up on walks longer than this")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        user_ids = self.readers(options["users"])
+        plays, sessions, story_ids = [], [], []
+        totals = {"plays": 0, "sessions": 0, "abandoned": 0}
+
+        def flush():
+            with transaction.atomic():
+                Play.objects.bulk_create(plays, batch_size=1000)
+                # Re-running with the same manifest moves the synthetic readers instead of failing
+                PlaySession.objects.bulk_create(
+                    sessions, batch_size=1000, update_conflicts=True,
+                    unique_fields=["session_id", "story_id"], update_fields=["current_page_id", "path"],
+                )
+            totals["plays"] += len(plays)
+            totals["sessions"] += len(sessions)
+            plays.clear()
+            sessions.clear()
+
+        with open(options["manifest"]) as manifest:
+            for line in manifest:
+                story = json.loads(line)
+                story_id, choices = story["story_id"], story["choices"]
+                story_ids.append(story_id)
+
+                for _ in range(options["plays"]):
+                    walk = random_walk(choices, story["start_page_id"], rng, options["max_steps"])
+                    if walk is None:
+                        totals["abandoned"] += 1
+                        continue
+                    pages, path = walk
+                    plays.append(Play(
+                        user_id=rng.choice(user_ids), story_id=story_id, ending_page_id=pages[-1], path=encode_path(path),
+                    ))
+
+                for n in range(options["sessions"]):
+                    walk = random_walk(choices, story["start_page_id"], rng, options["max_steps"])
+                    if walk is None:
+                        continue
+                    pages, path = walk
+                    stop = rng.randrange(len(pages))  # Somewhere before (or at) the ending
+                    sessions.append(PlaySession(
+                        session_id=f"synthetic-{story_id}-{n}", story_id=story_id,
+                        current_page_id=pages[stop], path=encode_path(path[:stop]),
+                    ))
+
+                if len(plays) + len(sessions) >= BATCH:
+                    flush()
+        flush()
+
+        for story_id in story_ids:
+            rebuild_stats(story_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['plays']} plays and {totals['sessions']} sessions for {len(story_ids)} stories "
+            f"({totals['abandoned']} walks abandoned after {options['max_steps']} steps)."
+        ))
+
+    def readers(self, count):
+        """Ids of synthetic_reader_1..count, creating the missing ones"""
+        names = [f"synthetic_reader_{i}" for i in range(1, count + 1)]
+        existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+        new_users = [User(username=name) for name in names if name not in existing]
+        for user in new_users:
+            user.set_unusable_password()
+        User.objects.bulk_create(new_users)
+        return list(User.objects.filter(username__in=names).values_list("id", flat=True))
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='play',
+            name='user',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='plays', to=settings.AUTH_USER_MODEL),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='playsession',
+            index=models.Index(fields=['session_id', 'story_id'], name='playsession_session_story_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0002_play_user_playsession_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField(help_text='The ID of the story (from Flask)', unique=True)),
+                ('play_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoryEndingStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField(help_text='The ID of the story (from Flask)')),
+                ('ending_page_id', models.IntegerField(help_text='The ID of the ending page (from Flask)')),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('story_id', 'ending_page_id'), name='storyendingstat_story_ending_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0003_storystat_storyendingstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='play',
+            name='path',
+            field=models.TextField(blank=True, default='', help_text='Choice index taken on every page (see progress.encode_path)'),
+        ),
+        migrations.AddField(
+            model_name='playsession',
+            name='path',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddIndex(
+            model_name='play',
+            index=models.Index(fields=['story_id', 'path'], name='play_story_path_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def drop_duplicate_sessions(apps, schema_editor):
+    """Keep the most recent row of every (session_id, story_id) before making the pair unique"""
+    PlaySession = apps.get_model("djangoapp", "PlaySession")
+    duplicated = (
+        PlaySession.objects.values("session_id", "story_id")
+        .annotate(rows=models.Count("id"))
+        .filter(rows__gt=1)
+    )
+    for key in duplicated.iterator():
+        rows = PlaySession.objects.filter(session_id=key["session_id"], story_id=key["story_id"])
+        keep = rows.order_by("-updated_at", "-id").values_list("id", flat=True).first()
+        rows.exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0004_play_path_playsession_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_sessions, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='playsession',
+            name='playsession_session_story_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='playsession',
+            constraint=models.UniqueConstraint(fields=('session_id', 'story_id'), name='playsession_session_story_uniq'),
+        ),
+    ]
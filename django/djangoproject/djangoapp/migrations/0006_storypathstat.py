@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_paths(apps, schema_editor):
+    """Plays recorded so far (same as `manage.py rebuild_stats` for this table)"""
+    Play = apps.get_model("djangoapp", "Play")
+    StoryPathStat = apps.get_model("djangoapp", "StoryPathStat")
+    StoryPathStat.objects.bulk_create(
+        (StoryPathStat(**row) for row in Play.objects.values("story_id", "path").annotate(count=Count("id")).order_by()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0005_playsession_unique_session_story'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryPathStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField(help_text='The ID of the story (from Flask)')),
+                ('path', models.TextField(blank=True, default='', help_text='Encoded choice path (see progress.encode_path)')),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('story_id', 'path'), name='storypathstat_story_path_uniq')],
+            },
+        ),
+        migrations.RunPython(count_paths, migrations.RunPython.noop),
+    ]
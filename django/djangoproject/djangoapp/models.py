@@ -5,12 +5,19 @@ class Play(models.Model):
     # Store the ID of the story/ending from Flask
     story_id = models.IntegerField(help_text="The ID of the story played (from Flask)")
     ending_page_id = models.IntegerField(help_text="The ID of the final page reached (from Flask)")
+    path = models.TextField(blank=True, default="", help_text="Choice index taken on every page (see progress.encode_path)")
     
     # Track when it happened
     created_at = models.DateTimeField(auto_now_add=True)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='plays')
 
+    class Meta:
+        indexes = [
+            # Covers rebuilding the path counts (GROUP BY path for one story) without touching the table
+            models.Index(fields=["story_id", "path"], name="play_story_path_idx"),
+        ]
+
     def __str__(self):
         return f"Story {self.story_id} finished at {self.created_at}"
 
@@ -18,4 +25,49 @@ class PlaySession(models.Model):
     session_id = models.CharField(max_length=100)
     story_id = models.IntegerField()
     current_page_id = models.IntegerField()
-    updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
+    path = models.TextField(blank=True, default="")  # Choices taken so far (see progress.encode_path)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # One saved position per reader and story. Its index also serves the lookups, which are always
+            # "this browser session (+ this story)": story_list, play_page, resume_story
+            models.UniqueConstraint(fields=["session_id", "story_id"], name="playsession_session_story_uniq"),
+        ]
+
+
+# --- Materialized statistics (kept up to date by stats.record_play, rebuilt by `manage.py rebuild_stats`) ---
+
+class StoryStat(models.Model):
+    story_id = models.IntegerField(unique=True, help_text="The ID of the story (from Flask)")
+    play_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Story {self.story_id}: {self.play_count} plays"
+
+class StoryEndingStat(models.Model):
+    story_id = models.IntegerField(help_text="The ID of the story (from Flask)")
+    ending_page_id = models.IntegerField(help_text="The ID of the ending page (from Flask)")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["story_id", "ending_page_id"], name="storyendingstat_story_ending_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Story {self.story_id}, ending {self.ending_page_id}: {self.count}"
+
+class StoryPathStat(models.Model):
+    # Plays per distinct choice path: the path funnel reads these, not the Play history
+    story_id = models.IntegerField(help_text="The ID of the story (from Flask)")
+    path = models.TextField(blank=True, default="", help_text="Encoded choice path (see progress.encode_path)")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["story_id", "path"], name="storypathstat_story_path_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Story {self.story_id}, path {self.path or '?'}: {self.count}"
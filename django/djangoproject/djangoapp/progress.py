@@ -0,0 +1,274 @@
+# Write-behind store for reading progress (which page each browser session is on, per story).
+#
+# play_page used to write PlaySession on every click (SELECT + UPDATE/INSERT), so the SQLite write lock
+# became the bottleneck with many readers. Now a click only updates memory + the cache; a background
+# thread flushes the latest page per (session, story) to PlaySession in batches.
+#
+# Crash safety: a flush happens at least every PROGRESS_FLUSH_INTERVAL seconds, and as soon as
+# PROGRESS_MAX_PENDING sessions are waiting. A crashed process loses at most that much progress
+# (readers then resume a few pages back). Progress is also flushed on normal shutdown.
+
+import atexit
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import PlaySession
+
+
+##############################  Choice paths  ##############################
+# A reader's path = the index of the choice taken on every page since the start page.
+# Stored compactly (PlaySession.path, Play.path, progress tokens):
+#   binary stories (indices 0/1): bitstring packed in base36, "b" + base36(int("1" + bits, 2))
+#   otherwise one base36 digit per step: "d" + digits
+#   "" = unknown path
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _base36(n):
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = DIGITS[r] + out
+        if not n:
+            return out
+
+
+def encode_path(path):
+    if path is None:
+        return ""
+    if all(i < 2 for i in path):
+        return "b" + _base36(int("1" + "".join(map(str, path)), 2))
+    if all(i < 36 for i in path):
+        return "d" + "".join(DIGITS[i] for i in path)
+    return ""  # Not representable: page only
+
+
+def decode_path(value):
+    """Choice indices, or None if the path is unknown"""
+    if value.startswith("b"):
+        return [int(bit) for bit in bin(int(value[1:], 36))[3:]]  # Drop "0b1"
+    if value.startswith("d"):
+        return [DIGITS.index(c) for c in value[1:]]
+    return None
+
+
+##############################  Write-behind buffer  ##############################
+
+class ProgressBuffer:
+    def __init__(self, flush_interval=5.0, max_pending=1000, cache_ttl=60 * 60):
+        self.flush_interval = flush_interval  # Seconds; 0 = no background thread (flush() by hand)
+        self.max_pending = max_pending
+        self.cache_ttl = cache_ttl
+
+        self._pending = {}                    # (session_id, story_id) -> (page_id, encoded path) or None (= delete)
+        self._lock = threading.Lock()         # Guards _pending
+        self._flush_lock = threading.Lock()   # One flush at a time (background thread vs. stop())
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopping = False
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+
+    # --- Reads / writes (called by the views) ---
+
+    def record(self, session_id, story_id, page_id, path=None):
+        """Remember the current page and the choice path that led to it. No DB access."""
+        state = (page_id, encode_path(path))
+        with self._lock:
+            self._pending[(session_id, story_id)] = state
+            full = len(self._pending) >= self.max_pending
+        cache.set(self._key(session_id, story_id), state, self.cache_ttl)
+
+        self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def get(self, session_id, story_id):
+        """
+        (page_id, path) or None: this process's buffer, then the cache (other workers), then the DB.
+        path is the list of choice indices since the start page (None if unknown).
+        """
+        key = (session_id, story_id)
+        with self._lock:
+            buffered = key in self._pending
+            state = self._pending.get(key)
+        if not buffered:
+            state = cache.get(self._key(session_id, story_id))
+            if state is None:
+                state = (
+                    PlaySession.objects.filter(session_id=session_id, story_id=story_id)
+                    .values_list("current_page_id", "path").first()
+                )
+        if state is None:
+            return None
+        return state[0], decode_path(state[1])
+
+    def merge_pending(self, session_id, story_ids):
+        """story_ids (read from PlaySession) corrected with what hasn't reached the DB yet (this process only)"""
+        story_ids = set(story_ids)
+        with self._lock:
+            for (sid, story_id), state in self._pending.items():
+                if sid == session_id:
+                    if state is None:
+                        story_ids.discard(story_id)
+                    else:
+                        story_ids.add(story_id)
+        return story_ids
+
+    def discard(self, session_id, story_id):
+        """The reader finished the story: forget the progress (the row is deleted with the next batch)"""
+        with self._lock:
+            self._pending[(session_id, story_id)] = None
+        cache.delete(self._key(session_id, story_id))
+        self._ensure_started()
+
+    # --- Flushing ---
+
+    def flush(self):
+        """Write every pending entry to PlaySession (one upsert + one DELETE). Returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            try:
+                written = self._write(batch)
+            except Exception:
+                # Put the batch back (newer clicks recorded meanwhile win) and retry on the next tick
+                with self._lock:
+                    for key, state in batch.items():
+                        self._pending.setdefault(key, state)
+                self.errors += 1
+                raise
+
+            self.flushes += 1
+            self.rows_written += written
+            return written
+
+    def _write(self, batch):
+        now = timezone.now()
+        ended = [key for key, state in batch.items() if state is None]
+        batch = {key: state for key, state in batch.items() if state is not None}
+        with transaction.atomic():
+            deleted = 0
+            if ended:
+                finished = Q()
+                for session_id, story_id in ended:
+                    finished |= Q(session_id=session_id, story_id=story_id)
+                deleted, _ = PlaySession.objects.filter(finished).delete()
+
+            # INSERT ... ON CONFLICT (session_id, story_id) DO UPDATE: no read first, so two processes
+            # flushing the same reader can't both insert (the unique constraint settles it)
+            PlaySession.objects.bulk_create(
+                [
+                    PlaySession(session_id=session_id, story_id=story_id, current_page_id=page_id, path=path, updated_at=now)
+                    for (session_id, story_id), (page_id, path) in batch.items()
+                ],
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["session_id", "story_id"],
+                update_fields=["current_page_id", "path", "updated_at"],
+            )
+
+        return len(batch) + deleted
+
+    def _ensure_started(self):
+        if self._thread is not None or not self.flush_interval:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="progress-flusher", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.flush_interval)  # DB unavailable: back off, the entries are kept
+        connection.close()
+
+    def stop(self):
+        """Stop the background thread and write what's left (called at interpreter exit)"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+        }
+
+    @staticmethod
+    def _key(session_id, story_id):
+        return f"progress:{session_id}:{story_id}"
+
+
+progress_buffer = ProgressBuffer(
+    flush_interval=getattr(settings, 'PROGRESS_FLUSH_INTERVAL', 5.0),
+    max_pending=getattr(settings, 'PROGRESS_MAX_PENDING', 1000),
+)
+
+
+##############################  Stateless mode (PROGRESS_MODE = "token")  ##############################
+# Progress lives in one signed cookie per story instead of PlaySession: no DB access at all until an ending.
+# Value: "<page_id>.<encoded path>". Signing (SECRET_KEY) makes it tamper-proof.
+
+PROGRESS_MODE = getattr(settings, 'PROGRESS_MODE', 'db')
+TOKEN_MAX_AGE = getattr(settings, 'PROGRESS_TOKEN_MAX_AGE', 30 * 24 * 60 * 60)
+TOKEN_SALT = "djangoapp.progress"
+MAX_TOKEN_PATH = 1000  # Longer walks keep the page but forget the path (cookies are limited to ~4 KB)
+
+
+def token_cookie_name(story_id):
+    return f"progress_{story_id}"
+
+
+def read_progress_token(request, story_id):
+    """(page_id, path) from the signed cookie, or None if missing, expired or tampered with"""
+    value = request.get_signed_cookie(token_cookie_name(story_id), default=None, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    if not value:
+        return None
+    try:
+        page_id, path = value.split(".", 1)
+        return int(page_id), decode_path(path)
+    except ValueError:
+        return None
+
+
+def write_progress_token(response, story_id, page_id, path):
+    value = f"{page_id}.{encode_path(path if path is not None and len(path) <= MAX_TOKEN_PATH else None)}"
+    response.set_signed_cookie(
+        token_cookie_name(story_id), value, salt=TOKEN_SALT,
+        max_age=TOKEN_MAX_AGE, httponly=True, samesite="Lax",
+    )
+
+
+def clear_progress_token(response, story_id):
+    response.delete_cookie(token_cookie_name(story_id), samesite="Lax")
+
+
+def story_ids_with_token(request):
+    """Stories this browser has a progress cookie for (unverified: only used for the "resume" badge)"""
+    prefix = token_cookie_name("")
+    return {int(name[len(prefix):]) for name in request.COOKIES if name.startswith(prefix) and name[len(prefix):].isdigit()}
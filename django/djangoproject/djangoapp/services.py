@@ -1,53 +1,195 @@
 # CRUD Service (adapts request method calls to views.py [Adapter Pattern])
 
+import hashlib
+import time
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings 
-from collections import defaultdict
+from django.core.cache import cache
+from .api_client import client
 
-API_URL = getattr(settings, 'FLASK_API_URL', 'http://localhost:5000')
+# Base URL, pooling, timeouts and retries live in api_client.py
 # We need the secret key here
 API_KEY = getattr(settings, 'FLASK_API_KEY', 'my_super_secret_key')
 
+# How long (seconds) we keep a Flask response around for revalidation
+REVALIDATE_TTL = getattr(settings, 'FLASK_REVALIDATE_TTL', 60 * 60)
+
+# Read-through cache: how long content is served without asking Flask at all.
+# Our own writes invalidate immediately; the TTL only bounds staleness for changes made elsewhere.
+STORY_CACHE_TTL = getattr(settings, 'STORY_CACHE_TTL', 5 * 60)  # published stories
+DRAFT_CACHE_TTL = getattr(settings, 'DRAFT_CACHE_TTL', 10)  # drafts / suspended (authors are editing them)
+LIST_CACHE_TTL = getattr(settings, 'LIST_CACHE_TTL', 30)  # story listings
+
 # Helper to inject headers
 def get_headers():
     return {'X-API-KEY': API_KEY, 'Content-Type': 'application/json'}
 
+
+# Ids per batch request (Flask accepts up to 500)
+BULK_CHUNK = 500
+
+
+def _get_bulk(path, ids, fields=None):
+    """GET path?ids=...&fields=... in chunks, merged into {id: item}. Missing ids are left out."""
+    ids = sorted(set(ids))
+    result = {}
+    for i in range(0, len(ids), BULK_CHUNK):
+        params = {'ids': ",".join(str(x) for x in ids[i:i + BULK_CHUNK])}
+        if fields:
+            params['fields'] = ",".join(fields)
+        for item in get_json(path, params=params) or []:
+            result[item['id']] = item
+    return result
+
+
+# Conditional GET helper
+def get_json(path, params=None, **kwargs):
+    """
+    GET a Flask resource and return its JSON body (None unless 200).
+    The last body + ETag are kept in Django's cache; next time we send If-None-Match,
+    and a 304 means we reuse our copy instead of downloading it again.
+    """
+    key = "flask:" + hashlib.md5(f"{path}?{sorted((params or {}).items())}".encode()).hexdigest()
+    cached = cache.get(key)  # (etag, body) or None
+
+    headers = {'If-None-Match': cached[0]} if cached else {}
+    resp = client.get(path, params=params, headers=headers, **kwargs)
+
+    if resp.status_code == 304 and cached:
+        return cached[1]
+    if resp.status_code != 200:
+        return None
+
+    body = resp.json()
+    etag = resp.headers.get('ETag')
+    if etag:
+        cache.set(key, (etag, body), REVALIDATE_TTL)
+    return body
+
+
+##############################  Read-through cache   ##############################
+# Keys embed a version number: story:<id>:v<version>:<what>, stories:v<version>:<params>.
+# Invalidating = bumping the version, so every key of that story becomes unreachable at once
+# (old entries just expire). Works with any Django cache backend (locmem, file, Redis...).
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from a timestamp, not 1: if the version key gets evicted we must not reuse old numbers
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:  # Key missing (evicted / never read): any fresh version will do
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_story(story_id):
+    """Drop everything cached for one story (metadata, bundle, pages, structure)"""
+    _bump(f"story:{story_id}:version")
+
+
+def invalidate_story_lists():
+    """Drop every cached story listing"""
+    _bump("stories:version")
+
+
+def _ttl_for(status):
+    return STORY_CACHE_TTL if status == "published" else DRAFT_CACHE_TTL
+
+
+def _read_through(key, fetch, ttl):
+    """Return cache[key], or fetch() and store it (ttl may be a function of the value). None isn't cached."""
+    value = cache.get(key)
+    if value is None:
+        value = fetch()
+        if value is not None:
+            cache.set(key, value, ttl(value) if callable(ttl) else ttl)
+    return value
+
+
+def _story_key(story_id, what):
+    return f"story:{story_id}:v{_version(f'story:{story_id}:version')}:{what}"
+
+
+def _list_key(path, params):
+    digest = hashlib.md5(f"{path}?{sorted(params.items())}".encode()).hexdigest()
+    return f"stories:v{_version('stories:version')}:{digest}"
+
 ##############################  Story   ##############################
 
 
-# Get all
-def get_all_stories(status=None, author_id=None):
-    params = {}
-    if status: 
+# Get one page of stories (keyset pagination)
+def get_stories_page(status=None, author_id=None, cursor=None, limit=20, fields=None, count=True):
+    """
+    Returns {"items": [...], "next_cursor": str|None, "total": int|None}.
+    Pass the previous page's next_cursor to continue; fields limits the columns sent back.
+    """
+    params = {'limit': limit}
+    if status:
         params['status'] = status
     if author_id:
         params['author_id'] = author_id
-    
+    if cursor:
+        params['cursor'] = cursor
+    if fields:
+        params['fields'] = ",".join(fields)
+    if not count:
+        params['count'] = 0
+
+    empty = {"items": [], "next_cursor": None, "total": 0}
+    try:
+        return _read_through(
+            _list_key("/stories", params), lambda: get_json("/stories", params=params), LIST_CACHE_TTL
+        ) or empty
+    except requests.exceptions.RequestException:
+        return empty
+
+
+# Search (ranked, full-text, published only)
+def search_stories(q, offset=0, limit=20):
+    """Returns {"items": [...], "next_offset": int|None}"""
+    empty = {"items": [], "next_offset": None}
     try:
-        response = requests.get(f"{API_URL}/stories", params=params)
-        return response.json() if response.status_code == 200 else []
+        return get_json("/stories/search", params={'q': q, 'limit': limit, 'offset': offset}) or empty
     except requests.exceptions.RequestException:
-        return []
+        return empty
+
+
+# Get many by id -> {id: story}
+def get_stories_bulk(ids, fields=None):
+    """Resolve any number of story ids with one request per BULK_CHUNK ids"""
+    return _get_bulk("/stories", ids, fields)
 
 
 # Get <id>
 def get_story(story_id):
     """Fetch a single story metadata"""
-    resp = requests.get(f"{API_URL}/stories/{story_id}")
-    return resp.json() if resp.status_code == 200 else None
+    return _read_through(
+        _story_key(story_id, "meta"), lambda: get_json(f"/stories/{story_id}"),
+        lambda story: _ttl_for(story.get("status"))
+    )
 
 
 # Create
 def create_story(data):
     """Send POST request to Flask API to create a story"""
-    resp = requests.post(f"{API_URL}/stories", json=data, headers=get_headers())
+    resp = client.post("/stories", json=data, headers=get_headers())
+    invalidate_story_lists()
     return resp.status_code == 201
 
 
 # Update
 def update_story(story_id, data):
     """Send PUT request to update story"""
-    resp = requests.patch(f"{API_URL}/stories/{story_id}", json=data, headers=get_headers())
+    resp = client.patch(f"/stories/{story_id}", json=data, headers=get_headers())
+    invalidate_story(story_id)
+    invalidate_story_lists()
     return resp.status_code == 200
 
 def update_story_status(story_id, new_status):
@@ -55,123 +197,174 @@ def update_story_status(story_id, new_status):
     Patches the story status via the API.
     """
     payload = {"status": new_status}
-    resp = requests.patch(f"{API_URL}/stories/{story_id}", json=payload, headers=get_headers())
+    resp = client.patch(f"/stories/{story_id}", json=payload, headers=get_headers())
+    # Publish / unpublish / suspend: readers must see the new status right away
+    invalidate_story(story_id)
+    invalidate_story_lists()
     return resp.status_code == 200
 
 # Delete
 def delete_story(story_id):
     """Send DELETE request to Flask API"""
-    requests.delete(f"{API_URL}/stories/{story_id}", headers=get_headers())
+    client.delete(f"/stories/{story_id}", headers=get_headers())
+    invalidate_story(story_id)
+    invalidate_story_lists()
 
 
-def get_start_page_id(story_id):
-    """Ask Flask API where the story begins"""
-    resp = requests.get(f"{API_URL}/stories/{story_id}/start")
-    return (resp.json().get("start_page_id") 
-            if resp.status_code == 200 else None)
+def get_story_bundle(story_id):
+    """Fetch the whole compiled story (metadata, pages, choices) in one call"""
+    return _read_through(
+        _story_key(story_id, "bundle"), lambda: get_json(f"/stories/{story_id}/bundle"),
+        lambda bundle: _ttl_for(bundle["story"].get("status"))
+    )
+
+
+def bundle_page(bundle, page_id):
+    """
+    Build a page payload from a story bundle, shaped like GET /pages/<id>.
+    Returns None if the page is not part of this story.
+    """
+    page = bundle["pages"].get(str(page_id))
+    if page is None:
+        return None
+    story = bundle["story"]
+    return {
+        "id": page_id,
+        "story_id": story["id"],
+        "story_status": story["status"],
+        "text": page["text"],
+        "is_ending": page["is_ending"],
+        "ending_label": page["ending_label"],
+        "choices": bundle["choices"].get(str(page_id), []),
+    }
+
+
+def advance_in_bundle(bundle, from_page_id, choice_id):
+    """POST /stories/<id>/advance resolved against a bundle we already hold. None if the transition is invalid."""
+    for index, choice in enumerate(bundle["choices"].get(str(from_page_id), [])):
+        if choice["id"] == choice_id:
+            page = bundle_page(bundle, choice["next_page_id"])
+            if page is None:
+                return None
+            return {"story": bundle["story"], "page": page, "choice_index": index}
+    return None
+
+
+def advance_story(story_id, from_page_id, choice_id):
+    """
+    Follow choice_id from from_page_id, validated against the story graph.
+    Returns {"story", "page", "choice_index"}, or None if the story is missing or the transition invalid.
+    """
+    # Bundle already cached: same check locally, no HTTP call
+    bundle = cache.get(_story_key(story_id, "bundle"))
+    if bundle is not None:
+        return advance_in_bundle(bundle, from_page_id, choice_id)
+
+    resp = client.post(
+        f"/stories/{story_id}/advance", json={"from_page_id": from_page_id, "choice_id": choice_id},
+        headers=get_headers()
+    )
+    if resp.status_code != 200:
+        return None
+    return resp.json()
 
 ##############################  Page   ##############################
 
+def _invalidate_from(resp):
+    """Page / choice writes: Flask tells us which story changed"""
+    if resp.status_code in (200, 201):
+        story_id = resp.json().get("story_id")
+        if story_id:
+            invalidate_story(story_id)
+
+
 def create_page(story_id, data):
-    resp = requests.post(f"{API_URL}/stories/{story_id}/pages", json=data, headers=get_headers())
+    resp = client.post(f"/stories/{story_id}/pages", json=data, headers=get_headers())
+    invalidate_story(story_id)
     return resp.status_code == 201
 
 def update_page(page_id, data):
-    resp = requests.patch(f"{API_URL}/pages/{page_id}", json=data, headers=get_headers())
+    resp = client.patch(f"/pages/{page_id}", json=data, headers=get_headers())
+    _invalidate_from(resp)
     return resp.status_code == 200
 
 def delete_page(page_id):
-    resp = requests.delete(f"{API_URL}/pages/{page_id}", headers=get_headers())
+    resp = client.delete(f"/pages/{page_id}", headers=get_headers())
+    _invalidate_from(resp)
     return resp.status_code == 200
 
 
 def get_page_content(page_id):
     """Fetch page text and choices"""
-    resp = requests.get(f"{API_URL}/pages/{page_id}")
-    return resp.json() if resp.status_code == 200 else None
+    # Pages never move between stories, so page -> story is cached for good;
+    # the content itself lives under the story's versioned keys
+    story_id = cache.get(f"page:{page_id}:story")
+    if story_id is not None:
+        page = cache.get(_story_key(story_id, f"page:{page_id}"))
+        if page is not None:
+            return page
+
+    page = get_json(f"/pages/{page_id}")
+    if page is not None:
+        cache.set(f"page:{page_id}:story", page["story_id"], None)
+        cache.set(_story_key(page["story_id"], f"page:{page_id}"), page, _ttl_for(page.get("story_status")))
+    return page
 
 
-def get_page_label(page_id):
-    resp = requests.get(f"{API_URL}/pages/{page_id}")
-    return (resp.json().get("ending_label") 
-            if resp.status_code == 200 else f"Ending #{page_id}")
+def get_pages_bulk(ids, fields=None):
+    """Resolve any number of page ids -> {id: page} in one round trip (per BULK_CHUNK ids)"""
+    return _get_bulk("/pages", ids, fields)
+
+
+def get_story_outline(story_id, text="snippet"):
+    """
+    Pages + choices with page text cut server-side (text="snippet") or left out (text="none"),
+    plus title and start_page_id. Enough for the builder lists and dropdowns, even on huge stories.
+    """
+    return _read_through(
+        _story_key(story_id, f"structure:{text}"),
+        lambda: get_json(f"/stories/{story_id}/structure", params={"text": text}),
+        DRAFT_CACHE_TTL,
+    )
 
 ##############################  Page   ##############################
 
 def create_choice(page_id, data):
     # data should be {"text": "...", "target_page_id": 123}
-    resp = requests.post(f"{API_URL}/pages/{page_id}/choices", json=data, headers=get_headers())
+    resp = client.post(f"/pages/{page_id}/choices", json=data, headers=get_headers())
+    _invalidate_from(resp)
     return resp.status_code == 201
 
 def delete_choice(choice_id):
-    resp = requests.delete(f"{API_URL}/choices/{choice_id}", headers=get_headers())
+    resp = client.delete(f"/choices/{choice_id}", headers=get_headers())
+    _invalidate_from(resp)
     return resp.status_code == 200
 
 ##############################  Validation   ##############################
 
 def validate_story_for_publishing(story_id):
-    errors = []
-    
+    """
+    Ask Flask to check the story graph (topology only, cached per story revision).
+    Returns a list of errors; empty means the story can be published.
+    """
     try:
-        resp = requests.get(f"{API_URL}/stories/{story_id}/structure", timeout=5)
-        resp.raise_for_status()
+        report = get_json(f"/stories/{story_id}/validate")
     except requests.RequestException as e:
         return [f"System error: {str(e)}"]
 
-    data = resp.json()
-    # Convert pages to a dict for O(1) lookups: {page_id: page_data}
-    pages_dict = {p['id']: p for p in data.get("pages", [])}
-    choices = data.get("choices", [])
-
-    # Map page_id -> list of choices
-    choices_map = defaultdict(list)
-    for c in choices:
-        choices_map[c['page_id']].append(c)
-
-    # CHECKS
-    if not choices:
-        errors.append("Story is empty (no choices found).")
-        return errors
-
-    # Calculate how many pages contain at least one choice
-    # (A Set comprehension is efficient here)
-    pages_with_choices = {c['page_id'] for c in choices}
-    
-    # Rule 1: At least one branching page
-    if len(pages_with_choices) == 0:
-        # Check if we actually have pages to give a better error
-        if len(pages_dict) > 0:
-            errors.append("Story has pages, but none of them branch. You need at least one page with choices.")
-        else:
-            errors.append("Story is empty (no pages found).")
-            
-        # Fail early because subsequent checks rely on choices existing
-        return errors
-
-    # 2. Iterate every page to validate its individual state
-    for page_id, page_data in pages_dict.items():
-        is_ending = page_data.get('is_ending', False)
-        page_choices = choices_map.get(page_id, [])
-        count = len(page_choices)
-
-        if is_ending:
-            # ENDING PAGE RULES
-            if count > 0:
-                errors.append(f"Page {page_id} is marked as an Ending but has {count} choices. Endings must have 0 choices.")
-        else:
-            # BRANCHING PAGE RULES
-            if count == 0:
-                # This catches the 'Dead End' scenario that the formula misses
-                errors.append(f"Page {page_id} is not an Ending, but has 0 choices. It is a dead end.")
-            elif count != 2:
-                # Rule 2: Exactly 2 choices
-                errors.append(f"Page {page_id} has {count} choices. Must have exactly 2.")
-
-        # 3. Referential Integrity (Dangling Pointers)
-        # Ensure every choice leads to a page that actually exists
-        for choice in page_choices:
-            next_page_id = choice.get("next_page_id")
-            if next_page_id not in pages_dict:
-                errors.append(f"Page {page_id} has a choice pointing to non-existent Page {next_page_id}.")
-
-    return errors
\ No newline at end of file
+    if report is None:
+        return ["Story not found."]
+    return report.get("errors", [])
+
+
+##############################  Async variants   ##############################
+# Used by the async (ASGI) views. The pooled client and the cache are thread-safe, so each call runs
+# in its own worker thread (thread_sensitive=False) and independent fetches can be awaited together.
+
+def _to_async(func):
+    return sync_to_async(func, thread_sensitive=False)
+
+aget_story_bundle = _to_async(get_story_bundle)
+aget_stories_page = _to_async(get_stories_page)
+asearch_stories = _to_async(search_stories)
+aadvance_story = _to_async(advance_story)
@@ -0,0 +1,306 @@
+# Play statistics.
+# Reading raw Play rows on every stats page gets slower as history grows, so play counts are
+# materialized in StoryStat / StoryEndingStat and bumped in the same transaction that records a Play.
+#
+# play_page doesn't write Plays itself: it hands them to play_recorder, which writes them in batches
+# from a background thread (one bulk_create + one counter update per story / ending per batch).
+#
+# Each Play also stores the reader's choice path. Plays per distinct path are materialized too
+# (StoryPathStat), from which path_funnel() derives page visits and choice take rates.
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, deque
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Sum
+from .models import Play, StoryStat, StoryEndingStat, StoryPathStat
+from .progress import decode_path, encode_path
+
+logger = logging.getLogger(__name__)
+
+
+def _increment(model, field, by=1, **keys):
+    """Atomic upsert: UPDATE ... SET field = field + by, INSERT if the row doesn't exist yet"""
+    if model.objects.filter(**keys).update(**{field: F(field) + by}):
+        return
+    try:
+        with transaction.atomic():  # Savepoint: a concurrent insert must not abort the outer transaction
+            model.objects.create(**keys, **{field: by})
+    except IntegrityError:
+        # Someone else created the row between our UPDATE and INSERT
+        model.objects.filter(**keys).update(**{field: F(field) + by})
+
+
+def record_play(user, story_id, ending_page_id, path=None):
+    """Save a finished play (path: choice indices, None if unknown) and update the aggregates, all or nothing"""
+    with transaction.atomic():
+        play = Play.objects.create(user=user, story_id=story_id, ending_page_id=ending_page_id, path=encode_path(path))
+        _increment(StoryStat, "play_count", story_id=story_id)
+        _increment(StoryEndingStat, "count", story_id=story_id, ending_page_id=ending_page_id)
+        _increment(StoryPathStat, "count", story_id=story_id, path=play.path)
+    return play
+
+
+def record_plays(plays):
+    """Batch version of record_play: plays is a list of (user_id, story_id, ending_page_id, encoded path)"""
+    with transaction.atomic():
+        Play.objects.bulk_create(
+            Play(user_id=user_id, story_id=story_id, ending_page_id=ending_page_id, path=path)
+            for user_id, story_id, ending_page_id, path in plays
+        )
+        for story_id, n in Counter(story_id for _, story_id, _, _ in plays).items():
+            _increment(StoryStat, "play_count", by=n, story_id=story_id)
+        for (story_id, ending_page_id), n in Counter((s, e) for _, s, e, _ in plays).items():
+            _increment(StoryEndingStat, "count", by=n, story_id=story_id, ending_page_id=ending_page_id)
+        for (story_id, path), n in Counter((s, p) for _, s, _, p in plays).items():
+            _increment(StoryPathStat, "count", by=n, story_id=story_id, path=path)
+
+
+class PlayRecorder:
+    """
+    In-process queue of finished plays, written by a background thread.
+    A play waits at most max_latency seconds, or less once batch_size plays are queued.
+    When max_queue plays are waiting (DB down / too slow), enqueue() refuses and the caller writes directly.
+    A batch the database rejects is retried one play at a time: plays it still rejects (bad data) are
+    logged and dropped, so one bad row can't hold back the others.
+    """
+
+    def __init__(self, batch_size=100, max_latency=1.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.max_latency = max_latency  # Seconds; 0 = no background thread (flush() by hand)
+        self.max_queue = max_queue
+
+        self._queue = deque()          # (user_id, story_id, ending_page_id, encoded path)
+        self._lock = threading.Lock()  # Guards _queue and the counters
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopping = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+
+    def enqueue(self, user_id, story_id, ending_page_id, path=None):
+        """Queue a finished play. Returns False if the queue is full (write it synchronously instead)."""
+        with self._lock:
+            if len(self._queue) >= self.max_queue or self._stopping:
+                self.rejected += 1
+                return False
+            self._queue.append((user_id, story_id, ending_page_id, encode_path(path)))
+            self.enqueued += 1
+            depth = len(self._queue)
+            self.max_depth = max(self.max_depth, depth)
+
+        self._ensure_started()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Write everything queued, batch_size plays per transaction. Returns the number of plays written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    return written
+
+                start = time.perf_counter()
+                try:
+                    record_plays(batch)
+                    saved = len(batch)
+                except (IntegrityError, DataError):
+                    with self._lock:
+                        self.errors += 1
+                    saved = self._write_one_by_one(batch)
+                except Exception:
+                    with self._lock:
+                        self._queue.extendleft(reversed(batch))  # Keep order, retry on the next tick
+                        self.errors += 1
+                    raise
+
+                with self._lock:
+                    self.written += saved
+                    self.batches += 1
+                    self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+                written += saved
+
+    def _write_one_by_one(self, batch):
+        """A batch with a bad play in it: save the others, drop the bad ones. Returns the number saved."""
+        saved = 0
+        for i, play in enumerate(batch):
+            try:
+                record_plays([play])
+                saved += 1
+            except (IntegrityError, DataError) as e:
+                logger.warning("Dropping play %r: %s", play, e)
+                with self._lock:
+                    self.dropped += 1
+            except Exception:
+                with self._lock:
+                    self._queue.extendleft(reversed(batch[i:]))  # DB unavailable: not the play's fault
+                    self.written += saved
+                raise
+        return saved
+
+    def _ensure_started(self):
+        if self._thread is not None or not self.max_latency:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="play-recorder", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.max_latency)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.max_latency)  # DB unavailable: back off, the plays stay queued
+        connection.close()
+
+    def stop(self):
+        """Graceful shutdown: refuse new plays, let the thread finish, then drain the queue"""
+        with self._lock:
+            self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.max_latency + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": len(self._queue),
+                "max_depth": self.max_depth,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+                "last_flush_ms": self.last_flush_ms,
+            }
+
+
+play_recorder = PlayRecorder(
+    batch_size=getattr(settings, 'PLAY_BATCH_SIZE', 100),
+    max_latency=getattr(settings, 'PLAY_FLUSH_LATENCY', 1.0),
+    max_queue=getattr(settings, 'PLAY_QUEUE_MAX', 10000),
+)
+
+
+def story_ending_counts(story_id):
+    """(total plays, [{"ending_page_id", "count"}, ...]) for one story, read from the aggregates"""
+    total = StoryStat.objects.filter(story_id=story_id).values_list("play_count", flat=True).first() or 0
+    endings = list(
+        StoryEndingStat.objects.filter(story_id=story_id, count__gt=0)
+        .order_by("-count", "ending_page_id")
+        .values("ending_page_id", "count")
+    )
+    return total, endings
+
+
+def path_funnel(story_id, bundle):
+    """
+    Page visits and choice take rates for a story, from the plays per path kept in StoryPathStat.
+    Each distinct path is replayed once through the bundle's choices, weighted by how many plays took it:
+    millions of plays on a story with a few thousand possible paths cost a few thousand rows and replays,
+    and the cost doesn't grow with history.
+    """
+    start_page_id = bundle["story"]["start_page_id"]
+    choices = {int(page_id): edges for page_id, edges in bundle["choices"].items()}
+
+    visits = Counter()
+    taken = Counter()  # (page_id, choice index) -> plays
+    plays = untracked = diverged = 0
+
+    rows = StoryPathStat.objects.filter(story_id=story_id, count__gt=0).values_list("path", "count")
+    for encoded, n in rows.iterator(chunk_size=10000):
+        plays += n
+        path = decode_path(encoded)
+        if path is None:  # Played before paths were recorded (or path unknown)
+            untracked += n
+            continue
+
+        page_id = start_page_id
+        visits[page_id] += n
+        for index in path:
+            edges = choices.get(page_id, ())
+            if index >= len(edges):  # The story changed since this play
+                diverged += n
+                break
+            taken[page_id, index] += n
+            page_id = edges[index]["next_page_id"]
+            visits[page_id] += n
+
+    pages = []
+    for page_id, count in visits.most_common():
+        page = bundle["pages"].get(str(page_id))
+        pages.append({
+            "page_id": page_id,
+            "visits": count,
+            "is_ending": bool(page and page["is_ending"]),
+            "snippet": (page["text"][:60] if page else f"Page #{page_id}"),
+            "choices": [
+                {
+                    "text": edge["text"],
+                    "next_page_id": edge["next_page_id"],
+                    "taken": taken[page_id, index],
+                    "percent": round(taken[page_id, index] / count * 100, 2),
+                }
+                for index, edge in enumerate(choices.get(page_id, ()))
+            ],
+        })
+
+    return {"plays": plays, "tracked": plays - untracked, "diverged": diverged, "pages": pages}
+
+
+def total_plays():
+    return StoryStat.objects.aggregate(total=Sum("play_count"))["total"] or 0
+
+
+def rebuild_stats(story_id=None):
+    """Recompute the aggregates from the Play history (all stories, or just one). Returns the number of stories."""
+    plays = Play.objects.all()
+    stories = StoryStat.objects.all()
+    endings = StoryEndingStat.objects.all()
+    paths = StoryPathStat.objects.all()
+    if story_id is not None:
+        plays = plays.filter(story_id=story_id)
+        stories = stories.filter(story_id=story_id)
+        endings = endings.filter(story_id=story_id)
+        paths = paths.filter(story_id=story_id)
+
+    with transaction.atomic():
+        stories.delete()
+        endings.delete()
+        paths.delete()
+        StoryEndingStat.objects.bulk_create(
+            StoryEndingStat(**row)
+            for row in plays.values("story_id", "ending_page_id").annotate(count=Count("id")).order_by()
+        )
+        StoryPathStat.objects.bulk_create(
+            (StoryPathStat(**row) for row in plays.values("story_id", "path").annotate(count=Count("id")).order_by()),
+            batch_size=1000,
+        )
+        created = StoryStat.objects.bulk_create(
+            StoryStat(**row)
+            for row in plays.values("story_id").annotate(play_count=Count("id")).order_by()
+        )
+    return len(created)
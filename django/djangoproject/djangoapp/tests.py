@@ -1,3 +1,590 @@
+import email.message
+import json
+import os
+import tempfile
+import urllib.request
+from io import StringIO
+from unittest import mock
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from . import services
+from .api_client import FlaskClient
+from .models import Play, PlaySession, StoryEndingStat
+from .progress import ProgressBuffer, decode_path, encode_path
+from .services import advance_in_bundle, get_json, get_pages_bulk
+from .stats import PlayRecorder, path_funnel, rebuild_stats, record_play, story_ending_counts, total_plays
+
+
+def stories_page(count):
+    """Fake Flask /stories envelope with `count` published stories"""
+    return {
+        "items": [
+            {"id": i, "title": f"Story {i}", "description": "", "ending_count": 2, "page_count": 5}
+            for i in range(1, count + 1)
+        ],
+        "next_cursor": None,
+        "total": count,
+    }
+
+
+def flask_response(status_code, body=None, etag=None):
+    """Stand-in for a requests.Response from the Flask API"""
+    response = mock.Mock(status_code=status_code, headers={"ETag": etag} if etag else {})
+    response.json.return_value = body
+    return response
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_304_reuses_cached_body(self):
+        with mock.patch("djangoapp.services.client") as client:
+            client.get.return_value = flask_response(200, {"id": 1, "title": "Cached"}, etag='"story-1-1"')
+            self.assertEqual(get_json("/stories/1"), {"id": 1, "title": "Cached"})
+
+            client.get.return_value = flask_response(304)
+            self.assertEqual(get_json("/stories/1"), {"id": 1, "title": "Cached"})
+
+        self.assertEqual(client.get.call_args.kwargs["headers"], {"If-None-Match": '"story-1-1"'})
+
+    def test_errors_are_not_cached(self):
+        with mock.patch("djangoapp.services.client") as client:
+            client.get.return_value = flask_response(404)
+            self.assertIsNone(get_json("/stories/99"))
+            get_json("/stories/99")
+
+        self.assertEqual(client.get.call_args.kwargs["headers"], {})
+
+
+class BulkLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_ids_are_fetched_in_chunks(self):
+        def pages(path, params, headers):
+            return flask_response(200, [{"id": int(i), "ending_label": f"End {i}"} for i in params["ids"].split(",")])
+
+        with mock.patch("djangoapp.services.client") as client:
+            client.get.side_effect = pages
+            result = get_pages_bulk(list(range(1, 1201)) + [5], fields=["ending_label"])
+
+        self.assertEqual(client.get.call_count, 3)  # 500 + 500 + 200
+        self.assertEqual(client.get.call_args.kwargs["params"]["fields"], "ending_label")
+        self.assertEqual(len(result), 1200)
+        self.assertEqual(result[1200], {"id": 1200, "ending_label": "End 1200"})
+
+    def test_profile_resolves_titles_and_labels_in_one_call_each(self):
+        user = User.objects.create_user("reader", password="pw")
+        for story_id, ending in ((1, 10), (1, 11), (2, 20)):
+            record_play(user, story_id, ending)
+        self.client.force_login(user)
+
+        stories = mock.Mock(return_value={1: {"id": 1, "title": "One"}, 2: {"id": 2, "title": "Two"}})
+        endings = mock.Mock(return_value={10: {"id": 10, "ending_label": "Ten"}})
+        with mock.patch("djangoapp.views.get_stories_bulk", stories), mock.patch("djangoapp.views.get_pages_bulk", endings):
+            response = self.client.get(reverse("user_profile"))
+
+        stories.assert_called_once_with({1, 2}, fields=["title"])
+        endings.assert_called_once_with({10, 11, 20}, fields=["ending_label"])
+        plays = {p.ending_page_id: (p.story_title, p.ending_label) for p in response.context["plays"]}
+        self.assertEqual(plays, {10: ("One", "Ten"), 11: ("One", None), 20: ("Two", None)})
+
+
+class FlaskClientTests(TestCase):
+    def setUp(self):
+        self.client_ = FlaskClient("http://flask.test/", pool_size=4, timeout=(1, 3))
+
+    def test_one_pooled_session_that_retries_reads_only(self):
+        adapter = self.client_.session.get_adapter("http://flask.test/stories")
+        self.assertIs(adapter, self.client_.session.get_adapter("https://flask.test/stories"))
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertTrue(adapter.max_retries.is_retry("GET", 503))
+        self.assertFalse(adapter.max_retries.is_retry("POST", 503))
+        self.assertFalse(adapter.max_retries.is_retry("GET", 500))
+
+    def test_cookies_are_not_kept(self):
+        # What requests does with a Set-Cookie header from Flask
+        headers = email.message.Message()
+        headers["Set-Cookie"] = "session=abc; Path=/"
+        response = mock.Mock(info=mock.Mock(return_value=headers))
+        self.client_.session.cookies.extract_cookies(response, urllib.request.Request("http://flask.test/stories"))
+        self.assertEqual(len(self.client_.session.cookies), 0)
+
+    def test_default_timeout_and_base_url(self):
+        with mock.patch.object(self.client_.session, "request", return_value=flask_response(200)) as request:
+            self.client_.get("/stories", params={"limit": 1})
+            self.client_.post("/stories", timeout=30)
+
+        self.assertEqual(request.call_args_list[0], mock.call("GET", "http://flask.test/stories", params={"limit": 1}, timeout=(1, 3)))
+        self.assertEqual(request.call_args_list[1].kwargs["timeout"], 30)
+
+    def test_stats_count_calls_and_errors(self):
+        responses = [flask_response(200), flask_response(503), requests.ConnectionError()]
+        with mock.patch.object(self.client_.session, "request", side_effect=responses):
+            self.client_.get("/a")
+            self.client_.get("/b")
+            with self.assertRaises(requests.ConnectionError):
+                self.client_.delete("/c")
+
+        stats = self.client_.stats()
+        self.assertEqual((stats["GET"]["calls"], stats["GET"]["errors"]), (2, 1))
+        self.assertEqual((stats["DELETE"]["calls"], stats["DELETE"]["errors"]), (1, 1))
+        self.client_.reset_stats()
+        self.assertEqual(self.client_.stats(), {})
+
+
+class ReadThroughCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("djangoapp.services.client")
+        self.flask = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.flask.get.side_effect = self.flask_get
+        self.flask.patch.return_value = flask_response(200, {"story_id": 1})
+        self.flask.post.return_value = flask_response(201, {"story_id": 1})
+        self.flask.delete.return_value = flask_response(200, {"story_id": 1})
+
+    def flask_get(self, path, params=None, headers=None):
+        bodies = {
+            "/stories/1": {"id": 1, "title": "One", "status": "published"},
+            "/stories/1/bundle": {"story": {"id": 1, "status": "published"}, "pages": {}, "choices": {}},
+            "/pages/7": {"id": 7, "story_id": 1, "story_status": "published", "text": "Hi", "choices": []},
+            "/stories": stories_page(2),
+        }
+        return flask_response(200, bodies.get(path)) if path in bodies else flask_response(404)
+
+    def fetched(self, path):
+        return [c.args[0] for c in self.flask.get.call_args_list].count(path)
+
+    def test_story_is_fetched_once_until_it_changes(self):
+        self.assertEqual(services.get_story(1)["title"], "One")
+        services.get_story(1)
+        self.assertEqual(self.fetched("/stories/1"), 1)
+
+        services.update_story(1, {"title": "Uno"})
+        services.get_story(1)
+        self.assertEqual(self.fetched("/stories/1"), 2)
+
+    def test_missing_story_is_not_cached(self):
+        self.assertIsNone(services.get_story(2))
+        self.assertIsNone(services.get_story(2))
+        self.assertEqual(self.fetched("/stories/2"), 2)
+
+    def test_page_writes_invalidate_the_page_and_bundle(self):
+        services.get_page_content(7)
+        services.get_story_bundle(1)
+        services.get_page_content(7)
+        services.get_story_bundle(1)
+        self.assertEqual((self.fetched("/pages/7"), self.fetched("/stories/1/bundle")), (1, 1))
+
+        services.create_choice(7, {"text": "Go", "target_page_id": 8})
+        services.get_page_content(7)
+        services.get_story_bundle(1)
+        self.assertEqual((self.fetched("/pages/7"), self.fetched("/stories/1/bundle")), (2, 2))
+
+    def test_listings_are_cached_until_a_story_is_created(self):
+        for _ in range(2):
+            self.assertEqual(services.get_stories_page(status="published")["total"], 2)
+        services.get_stories_page(status="draft")
+        self.assertEqual(self.fetched("/stories"), 2)
+
+        services.create_story({"title": "New"})
+        services.get_stories_page(status="published")
+        self.assertEqual(self.fetched("/stories"), 3)
+
+    def test_evicted_version_key_starts_a_new_version(self):
+        services.get_story(1)
+        cache.delete("story:1:version")
+        services.invalidate_story(1)
+        services.get_story(1)
+        self.assertEqual(self.fetched("/stories/1"), 2)
+
+    def test_advance_uses_the_cached_bundle(self):
+        services.get_story_bundle(1)
+        self.assertIsNone(services.advance_story(1, 1, 99))
+        self.flask.post.assert_not_called()
+
+
+class StoryListProgressTests(TestCase):
+    def get_list(self, count):
+        with mock.patch("djangoapp.views.aget_stories_page", mock.AsyncMock(return_value=stories_page(count))):
+            return self.client.get(reverse("story_list"))
+
+    def test_has_progress_flags_saved_sessions(self):
+        self.get_list(1)  # Creates the browser session
+        session_id = self.client.session["session_id"]
+        PlaySession.objects.create(session_id=session_id, story_id=2, current_page_id=7)
+        PlaySession.objects.create(session_id="someone-else", story_id=3, current_page_id=9)
+
+        response = self.get_list(3)
+
+        flags = {s["id"]: s["has_progress"] for s in response.context["stories"]}
+        self.assertEqual(flags, {1: False, 2: True, 3: False})
+
+    def test_query_count_does_not_grow_with_catalogue(self):
+        self.get_list(1)
+        session_id = self.client.session["session_id"]
+        PlaySession.objects.bulk_create(
+            PlaySession(session_id=session_id, story_id=i, current_page_id=1) for i in range(1, 50, 2)
+        )
+
+        with self.assertNumQueries(2):  # Session load + saved progress lookup
+            small = self.get_list(5)
+        with self.assertNumQueries(2):
+            large = self.get_list(500)
+
+        self.assertEqual(sum(s["has_progress"] for s in small.context["stories"]), 3)
+        self.assertEqual(sum(s["has_progress"] for s in large.context["stories"]), 25)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader", password="pw")
+        self.client.force_login(self.user)
+
+    def bundle(self, status="published", start_page_id=5, author_id=None):
+        story = {"id": 1, "status": status, "start_page_id": start_page_id, "author_id": author_id}
+        return mock.patch("djangoapp.views.aget_story_bundle", mock.AsyncMock(return_value={"story": story}))
+
+    def test_search_pages_by_offset(self):
+        results = {"items": stories_page(2)["items"], "next_offset": 20}
+        with mock.patch("djangoapp.views.asearch_stories", mock.AsyncMock(return_value=results)) as search:
+            response = self.client.get(reverse("story_list"), {"q": "Haunted", "cursor": "10"})
+
+        search.assert_awaited_once_with("haunted", offset=10, limit=mock.ANY)
+        self.assertEqual(response.context["next_cursor"], "20")
+        self.assertEqual([s["has_progress"] for s in response.context["stories"]], [False, False])
+
+    def test_start_story_redirects_to_start_page(self):
+        with self.bundle():
+            response = self.client.get(reverse("start_story", args=[1]))
+        self.assertRedirects(response, reverse("play_page", args=[1, 5]), fetch_redirect_response=False)
+
+    def test_start_story_without_start_page_goes_back_to_list(self):
+        with self.bundle(start_page_id=None):
+            response = self.client.get(reverse("start_story", args=[1]))
+        self.assertRedirects(response, reverse("story_list"), fetch_redirect_response=False)
+
+    def test_suspended_story_cannot_be_started(self):
+        with self.bundle(status="suspended"):
+            response = self.client.get(reverse("start_story", args=[1]))
+        self.assertContains(response, "suspended by moderation")
+
+    def test_preview_is_for_the_author_only(self):
+        with self.bundle(status="draft", author_id=self.user.id + 1):
+            self.assertEqual(self.client.get(reverse("start_story", args=[1]), {"preview": 1}).status_code, 403)
+        with self.bundle(status="draft", author_id=self.user.id):
+            response = self.client.get(reverse("start_story", args=[1]), {"preview": 1})
+        self.assertRedirects(response, reverse("play_page", args=[1, 5]) + "?preview=1", fetch_redirect_response=False)
+
+
+class EndingStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader", password="pw")
+
+    def test_record_play_updates_aggregates(self):
+        for ending in (10, 10, 11):
+            record_play(self.user, 1, ending)
+        record_play(self.user, 2, 20)
+
+        total, endings = story_ending_counts(1)
+        self.assertEqual(total, 3)
+        self.assertEqual(endings, [{"ending_page_id": 10, "count": 2}, {"ending_page_id": 11, "count": 1}])
+        self.assertEqual(total_plays(), 4)
+
+    def test_rebuild_matches_history(self):
+        Play.objects.bulk_create(Play(user=self.user, story_id=1, ending_page_id=e) for e in (10, 11, 11))
+        record_play(self.user, 1, 10)  # Aggregates now disagree with the history
+        StoryEndingStat.objects.filter(ending_page_id=10).update(count=99)
+
+        call_command("rebuild_stats", stdout=StringIO())
+
+        total, endings = story_ending_counts(1)
+        self.assertEqual(total, 4)
+        self.assertEqual(endings, [{"ending_page_id": 10, "count": 2}, {"ending_page_id": 11, "count": 2}])
+
+
+class PlayRecorderTests(TestCase):
+    def test_plays_are_written_in_batches(self):
+        user = User.objects.create_user("reader", password="pw")
+        recorder = PlayRecorder(batch_size=4, max_latency=0, max_queue=10)  # No background thread
+
+        with self.assertNumQueries(0):
+            for ending in (10, 10, 11, 10, 11):
+                self.assertTrue(recorder.enqueue(user.id, 1, ending))
+        self.assertEqual(recorder.stats()["queue_depth"], 5)
+
+        self.assertEqual(recorder.flush(), 5)
+        self.assertEqual(recorder.stats()["batches"], 2)
+        self.assertEqual(Play.objects.count(), 5)
+        total, endings = story_ending_counts(1)
+        self.assertEqual(total, 5)
+        self.assertEqual(endings, [{"ending_page_id": 10, "count": 3}, {"ending_page_id": 11, "count": 2}])
+
+    def test_bad_play_is_dropped_not_retried(self):
+        user = User.objects.create_user("reader", password="pw")
+        recorder = PlayRecorder(batch_size=10, max_latency=0, max_queue=10)
+        recorder.enqueue(user.id, 1, 10)
+        recorder.enqueue(None, 1, 10)  # NOT NULL user: fails the whole batch
+        recorder.enqueue(user.id, 1, 11)
+
+        with self.assertLogs("djangoapp.stats", "WARNING"):
+            self.assertEqual(recorder.flush(), 2)
+
+        stats = recorder.stats()
+        self.assertEqual((stats["written"], stats["dropped"], stats["queue_depth"]), (2, 1, 0))
+        self.assertEqual(sorted(Play.objects.values_list("ending_page_id", flat=True)), [10, 11])
+        self.assertEqual(story_ending_counts(1)[0], 2)
+        recorder.stop()  # Nothing left to retry
+
+    def test_anonymous_ending_is_not_queued(self):
+        bundle = {
+            "story": {"id": 1, "status": "published", "start_page_id": 1},
+            "pages": {"1": {"text": "The end", "is_ending": True, "ending_label": "Short"}},
+            "choices": {},
+        }
+        with mock.patch("djangoapp.views.aget_story_bundle", mock.AsyncMock(return_value=bundle)), \
+                mock.patch("djangoapp.views.progress_buffer"), mock.patch("djangoapp.views.play_recorder") as recorder:
+            response = self.client.get(reverse("play_page", kwargs={"story_id": 1, "page_id": 1}))
+
+        self.assertEqual(response.status_code, 200)
+        recorder.enqueue.assert_not_called()
+        self.assertFalse(Play.objects.exists())
+
+    def test_full_queue_refuses(self):
+        recorder = PlayRecorder(batch_size=4, max_latency=0, max_queue=2)
+        self.assertTrue(recorder.enqueue(1, 1, 10))
+        self.assertTrue(recorder.enqueue(1, 1, 10))
+        self.assertFalse(recorder.enqueue(1, 1, 10))
+        self.assertEqual(recorder.stats()["rejected"], 1)
+
+
+class ProgressBufferTests(TestCase):
+    def setUp(self):
+        self.buffer = ProgressBuffer(flush_interval=0)  # No background thread: flush by hand
+
+    def test_clicks_are_batched(self):
+        with self.assertNumQueries(0):
+            self.buffer.record("s1", 1, 10, [0])
+            self.buffer.record("s1", 1, 11, [0, 1])  # Only the latest page is kept
+            self.buffer.record("s2", 1, 20)
+            self.assertEqual(self.buffer.get("s1", 1), (11, [0, 1]))
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(
+            sorted(PlaySession.objects.values_list("session_id", "story_id", "current_page_id")),
+            [("s1", 1, 11), ("s2", 1, 20)],
+        )
+
+        self.buffer.record("s1", 1, 12, [0, 1, 1])
+        self.buffer.flush()
+        self.assertEqual(PlaySession.objects.get(session_id="s1").current_page_id, 12)
+        cache.clear()  # Read back from the DB
+        self.assertEqual(self.buffer.get("s1", 1), (12, [0, 1, 1]))
+        self.assertEqual(PlaySession.objects.count(), 2)
+
+    def test_two_buffers_flushing_one_reader_keep_one_row(self):
+        other = ProgressBuffer(flush_interval=0)  # Another worker process
+        self.buffer.record("s1", 1, 10, [0])
+        other.record("s1", 1, 11, [1])
+
+        self.buffer.flush()
+        other.flush()
+
+        self.assertEqual(list(PlaySession.objects.values_list("current_page_id", "path")), [(11, encode_path([1]))])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PlaySession.objects.create(session_id="s1", story_id=1, current_page_id=12)
+
+    def test_discard_removes_buffered_and_saved_progress(self):
+        self.buffer.record("s1", 1, 10)
+        self.buffer.flush()
+        self.buffer.record("s1", 1, 11)
+
+        with self.assertNumQueries(0):
+            self.buffer.discard("s1", 1)
+            self.assertIsNone(self.buffer.get("s1", 1))
+            self.assertEqual(self.buffer.merge_pending("s1", {1, 2}), {2})
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertFalse(PlaySession.objects.exists())
+
+
+class ProgressTokenTests(TestCase):
+    def test_path_round_trip(self):
+        for path in ([], [0], [1, 0, 1, 1, 0, 0, 0], [0] * 64, [2, 0, 1], None):
+            self.assertEqual(decode_path(encode_path(path)), path)
+        self.assertEqual(len(encode_path([1, 0] * 100)), 40)  # 200 binary choices -> 1 + 39 chars
+
+
+class AdvanceTests(TestCase):
+    # 1 -> 2 (choice 10) | 3 (choice 11), 2 -> 4 (choice 12); endings 3 and 4
+    bundle = {
+        "story": {"id": 1, "status": "published", "start_page_id": 1, "author_id": 1},
+        "pages": {str(i): {"text": f"Page {i}", "is_ending": i in (3, 4), "ending_label": None} for i in (1, 2, 3, 4)},
+        "choices": {
+            "1": [{"id": 10, "text": "A", "next_page_id": 2}, {"id": 11, "text": "B", "next_page_id": 3}],
+            "2": [{"id": 12, "text": "C", "next_page_id": 4}],
+        },
+    }
+
+    def setUp(self):
+        self.buffer = ProgressBuffer(flush_interval=0)
+        self.recorder = PlayRecorder(max_latency=0)
+        advance = mock.AsyncMock(side_effect=lambda story_id, page_id, choice_id: advance_in_bundle(self.bundle, page_id, choice_id))
+        for name, value in [
+            ("aget_story_bundle", mock.AsyncMock(return_value=self.bundle)), ("aadvance_story", advance),
+            ("progress_buffer", self.buffer), ("play_recorder", self.recorder),
+        ]:
+            patcher = mock.patch(f"djangoapp.views.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def play(self, page_id):
+        return self.client.get(reverse("play_page", kwargs={"story_id": 1, "page_id": page_id}))
+
+    def choose(self, page_id, choice_id):
+        return self.client.post(reverse("choose_page", kwargs={"story_id": 1, "page_id": page_id, "choice_id": choice_id}))
+
+    def position(self):
+        return self.buffer.get(self.client.session["session_id"], 1)
+
+    def test_advance_in_bundle_validates_transitions(self):
+        step = advance_in_bundle(self.bundle, 1, 11)
+        self.assertEqual((step["page"]["id"], step["choice_index"]), (3, 1))
+        self.assertIsNone(advance_in_bundle(self.bundle, 2, 11))  # Choice 11 doesn't start on page 2
+        self.assertIsNone(advance_in_bundle(self.bundle, 1, 99))
+
+    def test_choice_redirects_to_the_next_page(self):
+        self.play(1)
+
+        response = self.choose(1, 10)
+
+        self.assertRedirects(response, reverse("play_page", kwargs={"story_id": 1, "page_id": 2}))
+        self.assertEqual(self.position(), (2, [0]))
+        # Refreshing the page shows it again, with the path kept
+        self.assertEqual(self.play(2).context["page"]["id"], 2)
+        self.assertEqual(self.position(), (2, [0]))
+
+    def test_choices_are_not_followed_on_get(self):
+        self.play(1)
+        url = reverse("choose_page", kwargs={"story_id": 1, "page_id": 1, "choice_id": 10})
+
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.position(), (1, []))
+
+    def test_invalid_choice_keeps_position(self):
+        self.play(1)
+
+        response = self.choose(1, 12)  # Choice 12 starts on page 2
+
+        self.assertTemplateUsed(response, "game/error.html")
+        self.assertEqual(self.position(), (1, []))
+
+    def test_page_out_of_reach_redirects_to_resume(self):
+        self.play(1)
+
+        self.assertRedirects(
+            self.play(4), reverse("resume_story", kwargs={"story_id": 1}), fetch_redirect_response=False
+        )
+
+    def test_preview_flag_is_ignored_for_other_readers(self):
+        User.objects.create_user("author", password="pw", id=1)
+        self.client.force_login(User.objects.create_user("reader", password="pw", id=2))
+        self.play(1)
+
+        preview = reverse("play_page", kwargs={"story_id": 1, "page_id": 4}) + "?preview=1"
+        self.assertRedirects(
+            self.client.get(preview), reverse("resume_story", kwargs={"story_id": 1}), fetch_redirect_response=False
+        )
+        self.assertEqual(self.position(), (1, []))
+
+    def test_author_preview_saves_no_progress_or_plays(self):
+        self.client.force_login(User.objects.create_user("author", password="pw", id=1))
+        self.play(1)
+
+        self.assertEqual(self.client.get(reverse("play_page", kwargs={"story_id": 1, "page_id": 2}) + "?preview=1").status_code, 200)
+        response = self.client.post(reverse("choose_page", kwargs={"story_id": 1, "page_id": 2, "choice_id": 12}) + "?preview=1")
+
+        self.assertRedirects(
+            response, reverse("play_page", kwargs={"story_id": 1, "page_id": 4}) + "?preview=1", fetch_redirect_response=False
+        )
+        self.assertEqual(self.position(), (1, []))
+        self.assertEqual(self.recorder.flush(), 0)
+
+    def test_ending_records_play_and_closes_session(self):
+        user = User.objects.create_user("reader", password="pw")
+        self.client.force_login(user)
+        self.play(1)
+        self.choose(1, 10)
+
+        self.assertRedirects(
+            self.choose(2, 12), reverse("play_page", kwargs={"story_id": 1, "page_id": 4}), fetch_redirect_response=False
+        )
+        self.assertEqual(self.play(4).context["page"]["id"], 4)
+
+        self.assertIsNone(self.position())
+        self.assertEqual(self.recorder.flush(), 1)
+        play = Play.objects.get()
+        self.assertEqual((play.user, play.ending_page_id, decode_path(play.path)), (user, 4, [0, 0]))
+
+
+class PathFunnelTests(TestCase):
+    def test_visits_and_take_rates(self):
+        user = User.objects.create_user("reader", password="pw")
+        bundle = {
+            "story": {"start_page_id": 1},
+            "pages": {str(i): {"text": f"Page {i}", "is_ending": i > 2} for i in range(1, 6)},
+            "choices": {
+                "1": [{"text": "Left", "next_page_id": 2}, {"text": "Right", "next_page_id": 3}],
+                "2": [{"text": "Up", "next_page_id": 4}, {"text": "Down", "next_page_id": 5}],
+            },
+        }
+        for path in ([0, 0], [0, 0], [0, 1], [1]):
+            record_play(user, 1, 4, path)
+        recorder = PlayRecorder(max_latency=0)
+        for path in ([1, 1], None):  # [1, 1]: page 3 no longer has choices
+            recorder.enqueue(user.id, 1, 4, path)
+        recorder.flush()
+
+        with self.assertNumQueries(1):  # Plays per path, not the Play history
+            funnel = path_funnel(1, bundle)
+
+        self.assertEqual((funnel["plays"], funnel["tracked"], funnel["diverged"]), (6, 5, 1))
+        pages = {p["page_id"]: p for p in funnel["pages"]}
+        self.assertEqual({i: p["visits"] for i, p in pages.items()}, {1: 5, 2: 3, 3: 2, 4: 2, 5: 1})
+        self.assertEqual([c["taken"] for c in pages[1]["choices"]], [3, 2])
+        self.assertEqual([c["percent"] for c in pages[2]["choices"]], [66.67, 33.33])
+
+        Play.objects.all().delete()  # The funnel doesn't read history...
+        self.assertEqual(path_funnel(1, bundle), funnel)
+        rebuild_stats(1)  # ...until the aggregates are rebuilt from it
+        self.assertEqual(path_funnel(1, bundle)["plays"], 0)
+
+
+class SeedHistoryTests(TestCase):
+    def test_walks_follow_the_manifest(self):
+        # 1 -> 2 | 3, 2 -> 4 | 5; endings 3, 4, 5
+        manifest = {"story_id": 7, "start_page_id": 1, "choices": {"1": [2, 3], "2": [4, 5], "3": [], "4": [], "5": []}}
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as f:
+            f.write(json.dumps(manifest) + "\n")
+
+        call_command("seed_history", manifest=f.name, plays=50, sessions=5, users=3, stdout=StringIO())
+        os.unlink(f.name)
+
+        total, endings = story_ending_counts(7)
+        self.assertEqual(total, 50)
+        self.assertEqual(sum(e["count"] for e in endings), 50)
+        for play in Play.objects.filter(story_id=7):
+            page = 1
+            for index in decode_path(play.path):
+                page = manifest["choices"][str(page)][index]
+            self.assertEqual(page, play.ending_page_id)
+        self.assertEqual(PlaySession.objects.filter(story_id=7).count(), 5)
+        self.assertEqual(User.objects.filter(username__startswith="synthetic_reader_").count(), 3)
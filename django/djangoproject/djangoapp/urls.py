@@ -18,6 +18,8 @@ urlpatterns = [
     # keep story_id in the URL so we can save it to the DB when the game ends
     # path("play/<int:page_id>/", views.play_page, name="story_play"),
     path("stories/<int:story_id>/play/<int:page_id>/", views.play_page, name="play_page"),
+    # Following a choice (validated transition)
+    path("stories/<int:story_id>/play/<int:page_id>/choice/<int:choice_id>/", views.choose_page, name="choose_page"),
 
     # Resuming story
     path("stories/<int:story_id>/resume/", views.resume_story, name="resume_story"),
@@ -1,32 +1,66 @@
 from django.shortcuts import render, redirect
-from django.db.models import Count
 from django.urls import reverse
 from django.contrib import messages  # Messages to client
 from django.views.decorators.http import require_POST
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, User
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.conf import settings 
 from django.http import HttpResponseForbidden
+import asyncio
 import uuid
 import requests
+from asgiref.sync import sync_to_async
 from .models import Play, PlaySession
+from .progress import (
+    PROGRESS_MODE, progress_buffer, read_progress_token, write_progress_token, clear_progress_token,
+    story_ids_with_token,
+)
+from .stats import record_play, play_recorder, path_funnel, story_ending_counts, total_plays
 from .forms import StoryForm, PageForm, ChoiceForm, RegisterForm
 from .services import (
-    get_all_stories, get_story, create_story, update_story,
-    delete_story, get_page_content, get_start_page_id, get_page_label,
+    get_story, create_story, update_story,
+    delete_story, get_page_content, get_story_bundle, bundle_page,
     validate_story_for_publishing, update_story_status, create_page, update_page, delete_page, create_choice, delete_choice,
+    get_story_outline, get_stories_page, get_pages_bulk, get_stories_bulk,
+    aget_story_bundle, aget_stories_page, asearch_stories, aadvance_story,
 )
 from django.contrib.auth.forms import AuthenticationForm
 
 
-API_URL = getattr(settings, 'FLASK_API_URL', 'http://localhost:5000')
+STORIES_PER_PAGE = getattr(settings, 'STORIES_PER_PAGE', 20)
 
 def get_session_id(request):
     if "session_id" not in request.session:
         request.session["session_id"] = str(uuid.uuid4())
     return request.session["session_id"]
 
+async def aget_session_id(request):
+    session_id = await request.session.aget("session_id")
+    if session_id is None:
+        session_id = str(uuid.uuid4())
+        await request.session.aset("session_id", session_id)
+    return session_id
+
+async def aget_reader(request):
+    """(user, session_id). Both read the session, so they run one after the other"""
+    user = await request.auser()
+    return user, await aget_session_id(request)
+
+async def aget_story_ids_in_progress(request):
+    """Ids of every story this browser session has saved progress in (one indexed query + the write-behind buffer)"""
+    if PROGRESS_MODE == "token":
+        return story_ids_with_token(request)  # Stateless: the cookies are the progress
+    session_id = await aget_session_id(request)
+    saved = {
+        story_id async for story_id in
+        PlaySession.objects.filter(session_id=session_id).values_list("story_id", flat=True)
+    }
+    return progress_buffer.merge_pending(session_id, saved)
+
+# Templates read request.user lazily (sync ORM), so async views render in the sync thread
+arender = sync_to_async(render)
+
 # --- AUTHENTICATION ---
 
 # --- CUSTOM REGISTRATION ---
@@ -75,6 +109,9 @@ def is_author(user):
     # User is Author if in 'Author' group OR is an Admin
     return user.groups.filter(name='Author').exists() or user.is_staff
 
+async def ais_author(user):
+    return user.is_staff or await user.groups.filter(name='Author').aexists()
+
 def is_admin(user):
     return user.is_staff
 
@@ -85,10 +122,15 @@ def user_profile(request):
     Requirement: Readers can view their own history.
     """
     # Fetch plays by THIS user
-    user_plays = Play.objects.filter(user=request.user).order_by('-created_at')
+    user_plays = list(Play.objects.filter(user=request.user).order_by('-created_at'))
     
-    # Optional: Enhance with story titles if your API supports bulk fetching or caching
-    # For now, we display ID and Date
+    # Enhance with story titles and ending labels: one batch request each
+    stories = get_stories_bulk({p.story_id for p in user_plays}, fields=["title"])
+    endings = get_pages_bulk({p.ending_page_id for p in user_plays}, fields=["ending_label"])
+    for p in user_plays:
+        p.story_title = stories.get(p.story_id, {}).get("title")
+        p.ending_label = endings.get(p.ending_page_id, {}).get("ending_label")
+
     return render(request, 'game/profile.html', {'plays': user_plays})
 
 
@@ -100,16 +142,22 @@ def admin_dashboard(request):
     """
     # 1. Global Stats
     total_users = User.objects.count()
-    total_plays = Play.objects.count()
+    plays_count = total_plays()  # From the per-story aggregates, not the Play history
     
-    # 2. Moderation List (Get ALL stories, including suspended)
-    # We assume our service get_all_stories can accept a flag or we fetch raw
-    all_stories = get_all_stories() # Flask returns everything to admin logic usually
+    # 2. Moderation List (ALL stories, including suspended), one page at a time
+    cursor = request.GET.get("cursor")
+    page = get_stories_page(
+        cursor=cursor, limit=STORIES_PER_PAGE, fields=["title", "status"]
+    )
     
     return render(request, 'game/admin_dashboard.html', {
         'total_users': total_users,
-        'total_plays': total_plays,
-        'stories': all_stories
+        'total_plays': plays_count,
+        'recorder': play_recorder.stats(),
+        'stories': page["items"],
+        'total_stories': page["total"],
+        'cursor': cursor,
+        'next_cursor': page["next_cursor"],
     })
 
 # --- MODERATION ACTION ---
@@ -141,48 +189,66 @@ def unsuspend_story(request, story_id):
 #############  Story CRUD  #############
 
 # --- READ ---
-def story_list(request):
-    stories = get_all_stories(status="published")  # Fetch all stories from Flask
+async def story_list(request):
     query = request.GET.get("q", "").strip().lower()  # Search query
+    cursor = request.GET.get("cursor")
+    next_cursor = None
+    total = None
 
     if query:
-        # Filter by title (case-insensitive)
-        stories = [s for s in stories if query in s.get("title", "").lower()]
-    
-    # Get current session ID
-    session_id = get_session_id(request)
+        # Ranked full-text search in Flask (cursor is the result offset here)
+        offset = int(cursor) if cursor and cursor.isdigit() else 0
+        fetch = asearch_stories(query, offset=offset, limit=STORIES_PER_PAGE)
+    else:
+        # Fetch one page of published stories from Flask
+        fetch = aget_stories_page(
+            status="published", cursor=cursor, limit=STORIES_PER_PAGE,
+            fields=["title", "description", "ending_count", "page_count"]
+        )
+
+    # Upstream fetch and saved progress lookup in parallel
+    results, in_progress = await asyncio.gather(fetch, aget_story_ids_in_progress(request))
 
-    # For each story, check if there's a saved PlaySession
+    if query:
+        stories = results["items"]
+        if results["next_offset"] is not None:
+            next_cursor = str(results["next_offset"])
+    else:
+        stories, next_cursor, total = results["items"], results["next_cursor"], results["total"]
+
+    # Flag stories with a saved PlaySession (one query for the whole page, see above)
     for s in stories:
-        s["has_progress"] = PlaySession.objects.filter(
-            session_id=session_id,
-            story_id=s["id"]
-        ).exists()
-
-    # If Admin, fetch suspended ones too for moderation
-    if request.user.is_staff:
-        # Custom logic needed in service to fetch all, or filter client side
-        # For now, let's assume get_all_stories handles standard display
-        pass
-
-    return render(request, 'game/story_list.html', {
+        s["has_progress"] = s["id"] in in_progress
+
+    return await arender(request, 'game/story_list.html', {
         'stories': stories,
-        'search_query': request.GET.get("q", "")
+        'search_query': request.GET.get("q", ""),
+        'total_stories': total,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
     })
 
 @login_required
-def author_story_list(request):
-    if not is_author(request.user):
+async def author_story_list(request):
+    user = await request.auser()
+    if not await ais_author(user):
         messages.error(request, "You need an Author account to view this.")
         return redirect('story_list')
 
-    # Fetch ONLY this user's stories (or all if admin)
-    if request.user.is_staff:
-        stories = get_all_stories() # Admin sees everything
-    else:
-        stories = get_all_stories(author_id=request.user.id) # Filtered by ID
+    # Fetch ONLY this user's stories (or all if admin), one page at a time
+    cursor = request.GET.get("cursor")
+    author_id = None if user.is_staff else user.id  # Admin sees everything
+    page = await aget_stories_page(
+        author_id=author_id, cursor=cursor, limit=STORIES_PER_PAGE,
+        fields=["title", "description", "status"]
+    )
     
-    return render(request, "game/author_list.html", {"stories": stories})
+    return await arender(request, "game/author_list.html", {
+        "stories": page["items"],
+        "total_stories": page["total"],
+        "cursor": cursor,
+        "next_cursor": page["next_cursor"],
+    })
 
 # --- CREATE ---
 @login_required
@@ -310,17 +376,22 @@ def story_delete(request, story_id):
 
 #############  Gameplay  #############
 @login_required
-def start_story(request, story_id):
+async def start_story(request, story_id):
     """
     Redirects the user to the first page of a story.
     Handles preview mode (for draft stories) without recording stats.
     """
     
-    start_page_id = get_start_page_id(story_id)
-    
-    story = get_story(story_id)
-    if story['status'] == 'suspended' and not request.user.is_staff:
-        return render(request, 'game/error.html', {
+    # One upstream call (the bundle carries both the status and the start page), made while we load the user
+    bundle, user = await asyncio.gather(aget_story_bundle(story_id), request.auser())
+    if not bundle:
+        return redirect("story_list")
+
+    story = bundle["story"]
+    start_page_id = story.get("start_page_id")
+
+    if story['status'] == 'suspended' and not user.is_staff:
+        return await arender(request, 'game/error.html', {
             'message': '⛔ This story has been suspended by moderation and cannot be played.'
         })
     
@@ -328,7 +399,7 @@ def start_story(request, story_id):
     preview = request.GET.get("preview")
     if preview:
         # Permission: You can only preview YOUR OWN story
-        if str(story.get('author_id')) != str(request.user.id):
+        if not is_previewer(story, user):
              return HttpResponseForbidden("You cannot preview a draft that isn't yours.")
 
     # Check if the story actually has a start page
@@ -354,89 +425,196 @@ def start_story(request, story_id):
     return redirect(url)
 
 
-def play_page(request, story_id, page_id):
+def is_previewer(story, user):
+    """Only the author may preview a story (play it without stats, opening any page)"""
+    return str(story.get('author_id')) == str(user.id)
+
+
+async def aget_player(request):
+    """(user, session_id). In token mode there is no browser session id (stateless: no session write)."""
+    if PROGRESS_MODE == "token":
+        return await request.auser(), None
+    return await aget_reader(request)
+
+
+async def aget_position(request, story_id, session_id):
+    """The reader's saved (page_id, path) in this story, or None"""
+    if PROGRESS_MODE == "token":
+        return read_progress_token(request, story_id)
+    return await sync_to_async(progress_buffer.get)(session_id, story_id)
+
+
+async def play_page(request, story_id, page_id):
     """
-    1. Fetches page content (text + choices) from Flask.
-    2. Checks if it is an ENDING.
-    3. If ending -> Save stats to Django DB.
+    Shows a page reached without a choice: the start page, or the page the reader is already on
+    (resume / refresh). Following a choice goes through choose_page, which validates the transition.
     """
-    story = get_story(story_id)
+    bundle, (user, session_id) = await asyncio.gather(aget_story_bundle(story_id), aget_player(request))
+    if not bundle:
+        return await arender(request, "game/error.html", {"message": "Story not found"})
+
+    # A. Fetch Content (from the bundle, no extra call)
+    page_content = bundle_page(bundle, page_id)
     
+    if not page_content:
+        return await arender(request, "game/error.html", {"message": "Page not found"})
+
+    # ?preview=1 from anyone but the author is ignored: they read like everybody else
+    preview = request.GET.get("preview") and is_previewer(bundle["story"], user)
+
+    if page_id == bundle["story"]["start_page_id"]:
+        path = []  # (Re)starting
+    else:
+        position = await aget_position(request, story_id, session_id)
+        if position and position[0] == page_id:
+            path = position[1]
+        elif preview or user.is_staff:
+            path = None  # Authors previewing / moderators may open any page
+        else:
+            # Not reachable without a choice: back to where the reader really is
+            return redirect("resume_story", story_id=story_id)
+
+    # A start page that is an ending is a whole play: recorded here, since no choice leads to it
+    return await show_page(
+        request, bundle["story"], page_content, user, session_id, path, preview,
+        record=page_id == bundle["story"]["start_page_id"]
+    )
+
+
+@require_POST
+async def choose_page(request, story_id, page_id, choice_id):
+    """
+    Follows choice_id from page_id. The transition is validated against the story graph
+    (the cached bundle, or one POST /stories/<id>/advance call).
+    POST, then a redirect to play_page: refreshing the next page doesn't follow the choice again.
+    """
+    step, (user, session_id) = await asyncio.gather(
+        aadvance_story(story_id, page_id, choice_id), aget_player(request)
+    )
+    if step is None:
+        return await arender(request, "game/error.html", {"message": "This choice is not available."})
+
+    story, page = step["story"], step["page"]
     # SUSPENSION CHECK
-    if story['status'] == 'suspended' and not request.user.is_staff:
+    if story['status'] == 'suspended' and not user.is_staff:
         return redirect('story_list')
 
+    # Extend the saved path if the reader is where the choice starts (else: back button, path unknown)
+    position = await aget_position(request, story_id, session_id)
+    if position and position[0] == page_id and position[1] is not None:
+        path = position[1] + [step["choice_index"]]
+    else:
+        path = None
 
-    # A. Fetch Content
-    page_content = get_page_content(page_id)
-    
-    if not page_content:
-        return render(request, "game/error.html", {"message": "Page not found"})
+    preview = request.GET.get("preview") and is_previewer(story, user)
+    if page["is_ending"] and not preview:
+        await record_ending(user, story_id, page["id"], path)
 
-    session_id = get_session_id(request)
+    url = reverse("play_page", kwargs={"story_id": story_id, "page_id": page["id"]})
+    if preview:
+        url += "?preview=1"
+    response = redirect(url)
+    # play_page shows the page the reader is now on (and closes the reading session if it is an ending)
+    if not preview:
+        await save_position(response, story_id, session_id, page["id"], path, finished=False)
+    return response
 
-    # save / update session
-    PlaySession.objects.update_or_create(
-        session_id=session_id,
-        story_id=story_id,
-        defaults={"current_page_id": page_id}
-    )
 
-    # Play page will skip stats if preview
-    preview = request.GET.get("preview")
+async def record_ending(user, story_id, page_id, path):
+    """
+    Record a finished play: queued, written in the next batch with the aggregates.
+    Plays belong to a user, so anonymous readers' endings aren't recorded.
+    """
+    if not user.is_authenticated:
+        return
+    if not play_recorder.enqueue(user.id, story_id, page_id, path):
+        await sync_to_async(record_play)(user, story_id, page_id, path)  # Queue full: write it now
 
-    # Record the play if ending reached
-    if page_content.get("is_ending") and not preview:
-        Play.objects.create(
-            user=request.user,
-            story_id=story_id,
-            ending_page_id=page_id
-        )
 
-        PlaySession.objects.filter(
-            session_id=session_id,
-            story_id=story_id
-        ).delete()
+async def save_position(response, story_id, session_id, page_id, path, finished):
+    """Save progress (write-behind buffer, or a signed cookie on the response in token mode), or clear it once finished"""
+    if PROGRESS_MODE == "token":
+        if finished:
+            clear_progress_token(response, story_id)
+        else:
+            write_progress_token(response, story_id, page_id, path)
+    elif finished:
+        await sync_to_async(progress_buffer.discard)(session_id, story_id)  # Close the reading session
+    else:
+        # save / update session (write-behind: memory + cache now, PlaySession in the next batch)
+        await sync_to_async(progress_buffer.record)(session_id, story_id, page_id, path)
+
+
+async def show_page(request, story, page_content, user, session_id, path, preview, record=False):
+    """
+    Renders a page for play_page:
+    1. Suspension check.
+    2. If record and the page is an ENDING -> Save stats to Django DB (skipped in preview).
+       Otherwise endings are recorded by choose_page, which reaches them.
+    3. Saves progress, or closes the reading session on an ending (neither in preview).
+    """
+    story_id = story["id"]
+    page_id = page_content["id"]
+
+    # SUSPENSION CHECK
+    if story['status'] == 'suspended' and not user.is_staff:
+        return redirect('story_list')
+
+    finished = page_content.get("is_ending") and not preview
+    if finished and record:
+        await record_ending(user, story_id, page_id, path)
 
     # render game ui
-    return render(request, "game/play.html", {
+    response = await arender(request, "game/play.html", {
         "story_id": story_id,
         "page": page_content,
         "preview": preview
     })
 
+    if not preview:
+        await save_position(response, story_id, session_id, page_id, path, finished)
+    return response
+
 
-def resume_story(request, story_id):
-    session_id = request.session.get("session_id")
+async def resume_story(request, story_id):
+    if PROGRESS_MODE == "token":
+        token = read_progress_token(request, story_id)  # Verified signature, no DB access
+        if token:
+            return redirect("play_page", story_id=story_id, page_id=token[0])
+        return redirect("start_story", story_id=story_id)
+
+    session_id = await request.session.aget("session_id")
     if not session_id:
         return redirect("start_story", story_id=story_id)
 
-    session = PlaySession.objects.filter(
-        session_id=session_id,
-        story_id=story_id
-    ).first()
+    # Read through the write-behind buffer: the latest page may not be in PlaySession yet
+    progress = await sync_to_async(progress_buffer.get)(session_id, story_id)
 
-    if session:
-        return redirect("play_page", story_id=story_id, page_id=session.current_page_id)
+    if progress:
+        return redirect("play_page", story_id=story_id, page_id=progress[0])
     return redirect("start_story", story_id=story_id)
 
 #############  View Statistics  #############
 
 def stats_view(request, story_id):
-    plays = Play.objects.filter(story_id=story_id)
-    total = plays.count()
-    
-    endings = plays.values("ending_page_id").annotate(count=Count("id"))
+    # Materialized counts and paths (see stats.py): cost doesn't depend on how many plays were recorded
+    total, endings = story_ending_counts(story_id)
+
+    # Ending labels and the choice graph for the funnel, in one (cached) request
+    bundle = get_story_bundle(story_id) or {"story": {"start_page_id": None}, "pages": {}, "choices": {}}
+    pages = bundle["pages"]
 
     for e in endings:
         #percentage
         e["percent"] = round(e["count"] / total * 100, 2) if total else 0
-        #ending label
-        e["label"] = get_page_label(e["ending_page_id"])
+        #ending label (deleted pages keep a generic name)
+        page = pages.get(str(e["ending_page_id"]))
+        e["label"] = page.get("ending_label") if page else f"Ending #{e['ending_page_id']}"
 
     return render(request, "game/stats.html", {
         "total": total,
         "endings": endings,
+        "funnel": path_funnel(story_id, bundle),
         # "page": None,  # optional, only for preview
     })
 
@@ -449,25 +627,24 @@ def story_structure(request, story_id):
     """
     Lists all pages and acts as the 'Builder' home.
     """
-    # Reuse your existing validation logic to fetch the full structure (Pages + Choices)
-    # Or just fetch pages if you have a specific endpoint. 
-    # Let's assume we use the structure endpoint which returns everything.
+    # Page snippets only (truncated by Flask), with the start page id and title in the same payload
     try:
-        resp = requests.get(f"{API_URL}/stories/{story_id}/structure")
-        data = resp.json()
-    except:
+        data = get_story_outline(story_id)
+    except requests.RequestException:
+        data = None
+    if data is None:
         messages.error(request, "Could not load story structure.")
         return redirect('author_story_list')
 
     pages = data.get('pages', [])
     # Mark the start page visually
-    start_page_id = get_start_page_id(story_id)
+    start_page_id = data.get('start_page_id')
 
     return render(request, 'game/builder/structure.html', {
         'story_id': story_id,
         'pages': pages,
         'start_page_id': start_page_id,
-        'story_title': data.get('title', 'Story')  # Assuming structure returns metadata too
+        'story_title': data.get('title', 'Story')
     })
 
 
@@ -498,7 +675,7 @@ def page_edit_view(request, story_id, page_id):
 
     # 2. Fetch All Pages (for the Choice Target Dropdown)
     # We need a list of tuples: [(id, "id - snippet"), ...]
-    struct_resp = requests.get(f"{API_URL}/stories/{story_id}/structure").json()
+    struct_resp = get_story_outline(story_id) or {}
     all_pages = struct_resp.get('pages', [])
     
     # Exclude current page from targets (prevent self-loops if you want, though valid in some games)
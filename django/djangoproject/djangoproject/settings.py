@@ -120,6 +120,25 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache (Flask content read-through cache, see services.py)
+# Local memory by default; point DJANGO_CACHE_BACKEND / DJANGO_CACHE_LOCATION at a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache + redis://127.0.0.1:6379) when running several workers.
+
+DJANGO_CACHE_BACKEND = os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': DJANGO_CACHE_BACKEND,
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'nahb-content'),
+    }
+}
+if DJANGO_CACHE_BACKEND.endswith(('LocMemCache', 'FileBasedCache')):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('DJANGO_CACHE_MAX_ENTRIES', 10000))}
+
+STORY_CACHE_TTL = int(os.getenv('STORY_CACHE_TTL', 300))
+DRAFT_CACHE_TTL = int(os.getenv('DRAFT_CACHE_TTL', 10))
+LIST_CACHE_TTL = int(os.getenv('LIST_CACHE_TTL', 30))
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
@@ -127,4 +146,26 @@ STATIC_URL = 'static/'
 
 # Global Variables
 FLASK_API_URL = os.getenv('FLASK_API_URL', 'http://127.0.0.1:5000')
-FLASK_API_KEY = os.getenv('FLASK_API_KEY') # Shared key
\ No newline at end of file
+FLASK_API_KEY = os.getenv('FLASK_API_KEY') # Shared key
+
+# Flask HTTP client (djangoapp/api_client.py)
+# Pool size = max concurrent upstream calls per process, i.e. the number of threads per WSGI worker
+FLASK_POOL_SIZE = int(os.getenv('FLASK_POOL_SIZE', os.getenv('WEB_THREADS', 10)))
+FLASK_CONNECT_TIMEOUT = float(os.getenv('FLASK_CONNECT_TIMEOUT', 2))
+FLASK_READ_TIMEOUT = float(os.getenv('FLASK_READ_TIMEOUT', 5))
+FLASK_RETRIES = int(os.getenv('FLASK_RETRIES', 2))  # GET only
+
+# Reading progress write-behind (djangoapp/progress.py)
+# At most PROGRESS_FLUSH_INTERVAL seconds / PROGRESS_MAX_PENDING sessions of progress can be lost if a process crashes
+PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 5))
+PROGRESS_MAX_PENDING = int(os.getenv('PROGRESS_MAX_PENDING', 1000))
+
+# "db": PlaySession rows (through the buffer above). "token": stateless signed cookie per story, no DB writes until an ending
+PROGRESS_MODE = os.getenv('PROGRESS_MODE', 'db')
+PROGRESS_TOKEN_MAX_AGE = int(os.getenv('PROGRESS_TOKEN_MAX_AGE', 30 * 24 * 60 * 60))
+
+# Finished plays are queued and written in batches (djangoapp/stats.py): at most PLAY_BATCH_SIZE plays
+# per transaction, each waiting at most PLAY_FLUSH_LATENCY seconds. Beyond PLAY_QUEUE_MAX queued plays, writes are direct.
+PLAY_BATCH_SIZE = int(os.getenv('PLAY_BATCH_SIZE', 100))
+PLAY_FLUSH_LATENCY = float(os.getenv('PLAY_FLUSH_LATENCY', 1.0))
+PLAY_QUEUE_MAX = int(os.getenv('PLAY_QUEUE_MAX', 10000))
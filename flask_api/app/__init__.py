@@ -1,12 +1,33 @@
+import os
 from flask import Flask
 from flask_cors import CORS
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
 from config import Config
-from .extensions import db
+from .extensions import db, migrate
+from .cache import story_cache, validation_cache
 from .routes import main_bp
+from .search import init_search
+from .analysis import analysis_cache
+from .metrics import metrics
+from .seed import seed_synthetic_command
 
 # This file replaces the top of our old app.py. It initializes the app and "registers" the other pieces.
 # Initialize app + Configs
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+BASELINE_REVISION = "0001_baseline"
+
+
+def upgrade_schema():
+    """Apply pending migrations (same as `flask db upgrade`). Needs an app context."""
+    tables = inspect(db.engine).get_table_names()
+    if "story" in tables and "alembic_version" not in tables:
+        # Database made by db.create_all() before migrations existed: it is the baseline schema
+        stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+    upgrade(directory=MIGRATIONS_DIR)
+
+
 def create_app(config_class=Config):
     # Create WSGI app instance
     app = Flask(__name__)
@@ -16,6 +37,15 @@ def create_app(config_class=Config):
 
     # Bind app to DB obj, maintaining Application Factory pattern
     db.init_app(app)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR)  # `flask db ...` commands
+
+    # Compiled story graph cache (sized from config)
+    story_cache.init_app(app)
+    validation_cache.clear()
+    analysis_cache.clear()
+
+    # Per-route latency / bytes / SQL counters, served on GET /metrics
+    metrics.init_app(app)
 
     # Allow communication between frontend and backend
     CORS(app)
@@ -23,8 +53,15 @@ def create_app(config_class=Config):
     # Register Routes
     app.register_blueprint(main_bp)
 
-    # Create DB (Level 10 only)
+    # `flask seed-synthetic` (large synthetic datasets, see seed.py)
+    app.cli.add_command(seed_synthetic_command)
+
+    # Schema is managed by migrations (flask_api/migrations); apply them on startup unless disabled
     with app.app_context():
-        db.create_all()
+        if app.config["AUTO_MIGRATE"]:
+            upgrade_schema()
+
+        # Full-text search tables (FTS5 on SQLite, LIKE fallback elsewhere)
+        init_search(app)
 
     return app
\ No newline at end of file
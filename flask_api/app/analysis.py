@@ -0,0 +1,225 @@
+from collections import deque
+from math import log10
+from .cache import RevisionCache
+from .validation import load_topology, story_revision
+
+# Story graph analysis: reachability, orphans, cycles, endings, depths and number of distinct paths.
+# Everything is O(V + E): pages are mapped to dense indices and walked with plain lists.
+# The functions below take raw (pages, edges, start) so they can be benchmarked without a database
+# (see benchmarks/graph_analysis.py).
+
+# Cap on how many cycles / orphan ids a report lists (counts are always exact)
+MAX_LISTED = 100
+
+# Path counts with more digits are reported as a lower bound ">=10^N" (str() refuses ints over 4300 digits)
+MAX_PATH_COUNT_DIGITS = 1000
+PATH_COUNT_LIMIT = 10 ** MAX_PATH_COUNT_DIGITS
+
+analysis_cache = RevisionCache()
+
+
+def build_adjacency(pages, edges):
+    """Dense index: ids[i] is a page id, adj[i] the indices it links to (dangling targets are skipped)."""
+    ids = list(pages)
+    index = {page_id: i for i, page_id in enumerate(ids)}
+    adj = [[] for _ in ids]
+    for page_id, next_page_id in edges:
+        src = index.get(page_id)
+        dst = index.get(next_page_id)
+        if src is not None and dst is not None:
+            adj[src].append(dst)
+    return ids, index, adj
+
+
+def bfs_depths(adj, start):
+    """Shortest number of choices from start to every page (-1 = unreachable)."""
+    depth = [-1] * len(adj)
+    depth[start] = 0
+    queue = deque([start])
+    while queue:
+        u = queue.popleft()
+        d = depth[u] + 1
+        for v in adj[u]:
+            if depth[v] == -1:
+                depth[v] = d
+                queue.append(v)
+    return depth
+
+
+def find_cycles(adj):
+    """Strongly connected components that contain a cycle (iterative Tarjan, no recursion limit)."""
+    n = len(adj)
+    order = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    counter = 0
+    cycles = []
+
+    for root in range(n):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+
+        while work:
+            v, i = work[-1]
+            edges = adj[v]
+            if i < len(edges):
+                work[-1] = (v, i + 1)
+                w = edges[i]
+                if order[w] == -1:
+                    order[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w] and order[w] < low[v]:
+                    low[v] = order[w]
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[v] < low[parent]:
+                    low[parent] = low[v]
+
+            if low[v] == order[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component.append(w)
+                    if w == v:
+                        break
+                if len(component) > 1 or v in adj[v]:
+                    cycles.append(component)
+
+    return cycles
+
+
+def count_paths(adj, start, reachable, endings):
+    """
+    Number of distinct start -> ending paths (Python ints, so no overflow).
+    DP in topological order (Kahn) over the reachable subgraph.
+    Returns None if the count is infinite (an ending can be reached through a cycle).
+    """
+    indegree = [0] * len(adj)
+    for u in reachable:
+        for v in adj[u]:
+            indegree[v] += 1
+
+    paths = [0] * len(adj)
+    paths[start] = 1
+    done = [False] * len(adj)
+    queue = deque([start]) if indegree[start] == 0 else deque()
+    while queue:
+        u = queue.popleft()
+        done[u] = True
+        for v in adj[u]:
+            paths[v] += paths[u]
+            indegree[v] -= 1
+            if indegree[v] == 0:
+                queue.append(v)
+
+    # Pages Kahn couldn't order sit on (or behind) a cycle: infinite if any of them leads to an ending
+    stuck = [u for u in reachable if not done[u]]
+    if stuck:
+        seen = set(stuck)
+        queue = deque(stuck)
+        while queue:
+            u = queue.popleft()
+            if u in endings:
+                return None
+            for v in adj[u]:
+                if v not in seen:
+                    seen.add(v)
+                    queue.append(v)
+
+    return sum(paths[e] for e in endings if done[e])
+
+
+def format_path_count(path_count):
+    """Decimal string, ">=10^N" past MAX_PATH_COUNT_DIGITS digits, or "infinite" for None."""
+    if path_count is None:
+        return "infinite"
+    if path_count < PATH_COUNT_LIMIT:
+        return str(path_count)
+    # 2^(bits - 1) <= path_count, so 10^exponent <= path_count (no decimal conversion needed)
+    exponent = int((path_count.bit_length() - 1) * log10(2))
+    return f">=10^{exponent}"
+
+
+def analyze(pages, edges, start_page_id):
+    """
+    pages: {page_id: is_ending}, edges: [(page_id, next_page_id), ...]
+    Returns a JSON-ready report.
+    """
+    ids, index, adj = build_adjacency(pages, edges)
+
+    cycles = find_cycles(adj)
+    cycle_pages = sum(len(c) for c in cycles)
+
+    start = index.get(start_page_id)
+    if start is None:
+        depth = [-1] * len(ids)
+    else:
+        depth = bfs_depths(adj, start)
+
+    reachable = [i for i, d in enumerate(depth) if d != -1]
+    unreachable = [ids[i] for i, d in enumerate(depth) if d == -1]
+    endings = {i for i in reachable if pages[ids[i]]}
+    ending_depths = {ids[i]: depth[i] for i in sorted(endings, key=lambda i: ids[i])}
+
+    if start is None:
+        path_count = 0
+    else:
+        path_count = count_paths(adj, start, reachable, endings)
+
+    return {
+        "page_count": len(ids),
+        "choice_count": len(edges),
+        "reachable_count": len(reachable),
+        "unreachable_count": len(unreachable),
+        "unreachable_pages": unreachable[:MAX_LISTED],
+        "has_cycles": bool(cycles),
+        "cycle_count": len(cycles),
+        "cycle_pages": cycle_pages,
+        "cycles": [sorted(ids[i] for i in c) for c in cycles[:MAX_LISTED]],
+        "ending_count": len(endings),
+        "ending_depths": ending_depths,
+        "min_depth": min(ending_depths.values(), default=None),
+        "max_depth": max(ending_depths.values(), default=None),
+        # String: the count grows exponentially with depth and won't fit in JSON numbers
+        "path_count": format_path_count(path_count),
+    }
+
+
+def analyze_story(story_id):
+    """Analysis report for the current revision of a story (cached per revision). None if missing."""
+    revision = story_revision(story_id)
+    if revision is None:
+        return None
+
+    def compute():
+        topology = load_topology(story_id)
+        report = analyze(topology.pages, topology.edges, topology.start_page_id)
+        report.update({"story_id": story_id, "revision": topology.revision})
+        return report
+
+    return analysis_cache.get_or_compute(story_id, revision, compute)
+
+
+def store_analysis(story):
+    """Compute and save the summary columns on the Story row (done at publish time, before commit)."""
+    topology = load_topology(story.id, cached=False)
+    # The request may set start_page_id along with the status: use the row being written
+    report = analyze(topology.pages, topology.edges, story.start_page_id)
+    story.page_count = report["page_count"]
+    story.ending_count = report["ending_count"]
+    story.max_depth = report["max_depth"]
+    story.path_count = report["path_count"]
+    return report
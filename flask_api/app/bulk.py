@@ -0,0 +1,239 @@
+import json
+import time
+from sqlalchemy import insert, update
+from .extensions import db
+from .models import Story, Page, Choice
+from .analysis import analyze
+from . import search
+
+# Whole-story import (POST /stories/import). Export is the streamed structure with full text (see streaming.py).
+#
+# The import reads the same records the export writes: a "story", its "page"s, then its "choice"s.
+# Ids in the document are local to it and remapped to new database ids server-side.
+# Pages are written with multi-row INSERT ... RETURNING (new ids come back in input order),
+# choices with executemany, all in one transaction. A 50k-page story is one request and a few
+# dozen statements instead of one HTTP call + commit per page and per choice.
+
+INSERT_BATCH = 5000  # Rows per INSERT statement
+
+# Status in the document -> status of the imported copy. A suspended story (moderation) comes back as a draft.
+IMPORT_STATUSES = {"draft": "draft", "published": "published", "suspended": "draft"}
+
+
+class ImportFormatError(ValueError):
+    """The document is malformed (reported as 400 by the route)"""
+
+
+def _local_id(record, key, kind):
+    value = record.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ImportFormatError(f"{kind} {key} must be an integer or a string, got {value!r}")
+    return value
+
+
+def _record(record, kind):
+    if not isinstance(record, dict):
+        raise ImportFormatError(f"Every {kind} must be a JSON object")
+    return record
+
+
+def _text(record, key, kind, max_length=None, required=True):
+    value = record.get(key)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str) or (required and not value):
+        raise ImportFormatError(f"{kind} {key} is required and must be a string")
+    if max_length is not None and len(value) > max_length:
+        raise ImportFormatError(f"{kind} {key} is longer than {max_length} characters")
+    return value
+
+
+class StoryImporter:
+    """
+    Feed records in order (story, pages, choices), then call finish() to commit.
+    Rows are flushed to the DB every INSERT_BATCH records, so page text isn't held in memory.
+    """
+
+    def __init__(self, max_pages, batch_size=INSERT_BATCH):
+        self.max_pages = max_pages
+        self.batch_size = batch_size
+        self.started = time.perf_counter()
+
+        self.story_id = None
+        self.status = None
+        self.local_start = None
+        self.id_map = {}          # local page id -> new page id
+        self.endings = {}         # new page id -> is_ending (for the published summary)
+        self.edges = []           # (new page id, new next_page_id)
+        self.page_count = 0
+        self.choice_count = 0
+
+        self._pages = []          # (local id, row) waiting to be inserted
+        self._choices = []
+        self._seen_pages = set()
+        self._pages_done = False  # Once choices start, every page must be known
+
+    # --- Records ---
+
+    def add(self, record):
+        """Dispatch an NDJSON record on its "type"."""
+        if not isinstance(record, dict):
+            raise ImportFormatError("Every record must be a JSON object")
+        kind = record.get("type")
+        if kind == "story":
+            self.story(record)
+        elif kind == "page":
+            self.page(record)
+        elif kind == "choice":
+            self.choice(record)
+        else:
+            raise ImportFormatError(f"Unknown record type {kind!r}")
+
+    def story(self, record):
+        if self.story_id is not None:
+            raise ImportFormatError("Only one story per import")
+        self.status = _record(record, "story").get("status", "draft")
+        if self.status not in IMPORT_STATUSES:
+            raise ImportFormatError(f"story status must be one of {', '.join(IMPORT_STATUSES)}")
+        self.status = IMPORT_STATUSES[self.status]
+        if record.get("start_page_id") is not None:
+            self.local_start = _local_id(record, "start_page_id", "story")
+        author_id = record.get("author_id", 1)
+        if isinstance(author_id, bool) or not isinstance(author_id, int):
+            raise ImportFormatError("story author_id must be an integer")
+
+        self.story_id = db.session.execute(
+            insert(Story.__table__).values(
+                title=_text(record, "title", "story", 100),
+                description=_text(record, "description", "story", 500, required=False) or "",
+                status="draft",  # Switched at finish(), once the graph is in
+                author_id=author_id,
+                revision=1,
+            ).returning(Story.__table__.c.id)
+        ).scalar_one()
+
+    def page(self, record):
+        if self.story_id is None:
+            raise ImportFormatError("The story record must come first")
+        if self._pages_done:
+            raise ImportFormatError("Pages must come before choices")
+        local = _local_id(_record(record, "page"), "id", "page")
+        if local in self._seen_pages:
+            raise ImportFormatError(f"Duplicate page id {local!r}")
+        self.page_count += 1
+        if self.page_count > self.max_pages:
+            raise ImportFormatError(f"At most {self.max_pages} pages per import")
+        self._seen_pages.add(local)
+
+        self._pages.append((local, {
+            "story_id": self.story_id,
+            "text": _text(record, "text", "page"),
+            "is_ending": bool(record.get("is_ending", False)),
+            "ending_label": _text(record, "ending_label", "page", 100, required=False),
+        }))
+        if len(self._pages) >= self.batch_size:
+            self._flush_pages()
+
+    def choice(self, record):
+        if self.story_id is None:
+            raise ImportFormatError("The story record must come first")
+        if not self._pages_done:
+            self._flush_pages()
+            self._pages_done = True
+
+        page_id = self.id_map.get(_local_id(_record(record, "choice"), "page_id", "choice"))
+        if page_id is None:
+            raise ImportFormatError(f"Choice from unknown page {record['page_id']!r}")
+        next_page_id = None
+        if record.get("next_page_id") is not None:
+            next_page_id = self.id_map.get(_local_id(record, "next_page_id", "choice"))
+            if next_page_id is None:
+                raise ImportFormatError(f"Choice to unknown page {record['next_page_id']!r}")
+
+        self.choice_count += 1
+        self.edges.append((page_id, next_page_id))
+        self._choices.append({"page_id": page_id, "text": _text(record, "text", "choice", 200), "next_page_id": next_page_id})
+        if len(self._choices) >= self.batch_size:
+            self._flush_choices()
+
+    # --- Writes ---
+
+    def _flush_pages(self):
+        if not self._pages:
+            return
+        new_ids = db.session.execute(
+            insert(Page.__table__).returning(Page.__table__.c.id, sort_by_parameter_order=True),
+            [row for _, row in self._pages],
+        ).scalars().all()
+        for (local, row), new_id in zip(self._pages, new_ids):
+            self.id_map[local] = new_id
+            self.endings[new_id] = row["is_ending"]
+        self._pages = []
+
+    def _flush_choices(self):
+        if self._choices:
+            db.session.execute(insert(Choice.__table__), self._choices)
+            self._choices = []
+
+    def finish(self):
+        """Write what's left, set the start page / status / summary and commit. Returns the import report."""
+        if self.story_id is None:
+            raise ImportFormatError("Missing story record")
+        self._flush_pages()
+        self._flush_choices()
+        if not self.id_map:
+            raise ImportFormatError("A story needs at least one page")
+
+        if self.local_start is None:
+            start_page_id = next(iter(self.id_map.values()))
+        else:
+            start_page_id = self.id_map.get(self.local_start)
+            if start_page_id is None:
+                raise ImportFormatError(f"Unknown start page {self.local_start!r}")
+
+        values = {"start_page_id": start_page_id, "status": self.status}
+        if self.status == "published":
+            # Same summary columns publishing stores (analysis.store_analysis), from the ids already in memory
+            report = analyze(self.endings, self.edges, start_page_id)
+            values.update({k: report[k] for k in ("page_count", "ending_count", "max_depth", "path_count")})
+        db.session.execute(update(Story.__table__).where(Story.__table__.c.id == self.story_id).values(**values))
+
+        search.index_story_bulk(self.story_id)
+        db.session.commit()
+
+        seconds = time.perf_counter() - self.started
+        return {
+            "id": self.story_id,
+            "start_page_id": start_page_id,
+            "pages": self.page_count,
+            "choices": self.choice_count,
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(self.page_count / seconds) if seconds else None,
+        }
+
+
+def import_document(doc, max_pages):
+    """{"story": {...}, "pages": [...], "choices": [...]} (the JSON export)"""
+    if not isinstance(doc, dict) or not isinstance(doc.get("story"), dict):
+        raise ImportFormatError('Expected {"story": {...}, "pages": [...], "choices": [...]}')
+    importer = StoryImporter(max_pages)
+    importer.story(doc["story"])
+    for record in doc.get("pages") or []:
+        importer.page(record)
+    for record in doc.get("choices") or []:
+        importer.choice(record)
+    return importer.finish()
+
+
+def import_lines(lines, max_pages):
+    """NDJSON export: one record per line, read as it arrives"""
+    importer = StoryImporter(max_pages)
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ImportFormatError(f"Line {number} is not valid JSON")
+        importer.add(record)
+    return importer.finish()
@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict
+from .graph import compile_story, compile_story_for_page, load_revision
+
+# In-process cache of compiled story graphs.
+# Read routes serve from here; write routes call invalidate(story_id) after they commit.
+# Entries are immutable CompiledStory snapshots tagged with their revision, kept in LRU order.
+#
+# The cache lives in one process: a write only invalidates the worker that handled it. So an entry is
+# trusted for `revalidate_after` seconds only; after that the next read compares its revision with
+# Story.revision (1 primary key lookup) and recompiles if another worker changed the story.
+# Other workers therefore serve a changed story for at most that long.
+
+
+class StoryGraphCache:
+    def __init__(self, max_stories=256, revalidate_after=1.0):
+        self.max_stories = max_stories
+        self.revalidate_after = revalidate_after
+        self._entries = OrderedDict()  # story_id -> CompiledStory (most recently used last)
+        self._checked = {}             # story_id -> time.monotonic() its revision was last confirmed
+        self._page_index = {}          # page_id -> story_id, for every cached page
+        self._generations = {}         # story_id -> invalidation counter (guards against stale puts)
+        self._epoch = 0                # Total invalidations, for compiles that don't know their story id upfront
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.revalidations = 0
+
+    def init_app(self, app):
+        self.max_stories = app.config.get("STORY_CACHE_SIZE", self.max_stories)
+        self.revalidate_after = app.config.get("STORY_CACHE_REVALIDATE", self.revalidate_after)
+        self.clear()
+
+    # --- Reads ---
+
+    def get_story(self, story_id):
+        """Compiled story from cache, compiling (and caching) it on a miss. None if it doesn't exist."""
+        with self._lock:
+            compiled = self._entries.get(story_id)
+            if compiled is not None and self._fresh(story_id):
+                self._entries.move_to_end(story_id)
+                self.hits += 1
+                return compiled
+            generation = self._generations.get(story_id, 0)
+
+        if compiled is not None and self._revalidate(compiled):
+            return compiled
+        with self._lock:
+            self.misses += 1
+
+        # Compile outside the lock so one slow story doesn't block every reader
+        compiled = compile_story(story_id)
+        if compiled is not None:
+            self._put(compiled, generation)
+        return compiled
+
+    def peek(self, story_id):
+        """
+        Cached compiled story or None. Never touches the DB, LRU order or counters;
+        an entry that is due for a revision check counts as missing.
+        """
+        with self._lock:
+            if not self._fresh(story_id):
+                return None
+            return self._entries.get(story_id)
+
+    def get_story_for_page(self, page_id):
+        """Compiled story containing page_id. Only hits the DB (1 query) if that page's story isn't cached."""
+        with self._lock:
+            story_id = self._page_index.get(page_id)
+            if story_id is None:
+                self.misses += 1
+                epoch = self._epoch
+
+        if story_id is not None:
+            return self.get_story(story_id)
+
+        # Page -> story lookup and compile in the same statement
+        compiled = compile_story_for_page(page_id)
+        if compiled is not None:
+            self._put(compiled, epoch=epoch)
+        return compiled
+
+    # --- Revision checks ---
+
+    def _fresh(self, story_id):
+        # Caller holds the lock
+        checked = self._checked.get(story_id)
+        return checked is not None and time.monotonic() - checked < self.revalidate_after
+
+    def _revalidate(self, compiled):
+        """Is this entry still the latest revision? Keeps it (and restarts its timer) if so, drops it if not."""
+        current = load_revision(compiled.id)
+        with self._lock:
+            self.revalidations += 1
+            if self._entries.get(compiled.id) is not compiled:
+                return False  # Replaced or invalidated meanwhile
+            if current == compiled.revision:
+                self._checked[compiled.id] = time.monotonic()
+                self._entries.move_to_end(compiled.id)
+                self.hits += 1
+                return True
+            self._drop(compiled.id)
+            return False
+
+    # --- Writes ---
+
+    def _put(self, compiled, generation=None, epoch=None):
+        with self._lock:
+            # A write committed while we were compiling: our snapshot may already be stale
+            if generation is not None and self._generations.get(compiled.id, 0) != generation:
+                return
+            if epoch is not None and self._epoch != epoch:
+                return
+
+            self._drop(compiled.id)
+            self._entries[compiled.id] = compiled
+            self._checked[compiled.id] = time.monotonic()
+            for page_id in compiled.pages:
+                self._page_index[page_id] = compiled.id
+
+            while len(self._entries) > self.max_stories:
+                oldest_id = next(iter(self._entries))
+                self._drop(oldest_id)
+                self.evictions += 1
+
+    def invalidate(self, story_id):
+        """Forget a story. Write routes call this after a successful commit."""
+        with self._lock:
+            self._generations[story_id] = self._generations.get(story_id, 0) + 1
+            self._epoch += 1
+            if self._drop(story_id):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._checked.clear()
+            self._page_index.clear()
+            self._generations.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = self.revalidations = 0
+
+    def _drop(self, story_id):
+        # Caller holds the lock
+        compiled = self._entries.pop(story_id, None)
+        self._checked.pop(story_id, None)
+        if compiled is None:
+            return False
+        for page_id in compiled.pages:
+            if self._page_index.get(page_id) == story_id:
+                del self._page_index[page_id]
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_stories,
+                "cached_pages": len(self._page_index),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "revalidations": self.revalidations,
+            }
+
+
+class RevisionCache:
+    """
+    Small LRU for results derived from one story revision (validation reports, ...).
+    Keys are (story_id, revision), so entries never need invalidating: a write bumps the
+    revision and the old entry simply ages out.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, story_id, revision, compute):
+        key = (story_id, revision)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+story_cache = StoryGraphCache()
+validation_cache = RevisionCache()
@@ -1,5 +1,19 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 # DB object + other extensions
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+migrate = Migrate()
+
+
+# SQLite only enforces foreign keys (e.g. Choice.next_page_id -> page.id ON DELETE SET NULL) when asked to
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
@@ -0,0 +1,172 @@
+from collections import namedtuple
+from sqlalchemy import select
+from .extensions import db
+from .models import Story, Page, Choice
+
+# Compiled story graphs.
+# A CompiledStory is an immutable snapshot of one story (metadata + pages + adjacency list of choices),
+# built with a single column-only query instead of hydrating ORM objects page by page.
+# Every write to a story bumps Story.revision, so (story_id, revision) identifies a snapshot exactly.
+
+CompiledStory = namedtuple(
+    "CompiledStory",
+    ["id", "title", "description", "status", "author_id", "start_page_id", "revision", "pages", "choices"]
+)
+# pages:   {page_id: CompiledPage}
+# choices: {page_id: (CompiledChoice, ...)}  -> adjacency list, ordered by choice id
+CompiledPage = namedtuple("CompiledPage", ["id", "text", "is_ending", "ending_label"])
+CompiledChoice = namedtuple("CompiledChoice", ["id", "text", "next_page_id"])
+
+
+def bump_revision(story_id):
+    """Mark a story as changed. Call inside the write transaction, before commit."""
+    Story.query.filter_by(id=story_id).update(
+        {Story.revision: Story.revision + 1}, synchronize_session=False
+    )
+
+
+def load_revision(story_id):
+    """Story.revision straight from the database (None if the story doesn't exist)"""
+    return db.session.execute(select(Story.revision).where(Story.id == story_id)).scalar()
+
+
+def story_version(story_id, revision):
+    # Opaque version string, also used as the (strong) ETag value
+    return f"{story_id}-{revision}"
+
+
+def _story_rows(story_filter):
+    """
+    The whole story as one flat result: story LEFT JOIN page LEFT JOIN choice, ordered by page then choice.
+    One round trip instead of one query per table; the story columns repeat on every row, which is
+    cheaper than two extra round trips for any real story.
+    """
+    return db.session.execute(
+        select(Story.id, Story.title, Story.description, Story.status,
+               Story.author_id, Story.start_page_id, Story.revision,
+               Page.id.label("page_id"), Page.text.label("page_text"), Page.is_ending, Page.ending_label,
+               Choice.id.label("choice_id"), Choice.text.label("choice_text"), Choice.next_page_id)
+        .select_from(Story)
+        .outerjoin(Page, Page.story_id == Story.id)
+        .outerjoin(Choice, Choice.page_id == Page.id)
+        .where(story_filter)
+        .order_by(Page.id, Choice.id)
+    ).all()
+
+
+def compile_story(story_id):
+    """Load a whole story in 1 query and freeze it. Returns None if the story doesn't exist."""
+    return _compile(_story_rows(Story.id == story_id))
+
+
+def compile_story_for_page(page_id):
+    """Same as compile_story, for the story containing page_id (still 1 query). None if the page doesn't exist."""
+    return _compile(_story_rows(Story.id == select(Page.story_id).where(Page.id == page_id).scalar_subquery()))
+
+
+def _compile(rows):
+    if not rows:
+        return None
+    story = rows[0]
+
+    pages = {}
+    choices = {}
+    for row in rows:
+        if row.page_id is None:
+            continue  # Story without pages
+        if row.page_id not in pages:
+            pages[row.page_id] = CompiledPage(row.page_id, row.page_text, bool(row.is_ending), row.ending_label)
+        if row.choice_id is not None:
+            choices.setdefault(row.page_id, []).append(CompiledChoice(row.choice_id, row.choice_text, row.next_page_id))
+
+    return CompiledStory(
+        id=story.id,
+        title=story.title,
+        description=story.description,
+        status=story.status,
+        author_id=story.author_id,
+        start_page_id=story.start_page_id,
+        revision=story.revision,
+        pages=pages,
+        choices={page_id: tuple(c) for page_id, c in choices.items()},
+    )
+
+
+def story_summary(compiled):
+    return {
+        "id": compiled.id,
+        "title": compiled.title,
+        "description": compiled.description,
+        "status": compiled.status,
+        "author_id": compiled.author_id,
+        "start_page_id": compiled.start_page_id,
+        "revision": compiled.revision,
+    }
+
+
+def bundle_payload(compiled):
+    """JSON-ready bundle: everything Django needs to play the story without further calls."""
+    return {
+        "version": story_version(compiled.id, compiled.revision),
+        "story": story_summary(compiled),
+        # JSON object keys are strings, so page ids are stringified here
+        "pages": {
+            str(p.id): {"text": p.text, "is_ending": p.is_ending, "ending_label": p.ending_label}
+            for p in compiled.pages.values()
+        },
+        "choices": {
+            str(page_id): [{"id": c.id, "text": c.text, "next_page_id": c.next_page_id} for c in edges]
+            for page_id, edges in compiled.choices.items()
+        },
+    }
+
+
+# --- Serializers for the read routes (same JSON shapes the API has always returned) ---
+
+def story_payload(compiled):
+    return {
+        "id": compiled.id,
+        "title": compiled.title,
+        "description": compiled.description,
+        "status": compiled.status,
+        "start_page_id": compiled.start_page_id
+    }
+
+
+def page_payload(compiled, page):
+    return {
+        "id": page.id,
+        "story_id": compiled.id,
+        "story_status": compiled.status,
+        "text": page.text,
+        "is_ending": page.is_ending,
+        "ending_label": page.ending_label,
+        "choices": [
+            {"id": c.id, "text": c.text, "next_page_id": c.next_page_id}
+            for c in compiled.choices.get(page.id, ())
+        ]
+    }
+
+
+def advance_payload(compiled, page, choice_index):
+    """One step of play: where the reader landed, the story status, and which choice (index) got them there."""
+    return {
+        "story": story_summary(compiled),
+        "page": page_payload(compiled, page),
+        "choice_index": choice_index,
+    }
+
+
+def structure_payload(compiled):
+    return {
+        "title": compiled.title,
+        "pages": [
+            {"id": p.id, "story_id": compiled.id, "text": p.text, "is_ending": p.is_ending, "ending_label": p.ending_label}
+            for p in compiled.pages.values()
+        ],
+        "choices": [
+            {"id": c.id, "page_id": page_id, "text": c.text, "next_page_id": c.next_page_id}
+            for page_id, edges in compiled.choices.items()
+            for c in edges
+        ]
+    }
@@ -0,0 +1,222 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import request
+from sqlalchemy import event
+from .extensions import db
+
+# Request / SQL / cache metrics, exposed on GET /metrics in the Prometheus text format.
+#
+# Everything is in-process counters updated under one lock: per request a couple of dict updates
+# in after_request, per SQL statement two perf_counter() calls and one addition. Nothing is
+# sampled or exported in the background; the text is only built when /metrics is scraped.
+#
+# Routes are labelled with their URL rule (/stories/<int:story_id>), never the raw path, so the
+# number of series stays bounded. Unmatched paths (404s) share one "unmatched" label.
+#
+# Latency is measured until the view returns (headers ready). For streamed bodies, bytes and
+# SQL are still counted as the stream is written, but the time spent streaming isn't.
+# Like the caches, the numbers are per process: each worker reports its own.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_ROUTE_NONE = "-"  # Statements run outside a request (startup, CLI)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics). Caller holds the Metrics lock."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Route label + start time of the request this thread is serving
+        self.started = time.time()
+        self.clear()
+
+    def init_app(self, app):
+        """Register the request hooks and the SQL listeners on the app's engine. Needs METRICS_ENABLED."""
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        self.clear()
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(db.engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def clear(self):
+        with self._lock:
+            self.requests = {}        # (method, route, status) -> count
+            self.latency = {}         # (method, route) -> Histogram
+            self.request_bytes = {}   # (method, route) -> bytes received
+            self.response_bytes = {}  # (method, route) -> bytes sent
+            self.sql_statements = {}  # route -> statements
+            self.sql_seconds = {}     # route -> seconds in cursor.execute
+            self.in_flight = 0
+
+    # --- Request hooks ---
+
+    def _before_request(self):
+        rule = request.url_rule
+        self._local.route = rule.rule if rule is not None else "unmatched"
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+
+    def _after_request(self, response):
+        started = getattr(self._local, "started", None)
+        if started is None:  # before_request didn't run (an earlier hook answered)
+            return response
+        seconds = time.perf_counter() - started
+        route = self._local.route
+        key = (request.method, route)
+
+        sent = response.content_length
+        if sent is None and response.is_streamed:
+            response.response = self._count_stream(response.response, key)
+            sent = 0
+
+        with self._lock:
+            status_key = (request.method, route, response.status_code)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram()
+            histogram.observe(seconds)
+            self.request_bytes[key] = self.request_bytes.get(key, 0) + (request.content_length or 0)
+            self.response_bytes[key] = self.response_bytes.get(key, 0) + (sent or 0)
+        return response
+
+    def _teardown_request(self, exc=None):
+        # Runs once the response (and a stream_with_context body) is done
+        if getattr(self._local, "started", None) is not None:
+            with self._lock:
+                self.in_flight -= 1
+        self._local.route = None
+        self._local.started = None
+
+    def _count_stream(self, body, key):
+        """Pass a streamed body through, adding its size to response_bytes as it's written"""
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                with self._lock:
+                    self.response_bytes[key] = self.response_bytes.get(key, 0) + len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    # --- SQL (engine events) ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_started"] = time.perf_counter()  # A connection runs one statement at a time
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["metrics_started"]
+        route = getattr(self._local, "route", None) or SQL_ROUTE_NONE
+        with self._lock:
+            self.sql_statements[route] = self.sql_statements.get(route, 0) + 1
+            self.sql_seconds[route] = self.sql_seconds.get(route, 0.0) + seconds
+
+    # --- Exposition ---
+
+    def render(self, caches):
+        """Prometheus text format. `caches` maps a cache name to its stats() dict."""
+        with self._lock:
+            requests = dict(self.requests)
+            latency = {key: (list(h.counts), h.sum, h.count) for key, h in self.latency.items()}
+            request_bytes = dict(self.request_bytes)
+            response_bytes = dict(self.response_bytes)
+            sql_statements = dict(self.sql_statements)
+            sql_seconds = dict(self.sql_seconds)
+            in_flight = self.in_flight
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_labels(labels)} {_number(value)}")
+
+        metric("nahb_http_requests_total", "counter", "HTTP requests by method, route and status.", [
+            ("", {"method": m, "route": r, "status": s}, n) for (m, r, s), n in sorted(requests.items())
+        ])
+
+        samples = []
+        for (m, r), (counts, total, count) in sorted(latency.items()):
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+                cumulative += n
+                samples.append(("_bucket", {"method": m, "route": r, "le": _number(bound)}, cumulative))
+            samples.append(("_sum", {"method": m, "route": r}, total))
+            samples.append(("_count", {"method": m, "route": r}, count))
+        metric("nahb_http_request_duration_seconds", "histogram",
+               "Time until the view returned its response.", samples)
+
+        metric("nahb_http_request_bytes_total", "counter", "Request body bytes received.", [
+            ("", {"method": m, "route": r}, n) for (m, r), n in sorted(request_bytes.items())
+        ])
+        metric("nahb_http_response_bytes_total", "counter", "Response body bytes sent (streamed bodies included).", [
+            ("", {"method": m, "route": r}, n) for (m, r), n in sorted(response_bytes.items())
+        ])
+        metric("nahb_http_requests_in_flight", "gauge", "Requests being served.", [("", {}, in_flight)])
+
+        metric("nahb_sql_statements_total", "counter", "SQL statements executed, by route (- = outside a request).", [
+            ("", {"route": r}, n) for r, n in sorted(sql_statements.items())
+        ])
+        metric("nahb_sql_seconds_total", "counter", "Time spent executing SQL statements, by route.", [
+            ("", {"route": r}, n) for r, n in sorted(sql_seconds.items())
+        ])
+
+        counters = ("hits", "misses", "evictions", "invalidations", "revalidations")
+        for field in counters:
+            metric(f"nahb_cache_{field}_total", "counter", f"Cache {field}.", [
+                ("", {"cache": name}, stats[field]) for name, stats in caches.items() if field in stats
+            ])
+        for field in ("size", "max_size", "cached_pages"):
+            metric(f"nahb_cache_{field}", "gauge", f"Cache {field.replace('_', ' ')}.", [
+                ("", {"cache": name}, stats[field]) for name, stats in caches.items() if field in stats
+            ])
+
+        metric("nahb_process_start_time_seconds", "gauge", "Unix time the metrics started.", [("", {}, self.started)])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+metrics = Metrics()
@@ -2,28 +2,46 @@ from flask_sqlalchemy import SQLAlchemy
 from .extensions import db
 
 class Story(db.Model):
+    # Ids are never reused (SQLite AUTOINCREMENT): ETags and Django's caches are keyed on them
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(500))
-    status = db.Column(db.String(20), default="draft")
+    status = db.Column(db.String(20), default="draft", index=True)
     start_page_id = db.Column(db.Integer, nullable=True)  # ID of the first page
 
-    author_id = db.Column(db.Integer, nullable=False, default=1)
+    author_id = db.Column(db.Integer, nullable=False, default=1, index=True)
+
+    # Bumped on every write to the story, its pages or its choices (see graph.bump_revision)
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Graph summary, computed when the story is published (see analysis.store_analysis)
+    page_count = db.Column(db.Integer, nullable=True)
+    ending_count = db.Column(db.Integer, nullable=True)
+    max_depth = db.Column(db.Integer, nullable=True)
+    path_count = db.Column(db.Text, nullable=True)  # Decimal string (can exceed 64 bits), ">=10^N" or "infinite"
 
     # Relationship to access pages easily
     pages = db.relationship('Page', backref='story', cascade="all, delete-orphan")
 
 class Page(db.Model):
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id = db.Column(db.Integer, primary_key=True)
-    story_id = db.Column(db.Integer, db.ForeignKey("story.id"), nullable=False)
+    story_id = db.Column(db.Integer, db.ForeignKey("story.id"), nullable=False, index=True)
     text = db.Column(db.Text, nullable=False)
     is_ending = db.Column(db.Boolean, default=False)
     ending_label = db.Column(db.String(100), nullable=True)
 
-    choices = db.relationship('Choice', backref='page', cascade="all, delete-orphan")
+    choices = db.relationship('Choice', backref='page', foreign_keys='Choice.page_id', cascade="all, delete-orphan")
 
 class Choice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    page_id = db.Column(db.Integer, db.ForeignKey("page.id"), nullable=False)
+    page_id = db.Column(db.Integer, db.ForeignKey("page.id"), nullable=False, index=True)
     text = db.Column(db.String(200), nullable=False)
-    next_page_id = db.Column(db.Integer, nullable=True)
+    # Deleting the target page leaves the choice pointing nowhere (validation reports it) instead of dangling
+    next_page_id = db.Column(
+        db.Integer, db.ForeignKey("page.id", name="fk_choice_next_page_id_page", ondelete="SET NULL"),
+        nullable=True, index=True
+    )
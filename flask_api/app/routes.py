@@ -1,7 +1,17 @@
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, request, jsonify, abort, Response, stream_with_context
 from .extensions import db
 from .models import Story, Page, Choice
-import os
+from .graph import (
+    bundle_payload, bump_revision, story_version, story_payload, page_payload, structure_payload, advance_payload,
+)
+from .cache import story_cache, validation_cache
+from .validation import validate_story
+from .analysis import analyze_story, store_analysis, analysis_cache
+from .metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from . import bulk, search, streaming
+import io
+import hashlib
+from sqlalchemy import select
 from functools import wraps
 from flask import current_app
 
@@ -22,15 +32,103 @@ def require_api_key(f):
     return decorated_function
 
 
+# --- HTTP CACHING ---
+# Read routes send a strong ETag derived from the story revision.
+# If the client already holds that version (If-None-Match), we answer 304 before building any JSON.
+
+def cache_control(published):
+    # Published content may be reused for a short while; drafts must be revalidated every time
+    if published:
+        return f"public, max-age={current_app.config['PUBLISHED_MAX_AGE']}"
+    return "private, no-cache"
+
+
+def conditional_json(etag, published, build_payload):
+    """Return 304 if the client's copy is current, otherwise jsonify(build_payload())."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control(published)
+    return response
+
+
+def story_etag(kind, compiled):
+    # kind keeps the representations apart (story, page, structure, ...) for the same revision
+    return f"{kind}-{story_version(compiled.id, compiled.revision)}"
+
+
 
 ##############################  Story Routing   ##############################
 
+# Columns a client can pick with ?fields= on the story listing
+STORY_LIST_FIELDS = {
+    "id": Story.id,
+    "title": Story.title,
+    "description": Story.description,
+    "status": Story.status,
+    "author_id": Story.author_id,
+    "start_page_id": Story.start_page_id,
+    # Graph summary stored at publish time
+    "page_count": Story.page_count,
+    "ending_count": Story.ending_count,
+    "max_depth": Story.max_depth,
+    "path_count": Story.path_count,
+}
+DEFAULT_LIST_FIELDS = ["id", "title", "description", "status", "author_id"]
+MAX_PAGE_SIZE = 100
+
+# Max ids per batch lookup (?ids=1,2,3), keeps the IN (...) list under SQLite's variable limit
+MAX_BULK_IDS = 500
+
+
+def parse_fields(allowed, default):
+    """?fields=a,b -> ["id", "a", "b"]. Raises ValueError on unknown names."""
+    if not request.args.get("fields"):
+        return default
+    fields = ["id"] + [f for f in request.args["fields"].split(",") if f and f != "id"]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_ids():
+    """?ids=1,2,3 -> [1, 2, 3] (deduplicated), or None if absent. Raises ValueError if malformed / too many."""
+    raw = request.args.get("ids")
+    if raw is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw.split(",") if i))
+    except ValueError:
+        raise ValueError("ids must be a comma separated list of integers")
+    if len(ids) > MAX_BULK_IDS:
+        raise ValueError(f"At most {MAX_BULK_IDS} ids per request")
+    return ids
+
+
 # Get all
 @main_bp.route("/stories")
 def get_stories():
+    """
+    Query params:
+      status, author_id -> filters
+      ids=1,2,3         -> only these stories (batch lookup)
+      fields=id,title   -> only return these columns (id is always included)
+      limit=N           -> keyset pagination, returns {"items", "next_cursor", "total"} instead of a plain list
+      cursor=<id>       -> continue after this story id (the next_cursor of the previous page)
+      count=0           -> skip the total count (saves a COUNT(*) on big catalogues)
+    """
     status = request.args.get("status")
     author_id = request.args.get("author_id") # Filter by author
 
+    try:
+        fields = parse_fields(STORY_LIST_FIELDS, DEFAULT_LIST_FIELDS)
+        ids = parse_ids()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     query = Story.query
 
     if status:
@@ -43,53 +141,135 @@ def get_stories():
     if author_id:
         query = query.filter_by(author_id=author_id)
 
-    stories = query.all()
-    
-    return jsonify([
-        {
-            "id": s.id, 
-            "title": s.title, 
-            "description": s.description,
-            "status": s.status, 
-            "author_id": s.author_id  # Return this so Django knows who owns it
-        } 
-        for s in stories
-    ])
+    if ids is not None:
+        query = query.filter(Story.id.in_(ids))
+
+    limit = request.args.get("limit", type=int)
+    paginated = limit is not None
+    total = None
+
+    if paginated:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if request.args.get("count", "1") != "0":
+            total = query.count()
+        # Keyset: seek past the last id seen instead of OFFSET, so deep pages cost the same as the first
+        cursor = request.args.get("cursor", type=int)
+        if cursor:
+            query = query.filter(Story.id > cursor)
+
+    query = query.with_entities(Story.revision, *(STORY_LIST_FIELDS[f] for f in fields)).order_by(Story.id)
+    if paginated:
+        query = query.limit(limit + 1)  # One extra row tells us whether there is a next page
+    rows = query.all()
+
+    next_cursor = None
+    if paginated and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+
+    # Fingerprint of the listing: (id, revision) of every returned story
+    fingerprint = hashlib.sha1(
+        f"{request.query_string.decode()}|{total}|{[(r.id, r.revision) for r in rows]}".encode()
+    ).hexdigest()
+
+    def build_payload():
+        items = [{f: getattr(r, f) for f in fields} for r in rows]
+        if not paginated:
+            return items
+        return {"items": items, "next_cursor": next_cursor, "total": total}
+
+    return conditional_json(f"list-{fingerprint}", status == "published", build_payload)
 
 # Get story
 @main_bp.route("/stories/<int:story_id>")
 def get_story(story_id):
-    story = Story.query.get_or_404(story_id)
-    return jsonify({
-        "id": story.id,
-        "title": story.title,
-        "description": story.description,
-        "status": story.status,
-        "start_page_id": story.start_page_id
-    })
+    compiled = story_cache.get_story(story_id)
+    if compiled is None:
+        abort(404)
+    return conditional_json(
+        story_etag("story", compiled), compiled.status == "published",
+        lambda: story_payload(compiled)
+    )
 
 #Search story
 @main_bp.route("/stories/search")
 def search_stories():
+    """
+    Ranked full-text search over published stories (title, description, page text).
+    Without limit: plain list of the best MAX_PAGE_SIZE hits.
+    With limit (+ offset): {"items", "next_offset"}.
+    """
     q = request.args.get("q", "")
-    stories = Story.query.filter(
-        Story.title.ilike(f"%{q}%"),
-        Story.status == "published"
-    ).all()
+    limit = request.args.get("limit", type=int)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    paginated = limit is not None
+    limit = max(1, min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    rows, has_more = search.search_stories(q, limit, offset)
+    items = [{"id": s.id, "title": s.title, "description": s.description} for s in rows]
 
-    return jsonify([
-        {"id": s.id, "title": s.title, "description": s.description}
-        for s in stories
-    ])
+    if not paginated:
+        return jsonify(items)
+    return jsonify({"items": items, "next_offset": offset + limit if has_more else None})
 
 # Get story start page
 @main_bp.route("/stories/<int:story_id>/start")
 def get_start_page(story_id):
-    story = Story.query.get_or_404(story_id)
-    if not story.start_page_id:
+    compiled = story_cache.get_story(story_id)
+    if compiled is None:
+        abort(404)
+    if not compiled.start_page_id:
         return jsonify({"error": "Story has no start page"}), 404
     
-    return jsonify({"start_page_id": story.start_page_id})
+    return conditional_json(
+        story_etag("start", compiled), compiled.status == "published",
+        lambda: {"start_page_id": compiled.start_page_id}
+    )
+
+# Get the whole story in one payload (metadata + pages + choice adjacency list)
+# Lets Django play every page of a story from a single fetch
+@main_bp.route("/stories/<int:story_id>/bundle")
+def get_story_bundle(story_id):
+    compiled = story_cache.get_story(story_id)
+    if compiled is None:
+        abort(404)
+
+    return conditional_json(
+        story_etag("bundle", compiled), compiled.status == "published",
+        lambda: bundle_payload(compiled)
+    )
+
+# Follow one choice (or enter the story): the transition is checked against the compiled graph,
+# and the response carries the next page, the story status and ending info in one round trip
+@main_bp.route("/stories/<int:story_id>/advance", methods=["POST"])
+def advance_story(story_id):
+    data = request.get_json(silent=True) or {}
+    from_page_id = data.get("from_page_id")
+    choice_id = data.get("choice_id")
+
+    compiled = story_cache.get_story(story_id)
+    if compiled is None:
+        abort(404)
+
+    if from_page_id is None and choice_id is None:
+        # No choice yet: the start page
+        if compiled.start_page_id not in compiled.pages:
+            return jsonify({"error": "Story has no start page"}), 404
+        return jsonify(advance_payload(compiled, compiled.pages[compiled.start_page_id], None))
+
+    if not isinstance(from_page_id, int) or not isinstance(choice_id, int):
+        return jsonify({"error": "from_page_id and choice_id must be integers"}), 400
+
+    # Only this story's pages have edges here, so a page from another story fails the same way
+    edges = compiled.choices.get(from_page_id, ())
+    for index, choice in enumerate(edges):
+        if choice.id == choice_id:
+            page = compiled.pages.get(choice.next_page_id)
+            if page is None:
+                return jsonify({"error": f"Choice {choice_id} leads to a missing page"}), 409
+            return jsonify(advance_payload(compiled, page, index))
+
+    return jsonify({"error": f"Choice {choice_id} is not available from page {from_page_id}"}), 409
 
 
 # Create
@@ -122,6 +302,10 @@ def create_story():
 
     # Link story and page (story.start_page_id defined)
     story.start_page_id = start_page.id
+
+    # Keep the search index in the same transaction
+    search.index_story(story)
+    search.index_page(start_page)
     
     # Save everything at once
     db.session.commit()
@@ -143,7 +327,12 @@ def update_story(story_id):
     story.start_page_id = data.get("start_page_id", story.start_page_id)
 
     try:
+        if story.status == "published":
+            store_analysis(story)
+        bump_revision(story.id)
+        search.index_story(story)
         db.session.commit()
+        story_cache.invalidate(story.id)
         return jsonify({"message": "Story updated successfully", "id": story.id}), 200
     except Exception as e:
         db.session.rollback()
@@ -168,10 +357,16 @@ def update_story_partial(story_id):
         
     if "start_page_id" in data:
         story.start_page_id = data["start_page_id"]
-
     
     try:
+        # Publishing: store the graph summary so listings can show it for free
+        if "status" in data and story.status == "published":
+            store_analysis(story)
+        bump_revision(story.id)
+        if "title" in data or "description" in data:
+            search.index_story(story)
         db.session.commit()
+        story_cache.invalidate(story.id)
         return jsonify({"message": "Story updated successfully", "id": story.id}), 200
     except Exception as e:
         db.session.rollback()
@@ -182,31 +377,56 @@ def update_story_partial(story_id):
 @require_api_key
 def delete_story(story_id):
     story = Story.query.get_or_404(story_id)
+    search.unindex_story(story_id)  # Before the pages go: it deletes their index rows by page id
     db.session.delete(story)
     db.session.commit()
+    story_cache.invalidate(story_id)
     return jsonify({"message": "Story deleted"})
 
 ##############################  Page Routing   ##############################
 
+# Columns a client can pick with ?fields= on the batch page lookup
+PAGE_FIELDS = {
+    "id": Page.id,
+    "story_id": Page.story_id,
+    "text": Page.text,
+    "is_ending": Page.is_ending,
+    "ending_label": Page.ending_label,
+}
+DEFAULT_PAGE_FIELDS = ["id", "story_id", "text", "is_ending", "ending_label"]
+
+
+# Get many: /pages?ids=1,2,3&fields=ending_label
+# One IN (...) query, no choices, no story join. Unknown ids are simply missing from the result.
+@main_bp.route("/pages")
+def get_pages_bulk():
+    try:
+        fields = parse_fields(PAGE_FIELDS, DEFAULT_PAGE_FIELDS)
+        ids = parse_ids()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not ids:
+        return jsonify([])
+
+    rows = db.session.execute(
+        select(*(PAGE_FIELDS[f] for f in fields)).where(Page.id.in_(ids)).order_by(Page.id)
+    ).all()
+    return jsonify([{f: getattr(r, f) for f in fields} for r in rows])
+
 # Get
 @main_bp.route("/pages/<int:page_id>")
 def get_page(page_id):
-    page = Page.query.get_or_404(page_id)
-    choices = Choice.query.filter_by(page_id=page.id).all()
-    story = page.story    
-
-    return jsonify({
-        "id": page.id,
-        "story_id": story.id,
-        "story_status": story.status,
-        "text": page.text,
-        "is_ending": page.is_ending,
-        "ending_label": page.ending_label,
-        "choices": [
-            {"id": c.id, "text": c.text, "next_page_id": c.next_page_id}
-            for c in choices
-        ]
-    })
+    # Served from the compiled story graph (no DB access once the story is cached)
+    compiled = story_cache.get_story_for_page(page_id)
+    page = compiled.pages.get(page_id) if compiled else None
+    if page is None:
+        abort(404)
+
+    # Any edit to the story bumps its revision, so the page ETag only needs the page id on top
+    return conditional_json(
+        f"page{page.id}-{story_version(compiled.id, compiled.revision)}", compiled.status == "published",
+        lambda: page_payload(compiled, page)
+    )
 
 # Update (PATCH is preferred for partial updates)
 @main_bp.route("/pages/<int:page_id>", methods=["PATCH"])
@@ -232,12 +452,18 @@ def update_page(page_id):
         if page.is_ending:
             page.ending_label = data["ending_label"]
 
+    bump_revision(page.story_id)
+    if "text" in data:
+        search.index_page(page)
+
     # 3. Commit changes
     try:
         db.session.commit()
+        story_cache.invalidate(page.story_id)
         return jsonify({
             "message": "Page updated successfully",
             "id": page.id,
+            "story_id": page.story_id,
             "text": page.text,
             "is_ending": page.is_ending
         }), 200
@@ -257,7 +483,10 @@ def create_page(story_id):
         ending_label=data.get("ending_label")
     )
     db.session.add(page)
+    bump_revision(story_id)
+    search.index_page(page)
     db.session.commit()
+    story_cache.invalidate(story_id)
     return jsonify({"id": page.id}), 201
 
 # Delete
@@ -266,11 +495,20 @@ def create_page(story_id):
 def delete_page(page_id):
     page = Page.query.get_or_404(page_id)
     try:
-        # Note: Ensure you have cascading deletes set up in your models, 
-        # otherwise choices pointing TO this page might cause errors.
+        # Its own choices are deleted with it; choices pointing TO it get next_page_id = NULL (FK ON DELETE SET NULL),
+        # and those can live in other stories: every story that loses an edge gets a new revision
+        affected = {page.story_id}
+        affected.update(db.session.scalars(
+            select(Page.story_id).join(Choice, Choice.page_id == Page.id).where(Choice.next_page_id == page_id).distinct()
+        ))
         db.session.delete(page)
+        for story_id in affected:
+            bump_revision(story_id)
+        search.unindex_page(page.id)
         db.session.commit()
-        return jsonify({"message": "Page deleted"}), 200
+        for story_id in affected:
+            story_cache.invalidate(story_id)
+        return jsonify({"message": "Page deleted", "story_id": page.story_id}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -282,36 +520,200 @@ def delete_page(page_id):
 @main_bp.route("/pages/<int:page_id>/choices", methods=["POST"])
 @require_api_key
 def create_choice(page_id):
+    page = Page.query.get_or_404(page_id)
     data = request.json
+
+    # The target must be a page of the same story (the foreign key alone would only catch missing pages, as a 500)
+    next_page_id = data["next_page_id"]
+    if next_page_id is not None:
+        target_story_id = None
+        if isinstance(next_page_id, int):
+            target_story_id = db.session.scalar(select(Page.story_id).where(Page.id == next_page_id))
+        if target_story_id != page.story_id:
+            return jsonify({"error": f"next_page_id {next_page_id} is not a page of story {page.story_id}"}), 400
+
     choice = Choice(
         page_id=page_id,
         text=data["text"],
-        next_page_id=data["next_page_id"]
+        next_page_id=next_page_id
     )
     db.session.add(choice)
+    bump_revision(page.story_id)
     db.session.commit()
-    return jsonify({"id": choice.id}), 201
+    story_cache.invalidate(page.story_id)
+    return jsonify({"id": choice.id, "story_id": page.story_id}), 201
 
 # Delete
 @main_bp.route("/choices/<int:choice_id>", methods=["DELETE"])
 @require_api_key
 def delete_choice(choice_id):
     choice = Choice.query.get_or_404(choice_id)
+    story_id = choice.page.story_id
     db.session.delete(choice)
+    bump_revision(story_id)
     db.session.commit()
-    return jsonify({"message": "Choice deleted"})
+    story_cache.invalidate(story_id)
+    return jsonify({"message": "Choice deleted", "story_id": story_id})
 
 ##############################  Validation   ##############################
 
 
 @main_bp.route("/stories/<int:story_id>/structure")
 def get_story_structure(story_id):
-    pages = Page.query.filter_by(story_id=story_id).all()  # All pages of story
-    # Get all choices for these pages
-    page_ids = [p.id for p in pages]
-    choices = Choice.query.filter(Choice.page_id.in_(page_ids)).all()
-    
-    return jsonify({
-        "pages": [{"id": p.id, "story_id": p.story_id, "text": p.text, "is_ending": p.is_ending, "ending_label": p.ending_label} for p in pages],
-        "choices": [{"id": c.id, "page_id": c.page_id, "text": c.text, "next_page_id": c.next_page_id} for c in choices]
-    })
\ No newline at end of file
+    """
+    Query params (any of them switches to the streamed representation, see streaming.py):
+      text=none|snippet|full -> topology only / + truncated page text / + full text
+      snippet=N              -> snippet length (default 60)
+      format=json|ndjson     -> one JSON document, or one record per line
+    """
+    if any(arg in request.args for arg in ("text", "snippet", "format")):
+        return stream_story_structure(story_id)
+
+    compiled = story_cache.get_story(story_id)
+    if compiled is None:
+        # Unknown story: same empty structure as before
+        return jsonify({"pages": [], "choices": []})
+
+    return conditional_json(
+        story_etag("structure", compiled), compiled.status == "published",
+        lambda: structure_payload(compiled)
+    )
+
+
+def stream_story_structure(story_id):
+    mode = request.args.get("text", "full")
+    fmt = request.args.get("format", "json")
+    length = request.args.get("snippet", streaming.SNIPPET_LENGTH, type=int)
+    if mode not in streaming.TEXT_MODES or fmt not in streaming.FORMATS:
+        return jsonify({"error": f"text must be one of {', '.join(streaming.TEXT_MODES)}; format one of {', '.join(streaming.FORMATS)}"}), 400
+    length = max(1, min(length, streaming.MAX_SNIPPET_LENGTH))
+
+    def head(story):
+        if fmt == "ndjson":
+            return {"id": story.id, "title": story.title, "status": story.status,
+                    "start_page_id": story.start_page_id, "revision": story.revision}
+        return {"title": story.title, "start_page_id": story.start_page_id, "revision": story.revision}
+
+    kind = f"structure-{mode}{length if mode == 'snippet' else ''}"
+    return streamed_story(story_id, kind, mode, fmt, length, head)
+
+
+def streamed_story(story_id, kind, mode, fmt, length, head):
+    """
+    Stream a story's pages and choices (see streaming.py). head(story) gives the JSON document's
+    top-level keys, or the "story" record in NDJSON. Answers 304 / 404 before streaming anything.
+    """
+    # Never compiles the story: a big story is streamed from the DB without being loaded into memory
+    compiled = story_cache.peek(story_id)
+    story = compiled or streaming.story_header(story_id)
+    if story is None:
+        abort(404)
+
+    etag = f"{kind}-{fmt}-{story_version(story.id, story.revision)}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        encode = streaming.encode_ndjson if fmt == "ndjson" else streaming.encode_json
+        body = encode(
+            head(story),
+            streaming.iter_pages(story_id, mode, length, compiled),
+            streaming.iter_choices(story_id, mode, compiled),
+        )
+        mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+        response = Response(stream_with_context(body), mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control(story.status == "published")
+    return response
+
+
+##############################  Import / Export   ##############################
+
+# Whole story as one document: {"story": {...}, "pages": [...], "choices": [...]}, or NDJSON records
+# with ?format=ndjson. Page ids in the export are what /stories/import expects as local ids.
+@main_bp.route("/stories/<int:story_id>/export")
+def export_story(story_id):
+    fmt = request.args.get("format", "json")
+    if fmt not in streaming.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(streaming.FORMATS)}"}), 400
+
+    def head(story):
+        record = {
+            "id": story.id, "title": story.title, "description": story.description, "status": story.status,
+            "author_id": story.author_id, "start_page_id": story.start_page_id, "revision": story.revision,
+        }
+        return record if fmt == "ndjson" else {"story": record}
+
+    return streamed_story(story_id, "export", "full", fmt, None, head)
+
+
+# Create a whole story in one request and one transaction. Body: the export document (application/json)
+# or its NDJSON records (application/x-ndjson, read line by line). Ids in the body are local and remapped.
+@main_bp.route("/stories/import", methods=["POST"])
+@require_api_key
+def import_story():
+    max_pages = current_app.config["IMPORT_MAX_PAGES"]
+    try:
+        if request.mimetype == "application/x-ndjson":
+            # Buffered: request.stream on its own reads lines byte by byte
+            report = bulk.import_lines(io.BufferedReader(request.stream, 64 * 1024), max_pages)
+        else:
+            report = bulk.import_document(request.get_json(silent=True), max_pages)
+    except bulk.ImportFormatError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    current_app.logger.info(
+        "Imported story %s: %s pages, %s choices in %ss", report["id"], report["pages"], report["choices"], report["seconds"]
+    )
+    return jsonify(report), 201
+
+
+# Publishing checks, run on topology only and cached per story revision
+@main_bp.route("/stories/<int:story_id>/validate")
+def get_story_validation(story_id):
+    report = validate_story(story_id)
+    if report is None:
+        abort(404)
+
+    return conditional_json(
+        f"validate-{story_version(story_id, report['revision'])}", False,
+        lambda: report
+    )
+
+
+# Full graph analysis (reachability, orphans, cycles, endings, depths, path count), cached per revision
+@main_bp.route("/stories/<int:story_id>/analysis")
+def get_story_analysis(story_id):
+    report = analyze_story(story_id)
+    if report is None:
+        abort(404)
+
+    return conditional_json(
+        f"analysis-{story_version(story_id, report['revision'])}", False,
+        lambda: report
+    )
+
+
+##############################  Cache   ##############################
+
+# Hit / miss / eviction counters of the compiled story cache (+ validation / analysis report caches)
+@main_bp.route("/cache/stats")
+def get_cache_stats():
+    stats = story_cache.stats()
+    stats["validation"] = validation_cache.stats()
+    stats["analysis"] = analysis_cache.stats()
+    return jsonify(stats)
+
+
+##############################  Metrics   ##############################
+
+# Prometheus scrape target: per-route request counts, latency histograms, bytes, SQL count/time + cache stats
+@main_bp.route("/metrics")
+def get_metrics():
+    if not metrics.enabled:
+        abort(404)
+    caches = {"story": story_cache.stats(), "validation": validation_cache.stats(), "analysis": analysis_cache.stats()}
+    return Response(metrics.render(caches), content_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,204 @@
+import re
+from flask import current_app
+from sqlalchemy import text, or_
+from .extensions import db
+from .models import Story
+
+# Full-text search over stories.
+# On SQLite we keep two FTS5 tables in sync with the content tables:
+#   story_fts(title, description)      rowid = story.id
+#   page_fts(text, story_id UNINDEXED) rowid = page.id   (only if SEARCH_INDEX_PAGE_TEXT)
+# Write routes call index_story / index_page / unindex_* inside their transaction, so the index commits
+# (or rolls back) together with the change. Other engines (or SQLite builds without FTS5) fall back to LIKE.
+
+# Title matches count more than description matches, which count more than page text matches
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 3.0
+PAGE_TEXT_FACTOR = 0.5
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def init_search(app):
+    """Create the FTS tables if possible (called by create_app once the schema is migrated)."""
+    app.extensions["search_fts"] = False
+    app.extensions["search_pages"] = app.config.get("SEARCH_INDEX_PAGE_TEXT", True)
+
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    existing = {
+        row[0] for row in db.session.execute(
+            text("SELECT name FROM sqlite_master WHERE name IN ('story', 'story_fts', 'page_fts')")
+        )
+    }
+    if "story" not in existing:
+        # Schema not migrated yet (AUTO_MIGRATE off, `flask db upgrade` pending): search stays on LIKE
+        return
+    existing.discard("story")
+    try:
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS story_fts USING fts5(title, description)"
+        ))
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS page_fts USING fts5(text, story_id UNINDEXED)"
+        ))
+    except Exception:
+        # SQLite compiled without FTS5
+        db.session.rollback()
+        return
+
+    app.extensions["search_fts"] = True
+    db.session.commit()
+
+    # First run on an existing database: index what is already there
+    if existing != {"story_fts", "page_fts"}:
+        rebuild_index()
+
+
+def fts_enabled():
+    return current_app.extensions.get("search_fts", False)
+
+
+def pages_indexed():
+    return current_app.extensions.get("search_pages", False)
+
+
+# --- Index maintenance (call before commit) ---
+
+def index_story(story):
+    if not fts_enabled():
+        return
+    db.session.flush()
+    db.session.execute(text("DELETE FROM story_fts WHERE rowid = :id"), {"id": story.id})
+    db.session.execute(
+        text("INSERT INTO story_fts(rowid, title, description) VALUES (:id, :title, :description)"),
+        {"id": story.id, "title": story.title, "description": story.description or ""}
+    )
+
+
+def unindex_story(story_id):
+    """Call while the story's pages still exist: their ids are the page_fts rowids to delete."""
+    if not fts_enabled():
+        return
+    db.session.execute(text("DELETE FROM story_fts WHERE rowid = :id"), {"id": story_id})
+    # By rowid: story_id is UNINDEXED, filtering on it would scan the whole page index
+    db.session.execute(
+        text("DELETE FROM page_fts WHERE rowid IN (SELECT id FROM page WHERE story_id = :id)"), {"id": story_id}
+    )
+
+
+def index_page(page):
+    if not fts_enabled() or not pages_indexed():
+        return
+    db.session.flush()  # page.id must exist
+    db.session.execute(text("DELETE FROM page_fts WHERE rowid = :id"), {"id": page.id})
+    db.session.execute(
+        text("INSERT INTO page_fts(rowid, text, story_id) VALUES (:id, :text, :story_id)"),
+        {"id": page.id, "text": page.text, "story_id": page.story_id}
+    )
+
+
+def unindex_page(page_id):
+    if not fts_enabled() or not pages_indexed():
+        return
+    db.session.execute(text("DELETE FROM page_fts WHERE rowid = :id"), {"id": page_id})
+
+
+def index_story_bulk(story_id):
+    """Index a story and all its pages with INSERT ... SELECT (bulk imports, before commit)."""
+    if not fts_enabled():
+        return
+    unindex_story(story_id)
+    db.session.execute(text(
+        "INSERT INTO story_fts(rowid, title, description) "
+        "SELECT id, title, coalesce(description, '') FROM story WHERE id = :id"
+    ), {"id": story_id})
+    if pages_indexed():
+        db.session.execute(text(
+            "INSERT INTO page_fts(rowid, text, story_id) SELECT id, text, story_id FROM page WHERE story_id = :id"
+        ), {"id": story_id})
+
+
+def rebuild_index():
+    """Re-index every story (and page). Used on first start and after bulk loads like the seed."""
+    if not fts_enabled():
+        return
+    db.session.execute(text("DELETE FROM story_fts"))
+    db.session.execute(text("DELETE FROM page_fts"))
+    db.session.execute(text(
+        "INSERT INTO story_fts(rowid, title, description) "
+        "SELECT id, title, coalesce(description, '') FROM story"
+    ))
+    if pages_indexed():
+        db.session.execute(text(
+            "INSERT INTO page_fts(rowid, text, story_id) SELECT id, text, story_id FROM page"
+        ))
+    db.session.commit()
+
+
+# --- Querying ---
+
+def to_match_query(q):
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix (type-ahead)."""
+    words = WORD_RE.findall(q)
+    if not words:
+        return ""
+    return " ".join([f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*'])
+
+
+def search_stories(q, limit, offset=0):
+    """
+    Ranked published stories matching q.
+    Returns (rows, has_more); rows have id, title, description.
+    """
+    if not fts_enabled():
+        # Fallback: substring match on title/description (title hits first)
+        pattern = f"%{q}%"
+        rows = (
+            db.session.query(Story.id, Story.title, Story.description)
+            .filter(Story.status == "published", or_(Story.title.ilike(pattern), Story.description.ilike(pattern)))
+            .order_by(Story.title.ilike(pattern).desc(), Story.id)
+            .limit(limit + 1).offset(offset)
+            .all()
+        )
+        return rows[:limit], len(rows) > limit
+
+    match = to_match_query(q)
+    if not match:
+        return [], False
+
+    # Each source only needs its own best `window` stories: the merged top `window` is among them.
+    # bm25() is "lower is better".
+    window = offset + limit + 1
+    params = {"match": match, "window": window}
+
+    hits = db.session.execute(text(f"""
+        SELECT s.id, s.title, s.description, bm25(story_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) AS rank
+        FROM story_fts JOIN story s ON s.id = story_fts.rowid
+        WHERE story_fts MATCH :match AND s.status = 'published'
+        ORDER BY rank LIMIT :window
+    """), params).all()
+
+    if pages_indexed():
+        hits += db.session.execute(text(f"""
+            SELECT s.id, s.title, s.description, page_hits.rank
+            FROM (
+                SELECT story_id, min(rank) * {PAGE_TEXT_FACTOR} AS rank
+                -- FTS5's hidden rank column (= bm25) can be aggregated, unlike a bm25() call
+                FROM (SELECT story_id, rank FROM page_fts WHERE page_fts MATCH :match)
+                GROUP BY story_id
+            ) page_hits
+            JOIN story s ON s.id = page_hits.story_id
+            WHERE s.status = 'published'
+            ORDER BY page_hits.rank LIMIT :window
+        """), params).all()
+
+    # Merge: a story's rank is its best hit (title/description or any page)
+    best = {}
+    for row in hits:
+        if row.id not in best or row.rank < best[row.id].rank:
+            best[row.id] = row
+    rows = sorted(best.values(), key=lambda r: (r.rank, r.id))[offset:offset + limit + 1]
+
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,199 @@
+"""
+Synthetic stories for profiling: N stories x M pages of a given shape, bulk-inserted with executemany.
+
+    cd flask_api
+    flask --app app seed-synthetic --stories 100 --pages 1000 --shape mixed
+    flask --app app seed-synthetic --stories 1 --pages 1000000 --shape layered_dag --manifest /tmp/stories.ndjson
+
+Same --seed, same data. --manifest writes every story's topology (one JSON line per story) so the Django
+side can generate matching reading history: `python manage.py seed_history --manifest /tmp/stories.ndjson`.
+"""
+import json
+import random
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select
+from .extensions import db
+from .models import Story, Page, Choice
+from .analysis import analyze
+from . import search
+
+INSERT_BATCH = 10000
+
+
+# --- Shapes: n -> (pages {i: is_ending}, edges [(i, j)], start), with local ids 0..n-1 ---
+
+def binary_tree(n, rng=None):
+    """Perfect-ish binary tree: every inner page has 2 choices, leaves are endings."""
+    pages = {i: 2 * i + 1 >= n for i in range(n)}
+    edges = [(i, c) for i in range(n) for c in (2 * i + 1, 2 * i + 2) if c < n]
+    return pages, edges, 0
+
+
+def layered_dag(n, rng=None, width=1000):
+    """Wide DAG: layers of `width` pages, each page links to 2 random pages of the next layer."""
+    rng = rng or random.Random(1)
+    width = min(width, max(1, n // 2))
+    layers = max(2, n // width)
+    pages = {i: i >= (layers - 1) * width for i in range(layers * width)}
+    edges = []
+    for layer in range(layers - 1):
+        base = (layer + 1) * width
+        for i in range(layer * width, base):
+            edges.append((i, base + rng.randrange(width)))
+            edges.append((i, base + rng.randrange(width)))
+    return pages, edges, 0
+
+
+def chain(n, rng=None):
+    """Long corridor: one choice per page, a single ending at the end."""
+    pages = {i: i == n - 1 for i in range(n)}
+    edges = [(i, i + 1) for i in range(n - 1)]
+    return pages, edges, 0
+
+
+def with_cycles(n, rng=None):
+    """Binary tree where 1% of the pages also loop back to an ancestor."""
+    rng = rng or random.Random(2)
+    pages, edges, start = binary_tree(n)
+    for i in rng.sample(range(1, n), n // 100):
+        edges.append((i, rng.randrange(i)))
+    return pages, edges, start
+
+
+SHAPES = {
+    "binary_tree": binary_tree,
+    "layered_dag": layered_dag,
+    "chain": chain,
+    "with_cycles": with_cycles,
+}
+
+
+# --- Text ---
+
+WORDS = (
+    "the a you door dark light mansion corridor stairs window shadow voice cold old silent "
+    "open close walk run listen whisper remember forget find lose key map ship star planet "
+    "engine signal crew captain storm forest river bridge tower city gate guard stranger "
+    "slowly suddenly carefully behind beyond under above inside outside before after while"
+).split()
+
+
+class TextPool:
+    """
+    Page texts with realistic lengths (about `words` words, normally distributed).
+    Drawn from a pool of pre-built paragraphs, so generating a million pages stays fast.
+    """
+
+    def __init__(self, rng, words=80, size=2000):
+        self.rng = rng
+        self.paragraphs = []
+        for _ in range(size):
+            count = max(5, int(rng.gauss(words, words / 3)))
+            sentence = " ".join(rng.choice(WORDS) for _ in range(count))
+            self.paragraphs.append(sentence[0].upper() + sentence[1:] + ".")
+
+    def page(self, page_id):
+        return f"{self.rng.choice(self.paragraphs)} ({page_id})"
+
+    def choice(self):
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(2, 6))).capitalize()
+
+
+# --- Loading ---
+
+def _next_id(column):
+    return (db.session.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def _insert_many(table, rows):
+    for i in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(table), rows[i:i + INSERT_BATCH])
+
+
+def seed_synthetic(stories, pages, shapes, status="published", words=80, authors=1, seed=1, manifest=None):
+    """
+    Insert `stories` stories of `pages` pages each (one transaction per story), cycling through `shapes`.
+    Writes one topology line per story to `manifest` (an open text file) if given. Returns totals.
+    """
+    rng = random.Random(seed)
+    text = TextPool(rng, words)
+    story_id = _next_id(Story.id)
+    page_base = _next_id(Page.id)
+    totals = {"stories": 0, "pages": 0, "choices": 0}
+
+    for n in range(stories):
+        shape = shapes[n % len(shapes)]
+        local_pages, local_edges, local_start = SHAPES[shape](pages, rng)
+        page_ids = {i: page_base + i for i in local_pages}
+        start_page_id = page_ids[local_start]
+        edges = [(page_ids[i], page_ids[j]) for i, j in local_edges]
+
+        values = {
+            "id": story_id,
+            "title": f"{shape.replace('_', ' ').title()} #{story_id}",
+            "description": text.choice(),
+            "status": status,
+            "start_page_id": start_page_id,
+            "author_id": 1 + n % authors,
+            "revision": 1,
+        }
+        if status == "published":
+            report = analyze({page_ids[i]: e for i, e in local_pages.items()}, edges, start_page_id)
+            values.update({k: report[k] for k in ("page_count", "ending_count", "max_depth", "path_count")})
+        db.session.execute(insert(Story.__table__), [values])
+
+        _insert_many(Page.__table__, [
+            {
+                "id": page_id, "story_id": story_id, "text": text.page(page_id),
+                "is_ending": local_pages[i], "ending_label": f"Ending {page_id}" if local_pages[i] else None,
+            }
+            for i, page_id in page_ids.items()
+        ])
+        _insert_many(Choice.__table__, [
+            {"page_id": src, "text": text.choice(), "next_page_id": dst} for src, dst in edges
+        ])
+        search.index_story_bulk(story_id)
+        db.session.commit()
+
+        if manifest is not None:
+            adjacency = {page_id: [] for page_id in page_ids.values()}
+            for src, dst in edges:
+                adjacency[src].append(dst)
+            manifest.write(json.dumps({
+                "story_id": story_id, "shape": shape, "start_page_id": start_page_id,
+                "choices": {str(page_id): targets for page_id, targets in adjacency.items()},
+            }) + "\n")
+
+        totals["stories"] += 1
+        totals["pages"] += len(page_ids)
+        totals["choices"] += len(edges)
+        story_id += 1
+        page_base += len(page_ids)
+
+    return totals
+
+
+@click.command("seed-synthetic")
+@click.option("--stories", default=10, show_default=True, help="Number of stories")
+@click.option("--pages", default=1000, show_default=True, help="Pages per story")
+@click.option("--shape", "shapes", multiple=True, default=["mixed"], show_default=True,
+              type=click.Choice(list(SHAPES) + ["mixed"]), help="Graph shape (repeatable; mixed = all of them in turn)")
+@click.option("--status", default="published", show_default=True, type=click.Choice(["published", "draft"]))
+@click.option("--words", default=80, show_default=True, help="Average words per page")
+@click.option("--authors", default=1, show_default=True, help="Spread stories over author ids 1..N")
+@click.option("--seed", default=1, show_default=True, help="Random seed (same seed, same data)")
+@click.option("--manifest", type=click.File("w"), help="Write story topologies here (NDJSON) for Django's seed_history")
+@with_appcontext
+def seed_synthetic_command(stories, pages, shapes, status, words, authors, seed, manifest):
+    """Bulk-load synthetic stories for profiling."""
+    if "mixed" in shapes:
+        shapes = list(SHAPES)
+    started = time.perf_counter()
+    totals = seed_synthetic(stories, pages, list(shapes), status, words, max(1, authors), seed, manifest)
+    seconds = time.perf_counter() - started
+    click.echo(
+        f"Inserted {totals['stories']} stories, {totals['pages']} pages, {totals['choices']} choices "
+        f"in {seconds:.1f}s ({totals['pages'] / seconds:.0f} pages/s)"
+    )
@@ -0,0 +1,134 @@
+import json
+from sqlalchemy import select, func
+from .extensions import db
+from .models import Story, Page, Choice
+
+# Streamed story structure (topology + optional text) for the builder, exports and very large stories.
+# Rows are read from the DB in yield_per batches and written to the client as they come,
+# so memory stays flat whatever the number of pages. If the story is already compiled in the
+# cache, records come from that snapshot instead (no DB access).
+#
+# text=none     -> ids, ending flags and edges only
+# text=snippet  -> + page text cut server-side to `snippet` characters (SQL substr, full text never leaves the DB)
+# text=full     -> + full page and choice text
+
+TEXT_MODES = ("none", "snippet", "full")
+FORMATS = ("json", "ndjson")
+SNIPPET_LENGTH = 60
+MAX_SNIPPET_LENGTH = 1000
+BATCH_SIZE = 1000        # Rows per DB fetch
+CHUNK_SIZE = 64 * 1024   # Characters per chunk written to the client
+ELLIPSIS = "…"
+
+_dumps = json.JSONEncoder().encode  # json.dumps without the per-call keyword handling
+
+
+def story_header(story_id):
+    """Story metadata for the stream, or None if the story doesn't exist (1 query)."""
+    return db.session.execute(
+        select(Story.id, Story.title, Story.description, Story.status, Story.author_id,
+               Story.start_page_id, Story.revision).where(Story.id == story_id)
+    ).first()
+
+
+def _snippet(text, length):
+    return text if len(text) <= length else text[:length] + ELLIPSIS
+
+
+def _page_record(story_id, page_id, is_ending, ending_label, text, mode, length):
+    record = {"id": page_id, "story_id": story_id, "is_ending": bool(is_ending), "ending_label": ending_label}
+    if mode == "snippet":
+        record["text"] = _snippet(text, length)
+    elif mode == "full":
+        record["text"] = text
+    return record
+
+
+def _choice_record(choice_id, page_id, next_page_id, text, mode):
+    record = {"id": choice_id, "page_id": page_id, "next_page_id": next_page_id}
+    if mode != "none":
+        record["text"] = text
+    return record
+
+
+def iter_pages(story_id, mode, length=SNIPPET_LENGTH, compiled=None):
+    if compiled is not None:
+        for p in compiled.pages.values():
+            yield _page_record(story_id, p.id, p.is_ending, p.ending_label, p.text, mode, length)
+        return
+
+    if mode == "snippet":
+        text = func.substr(Page.text, 1, length + 1)  # One extra character tells us whether it was cut
+    elif mode == "full":
+        text = Page.text
+    else:
+        text = None
+    columns = [Page.id, Page.is_ending, Page.ending_label] + ([text.label("text")] if text is not None else [])
+    rows = db.session.execute(
+        select(*columns).where(Page.story_id == story_id).order_by(Page.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for row in rows:
+        yield _page_record(story_id, row.id, row.is_ending, row.ending_label, row.text if text is not None else None, mode, length)
+
+
+def iter_choices(story_id, mode, compiled=None):
+    if compiled is not None:
+        for page_id, edges in compiled.choices.items():
+            for c in edges:
+                yield _choice_record(c.id, page_id, c.next_page_id, c.text, mode)
+        return
+
+    columns = [Choice.id, Choice.page_id, Choice.next_page_id] + ([Choice.text] if mode != "none" else [])
+    rows = db.session.execute(
+        select(*columns).join(Page, Choice.page_id == Page.id).where(Page.story_id == story_id)
+        .order_by(Choice.page_id, Choice.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for row in rows:
+        yield _choice_record(row.id, row.page_id, row.next_page_id, row.text if mode != "none" else None, mode)
+
+
+# --- Encoders (generators of str) ---
+
+def _chunked(parts):
+    """Group many small strings into ~CHUNK_SIZE writes"""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _json_array(records):
+    yield "["
+    for i, record in enumerate(records):
+        yield ("," if i else "") + _dumps(record)
+    yield "]"
+
+
+def encode_json(head, pages, choices):
+    """{**head, "pages": [...], "choices": [...]}"""
+    def parts():
+        yield _dumps(head)[:-1]  # Drop the closing brace, the arrays follow
+        yield ', "pages": '
+        yield from _json_array(pages)
+        yield ', "choices": '
+        yield from _json_array(choices)
+        yield "}"
+    return _chunked(parts())
+
+
+def encode_ndjson(story, pages, choices):
+    """One JSON object per line: a "story" record, then every "page", then every "choice" """
+    def parts():
+        yield _dumps({"type": "story", **story}) + "\n"
+        for record in pages:
+            yield _dumps({"type": "page", **record}) + "\n"
+        for record in choices:
+            yield _dumps({"type": "choice", **record}) + "\n"
+    return _chunked(parts())
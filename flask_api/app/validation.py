@@ -0,0 +1,114 @@
+from collections import namedtuple
+from sqlalchemy import select
+from .extensions import db
+from .models import Story, Page, Choice
+from .cache import story_cache, validation_cache
+
+# Publishing rules, checked on the story's topology only (page ids, ending flags, choice edges).
+# Page text is never loaded, and every check is a single pass over pages + choices: O(V + E).
+
+# pages: {page_id: is_ending}, edges: [(page_id, next_page_id), ...]
+Topology = namedtuple("Topology", ["story_id", "revision", "start_page_id", "pages", "edges"])
+
+
+def load_topology(story_id, cached=True):
+    """
+    Topology of a story, from the compiled cache if present, else from 1 id-only query. None if missing.
+    Inside a write pass cached=False: the cached snapshot predates the change (and may come from another worker).
+    """
+    compiled = story_cache.peek(story_id) if cached else None
+    if compiled is not None:
+        return Topology(
+            story_id=compiled.id,
+            revision=compiled.revision,
+            start_page_id=compiled.start_page_id,
+            pages={p.id: p.is_ending for p in compiled.pages.values()},
+            edges=[(page_id, c.next_page_id) for page_id, edges in compiled.choices.items() for c in edges],
+        )
+
+    rows = db.session.execute(
+        select(Story.revision, Story.start_page_id, Page.id.label("page_id"), Page.is_ending,
+               Choice.id.label("choice_id"), Choice.next_page_id)
+        .select_from(Story)
+        .outerjoin(Page, Page.story_id == Story.id)
+        .outerjoin(Choice, Choice.page_id == Page.id)
+        .where(Story.id == story_id)
+        .order_by(Page.id, Choice.id)
+    ).all()
+    if not rows:
+        return None
+
+    pages = {}
+    edges = []
+    for row in rows:
+        if row.page_id is None:
+            continue
+        pages[row.page_id] = bool(row.is_ending)
+        if row.choice_id is not None:
+            edges.append((row.page_id, row.next_page_id))
+
+    return Topology(story_id, rows[0].revision, rows[0].start_page_id, pages, edges)
+
+
+def story_revision(story_id):
+    """Current revision (no DB access if the story is cached). None if the story doesn't exist."""
+    compiled = story_cache.peek(story_id)
+    if compiled is not None:
+        return compiled.revision
+    return db.session.execute(select(Story.revision).where(Story.id == story_id)).scalar()
+
+
+def validate_topology(topology):
+    """List of human readable errors; empty means the story can be published."""
+    errors = []
+
+    if not topology.edges:
+        errors.append("Story is empty (no choices found).")
+        return errors
+
+    # Group edges by source page in one pass
+    out_edges = {}
+    for page_id, next_page_id in topology.edges:
+        out_edges.setdefault(page_id, []).append(next_page_id)
+
+    for page_id, is_ending in topology.pages.items():
+        targets = out_edges.get(page_id, [])
+        count = len(targets)
+
+        if is_ending:
+            # ENDING PAGE RULES
+            if count > 0:
+                errors.append(f"Page {page_id} is marked as an Ending but has {count} choices. Endings must have 0 choices.")
+        else:
+            # BRANCHING PAGE RULES
+            if count == 0:
+                errors.append(f"Page {page_id} is not an Ending, but has 0 choices. It is a dead end.")
+            elif count != 2:
+                errors.append(f"Page {page_id} has {count} choices. Must have exactly 2.")
+
+        # Referential Integrity (Dangling Pointers)
+        for next_page_id in targets:
+            if next_page_id is None:
+                # Target page was deleted (next_page_id is ON DELETE SET NULL)
+                errors.append(f"Page {page_id} has a choice with no target page.")
+            elif next_page_id not in topology.pages:
+                errors.append(f"Page {page_id} has a choice pointing to non-existent Page {next_page_id}.")
+
+    return errors
+
+
+def validate_story(story_id):
+    """
+    Validation report for the current revision of a story, cached per (story_id, revision).
+    Returns None if the story doesn't exist.
+    """
+    revision = story_revision(story_id)
+    if revision is None:
+        return None
+
+    def compute():
+        topology = load_topology(story_id)
+        errors = validate_topology(topology)
+        return {"story_id": story_id, "revision": topology.revision, "valid": not errors, "errors": errors}
+
+    return validation_cache.get_or_compute(story_id, revision, compute)
@@ -9,5 +9,27 @@ class Config:
     SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(BASE_DIR, "db.sqlite3")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Run pending DB migrations when the app starts (set to False to run `flask db upgrade` yourself)
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'True') == 'True'
+
     # API SECURITY
-    API_KEY = os.getenv('FLASK_API_KEY')
\ No newline at end of file
+    API_KEY = os.getenv('FLASK_API_KEY')
+
+    # Max number of compiled stories kept in memory (LRU)
+    STORY_CACHE_SIZE = int(os.getenv('STORY_CACHE_SIZE', 256))
+    # Seconds a cached story is served before checking its revision again (1 primary key lookup).
+    # Bounds how long other worker processes keep serving a story after a write; 0 checks on every read
+    STORY_CACHE_REVALIDATE = float(os.getenv('STORY_CACHE_REVALIDATE', 1))
+
+    # HTTP caching: how long (seconds) clients may reuse published content without revalidating
+    PUBLISHED_MAX_AGE = int(os.getenv('PUBLISHED_MAX_AGE', 60))
+
+    # SEARCH: also index page text (not just title/description)
+    SEARCH_INDEX_PAGE_TEXT = os.getenv('SEARCH_INDEX_PAGE_TEXT', 'True') == 'True'
+
+    # Max pages in one POST /stories/import
+    IMPORT_MAX_PAGES = int(os.getenv('IMPORT_MAX_PAGES', 500000))
+
+
+    # Request / SQL metrics on GET /metrics (Prometheus text format)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
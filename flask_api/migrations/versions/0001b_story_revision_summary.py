@@ -0,0 +1,41 @@
+"""Story revision counter and the graph summary stored at publish time
+
+Revision ID: 0001b_story_revision_summary
+Revises: 0001_baseline
+Create Date: 2026-10-17 15:40:52.106338
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001b_story_revision_summary'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    sa.Column('revision', sa.Integer(), nullable=False, server_default='1'),
+    sa.Column('page_count', sa.Integer(), nullable=True),
+    sa.Column('ending_count', sa.Integer(), nullable=True),
+    sa.Column('max_depth', sa.Integer(), nullable=True),
+    sa.Column('path_count', sa.Text(), nullable=True),
+]
+
+
+def upgrade():
+    # Databases made by db.create_all() after these columns were added to the model already have them
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('story')}
+
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        for column in COLUMNS:
+            if column.name not in existing:
+                batch_op.add_column(column)
+
+
+def downgrade():
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
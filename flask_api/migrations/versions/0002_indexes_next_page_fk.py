@@ -0,0 +1,50 @@
+"""Indexes on the hot lookup columns and a foreign key on choice.next_page_id
+
+Revision ID: 0002_indexes_next_page_fk
+Revises: 0001b_story_revision_summary
+Create Date: 2026-10-17 16:08:26.479288
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_indexes_next_page_fk'
+down_revision = '0001b_story_revision_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Dangling targets (page deleted before the foreign key existed) would fail the constraint
+    op.execute(
+        "UPDATE choice SET next_page_id = NULL "
+        "WHERE next_page_id IS NOT NULL AND next_page_id NOT IN (SELECT id FROM page)"
+    )
+
+    with op.batch_alter_table('choice', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_choice_next_page_id'), ['next_page_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_choice_page_id'), ['page_id'], unique=False)
+        batch_op.create_foreign_key('fk_choice_next_page_id_page', 'page', ['next_page_id'], ['id'], ondelete='SET NULL')
+
+    with op.batch_alter_table('page', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_page_story_id'), ['story_id'], unique=False)
+
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_story_author_id'), ['author_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_story_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('story', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_story_status'))
+        batch_op.drop_index(batch_op.f('ix_story_author_id'))
+
+    with op.batch_alter_table('page', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_page_story_id'))
+
+    with op.batch_alter_table('choice', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_choice_next_page_id_page', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_choice_page_id'))
+        batch_op.drop_index(batch_op.f('ix_choice_next_page_id'))
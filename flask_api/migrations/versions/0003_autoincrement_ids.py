@@ -0,0 +1,40 @@
+"""Never reuse story and page ids (SQLite AUTOINCREMENT)
+
+Revision ID: 0003_autoincrement_ids
+Revises: 0002_indexes_next_page_fk
+Create Date: 2026-10-17 18:12:40.518207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_autoincrement_ids'
+down_revision = '0002_indexes_next_page_fk'
+branch_labels = None
+depends_on = None
+
+
+# Without AUTOINCREMENT SQLite hands out max(id) + 1, so deleting the newest story and creating one
+# gives the new story the old id at revision 1: same ETag / version, and clients keep the deleted story.
+TABLES = ['story', 'page']
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return  # Sequences elsewhere never go back
+
+    # Foreign keys are off while migrating (see env.py): page and choice keep pointing at the rebuilt tables
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
@@ -1,6 +1,8 @@
 from app import create_app
 from app.extensions import db
 from app.models import Story, Page, Choice
+from app.search import rebuild_index
+from app.analysis import store_analysis
 
 app = create_app()
 
@@ -18,7 +20,7 @@ def seed_database():
     # We set IDs explicitly to match mock data structure
     story1 = Story(
         id=1,
-        title="The Haunted Mansion (16 endings)",
+        title="The Haunted Mansion",
         description="Explore a mysterious mansion and uncover its secrets",
         status="published",
         start_page_id=1,
@@ -26,7 +28,7 @@ def seed_database():
     )
     story2 = Story(
         id=2,
-        title="Space Adventure (8 endings)",
+        title="Space Adventure",
         description="Journey through the cosmos",
         status="published",
         start_page_id=501,
@@ -441,6 +443,14 @@ def seed_database():
 
     # Commit the transaction
     db.session.commit()
+
+    # Ending / path counts shown in listings (normally computed when a story is published)
+    for story in (story1, story2):
+        store_analysis(story)
+    db.session.commit()
+
+    # Bulk inserts bypass the routes, so index everything in one go
+    rebuild_index()
     print("Database seeded successfully!")
 
 if __name__ == "__main__":
@@ -449,8 +459,7 @@ if __name__ == "__main__":
         # Team note: uncomment next line to WIPE and reset the DB every time we restart
         # db.drop_all()
         
-        # Create tables if they don't exist (handled by factory in __init__.py, but safe here)
-        db.create_all()
+        # Tables are created / upgraded by the factory (migrations, see flask_api/migrations)
         
         # Run seed
         seed_database()
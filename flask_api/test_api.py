@@ -0,0 +1,735 @@
+import json
+import re
+import sqlite3
+import pytest
+from sqlalchemy import event, inspect, text
+from config import Config
+from app import create_app
+from app import analysis, search
+from app.analysis import analyze
+from app.cache import story_cache
+from app.extensions import db
+from app.models import Story, Page, Choice
+
+API_KEY = "test-key"
+HEADERS = {"X-API-KEY": API_KEY}
+
+
+class MemoryConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    API_KEY = API_KEY
+    AUTO_MIGRATE = True
+
+
+def seed():
+    """Story 1 (published): 1 -> 2 | 3, both endings. Story 2: draft by another author."""
+    db.session.add_all([
+        Story(id=1, title="The Haunted Mansion", description="A mysterious mansion", status="published", start_page_id=1, author_id=1),
+        Story(id=2, title="Space Adventure", description="Journey through the cosmos", status="draft", start_page_id=4, author_id=2),
+        Page(id=1, story_id=1, text="You stand before a dark mansion."),
+        Page(id=2, story_id=1, text="The door creaks open.", is_ending=True, ending_label="Inside"),
+        Page(id=3, story_id=1, text="You run away.", is_ending=True, ending_label="Coward"),
+        Page(id=4, story_id=2, text="Countdown.", is_ending=True, ending_label="Liftoff"),
+        Choice(id=1, page_id=1, text="Enter", next_page_id=2),
+        Choice(id=2, page_id=1, text="Flee", next_page_id=3),
+    ])
+    db.session.commit()
+    search.rebuild_index()
+
+
+@pytest.fixture
+def app():
+    app = create_app(MemoryConfig)
+    with app.app_context():
+        seed()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def sql(app):
+    """Every statement sent to the database while the test runs, as (statement, parameters)"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", capture)
+
+
+##############################  Story bundle  ##############################
+
+def test_bundle_has_the_whole_story(client):
+    response = client.get("/stories/1/bundle")
+
+    assert response.status_code == 200
+    bundle = response.get_json()
+    assert bundle["version"] == "1-1"
+    assert bundle["story"] == {
+        "id": 1, "title": "The Haunted Mansion", "description": "A mysterious mansion", "status": "published",
+        "author_id": 1, "start_page_id": 1, "revision": 1,
+    }
+    assert sorted(bundle["pages"]) == ["1", "2", "3"]
+    assert bundle["pages"]["3"] == {"text": "You run away.", "is_ending": True, "ending_label": "Coward"}
+    assert bundle["choices"] == {"1": [
+        {"id": 1, "text": "Enter", "next_page_id": 2},
+        {"id": 2, "text": "Flee", "next_page_id": 3},
+    ]}
+    assert client.get("/stories/99/bundle").status_code == 404
+
+
+##############################  Compiled story cache  ##############################
+
+def test_writes_invalidate_the_compiled_story(client):
+    assert client.get("/pages/2").get_json()["text"] == "The door creaks open."
+
+    client.patch("/pages/2", json={"text": "The door swings open."}, headers=HEADERS)
+    assert client.get("/pages/2").get_json()["text"] == "The door swings open."
+
+    client.put("/stories/1", json={"title": "The Mansion"}, headers=HEADERS)
+    assert client.get("/stories/1").get_json()["title"] == "The Mansion"
+
+    page_id = client.post("/stories/1/pages", json={"text": "A secret room."}, headers=HEADERS).get_json()["id"]
+    choice_id = client.post("/pages/2/choices", json={"text": "Look around", "next_page_id": page_id}, headers=HEADERS).get_json()["id"]
+    assert client.get("/stories/1/bundle").get_json()["choices"]["2"] == [
+        {"id": choice_id, "text": "Look around", "next_page_id": page_id}
+    ]
+
+    client.delete(f"/choices/{choice_id}", headers=HEADERS)
+    assert client.get(f"/pages/{page_id}").get_json()["text"] == "A secret room."
+    assert client.get("/pages/2").get_json()["choices"] == []
+
+
+def test_cache_evicts_least_recently_used(client, monkeypatch):
+    story_cache.clear()
+    monkeypatch.setattr(story_cache, "max_stories", 1)
+
+    client.get("/stories/1")
+    client.get("/stories/2")
+    client.get("/stories/2")
+
+    stats = client.get("/cache/stats").get_json()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 2, 1)
+    assert story_cache.peek(1) is None and story_cache.peek(2) is not None
+
+
+def test_writes_from_other_workers_are_picked_up(client, sql, monkeypatch):
+    client.get("/stories/1")
+    # Another worker process commits a change: our cache isn't told
+    db.session.execute(text("UPDATE story SET title = 'Renamed', revision = revision + 1 WHERE id = 1"))
+    db.session.commit()
+    sql.clear()
+
+    assert client.get("/stories/1").get_json()["title"] == "The Haunted Mansion"  # Trusted for a while
+    assert sql == []
+
+    monkeypatch.setattr(story_cache, "revalidate_after", 0)
+    assert client.get("/stories/1").get_json()["title"] == "Renamed"
+    assert len(sql) == 2  # Revision check, then recompile
+
+    sql.clear()
+    assert client.get("/pages/2").status_code == 200
+    assert len(sql) == 1  # Unchanged: the revision check only
+    assert story_cache.stats()["revalidations"] == 2
+
+
+##############################  HTTP caching  ##############################
+
+@pytest.mark.parametrize("url", ["/stories/1", "/stories/1/start", "/stories/1/bundle", "/stories/1/structure", "/pages/2"])
+def test_read_routes_revalidate_with_etag(client, url):
+    first = client.get(url)
+    etag = first.headers["ETag"]
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == etag
+
+    client.patch("/pages/3", json={"text": "You flee."}, headers=HEADERS)  # Any write to the story
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_cache_control_depends_on_status(client):
+    assert client.get("/stories/1").headers["Cache-Control"] == f"public, max-age={MemoryConfig.PUBLISHED_MAX_AGE}"
+    assert client.get("/stories/2").headers["Cache-Control"] == "private, no-cache"
+
+
+def test_story_list_etag_follows_revisions(client):
+    etag = client.get("/stories?status=published").headers["ETag"]
+    assert client.get("/stories?status=published", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put("/stories/1", json={"description": "Spooky"}, headers=HEADERS)
+
+    assert client.get("/stories?status=published", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_recreated_story_does_not_reuse_the_etag(client):
+    etag = client.get("/stories/2").headers["ETag"]  # Newest story
+    page_etag = client.get("/pages/4").headers["ETag"]  # Newest page
+    assert client.delete("/stories/2", headers=HEADERS).status_code == 200
+
+    story_id = client.post("/stories", json={"title": "Space Adventure"}, headers=HEADERS).get_json()["id"]
+    page_id = client.post(f"/stories/{story_id}/pages", json={"text": "Countdown."}, headers=HEADERS).get_json()["id"]
+
+    assert story_id == 3 and page_id > 4  # Ids are never handed out twice
+    assert client.get(f"/stories/{story_id}", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/stories/2", headers={"If-None-Match": etag}).status_code == 404
+    assert client.get("/pages/4", headers={"If-None-Match": page_etag}).status_code == 404
+
+
+##############################  Story listing  ##############################
+
+def test_keyset_pagination_walks_every_story(client):
+    db.session.add_all(Story(title=f"Extra {i}", status="published") for i in range(5))
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        url = "/stories?status=published&limit=2&fields=title" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url).get_json()
+        assert page["total"] == 6
+        assert len(page["items"]) <= 2
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert [s["id"] for s in seen] == [1, 3, 4, 5, 6, 7]
+    assert seen[0] == {"id": 1, "title": "The Haunted Mansion"}
+
+
+def test_listing_fields_and_count(client):
+    assert client.get("/stories?author_id=2&fields=status").get_json() == [{"id": 2, "status": "draft"}]
+    assert client.get("/stories?limit=1&count=0").get_json()["total"] is None
+
+    response = client.get("/stories?fields=title,secret")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Unknown fields: secret"
+
+
+##############################  Search  ##############################
+
+def fts_rows(table):
+    return [row[0] for row in db.session.execute(text(f"SELECT rowid FROM {table} ORDER BY rowid"))]
+
+
+def search_ids(client, q, **params):
+    return [s["id"] for s in client.get("/stories/search", query_string={"q": q, **params}).get_json()]
+
+
+def test_search_ranks_title_over_page_text(client):
+    for title in ("Gardens", "Rivers", "Forests"):
+        client.post("/stories", json={"title": title}, headers=HEADERS)
+    client.post("/stories", json={"title": "Harbour", "start_text": "A lighthouse blinks far away."}, headers=HEADERS)
+    client.post("/stories", json={"title": "The Lighthouse", "description": "Storm night"}, headers=HEADERS)
+
+    assert search_ids(client, "lighthouse") == [7, 6]  # Title hit, then page text hit
+    assert search_ids(client, "lightho") == [7, 6]     # Last word is a prefix (type-ahead)
+    assert search_ids(client, "cosmos") == []          # Story 2 is a draft
+    assert search_ids(client, "") == []
+
+    page = client.get("/stories/search?q=lighthouse&limit=1").get_json()
+    assert ([s["id"] for s in page["items"]], page["next_offset"]) == ([7], 1)
+    page = client.get("/stories/search?q=lighthouse&limit=1&offset=1").get_json()
+    assert ([s["id"] for s in page["items"]], page["next_offset"]) == ([6], None)
+
+
+def test_writes_keep_the_index_in_sync(client):
+    client.patch("/pages/3", json={"text": "You hide in the greenhouse."}, headers=HEADERS)
+    assert search_ids(client, "greenhouse") == [1]
+
+    client.delete("/pages/3", headers=HEADERS)
+    assert search_ids(client, "greenhouse") == []
+
+    client.patch("/stories/1", json={"title": "The Orchard"}, headers=HEADERS)
+    assert search_ids(client, "orchard") == [1]
+    assert search_ids(client, "haunted") == []
+
+
+def test_deleting_story_unindexes_its_pages(client, sql):
+    assert fts_rows("page_fts") == [1, 2, 3, 4]
+
+    assert client.delete("/stories/1", headers=HEADERS).status_code == 200
+
+    assert fts_rows("story_fts") == [2]
+    assert fts_rows("page_fts") == [4]
+    statement, parameters = next((s, p) for s, p in sql if s.startswith("DELETE FROM page_fts"))
+    plan = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    assert "SCAN page_fts VIRTUAL TABLE INDEX 0:=" in [row[3] for row in plan]  # rowid lookups, not a scan
+
+
+##############################  Validation  ##############################
+
+def test_validate_reports_publishing_errors(client):
+    assert client.get("/stories/1/validate").get_json() == {"story_id": 1, "revision": 1, "valid": True, "errors": []}
+    assert client.get("/stories/2/validate").get_json()["errors"] == ["Story is empty (no choices found)."]
+    assert client.get("/stories/99/validate").status_code == 404
+
+    client.patch("/pages/2", json={"is_ending": False}, headers=HEADERS)
+    client.post("/pages/3/choices", json={"text": "Come back", "next_page_id": 1}, headers=HEADERS)
+
+    report = client.get("/stories/1/validate").get_json()
+    assert not report["valid"]
+    assert report["errors"] == [
+        "Page 2 is not an Ending, but has 0 choices. It is a dead end.",
+        "Page 3 is marked as an Ending but has 1 choices. Endings must have 0 choices.",
+    ]
+
+
+def test_validation_is_cached_per_revision(client):
+    client.get("/stories/1/validate")
+    client.get("/stories/1/validate")
+    client.patch("/pages/3", json={"text": "You flee."}, headers=HEADERS)
+    client.get("/stories/1/validate")
+
+    assert client.get("/cache/stats").get_json()["validation"] == {"size": 2, "hits": 1, "misses": 2}
+
+
+##############################  Graph analysis  ##############################
+
+def diamond_chain(n):
+    """n diamonds in a row (3n + 1 pages): every diamond doubles the number of paths, 2^n in total"""
+    pages = {i: False for i in range(3 * n + 1)}
+    pages[3 * n] = True
+    edges = []
+    for d in range(n):
+        top = 3 * d
+        edges += [(top, top + 1), (top, top + 2), (top + 1, top + 3), (top + 2, top + 3)]
+    return pages, edges
+
+
+def test_analysis_report(client):
+    report = client.get("/stories/1/analysis").get_json()
+
+    assert (report["page_count"], report["ending_count"], report["max_depth"]) == (3, 2, 1)
+    assert report["path_count"] == "2"
+    assert not report["has_cycles"] and report["unreachable_pages"] == []
+
+
+def test_huge_path_count_is_a_lower_bound():
+    assert analyze(*diamond_chain(10), 0)["path_count"] == "1024"
+
+    # 2^15000 has 4516 digits, past what str() converts
+    report = analyze(*diamond_chain(15000), 0)
+
+    assert report["path_count"] == ">=10^4515"
+    assert report["page_count"] == 45001
+
+
+def test_publish_stores_capped_path_count(client, monkeypatch):
+    monkeypatch.setattr(analysis, "PATH_COUNT_LIMIT", 2)  # Story 1 has 2 paths, story 2 has 1
+
+    assert client.patch("/stories/2", json={"status": "published"}, headers=HEADERS).status_code == 200
+    assert client.put("/stories/1", json={"status": "published"}, headers=HEADERS).status_code == 200
+
+    listing = client.get("/stories?fields=path_count").get_json()
+    assert listing == [{"id": 1, "path_count": ">=10^0"}, {"id": 2, "path_count": "1"}]
+
+
+def test_publish_analyzes_the_new_start_page(client):
+    client.get("/stories/1/bundle")  # Cached snapshot still starts on page 1
+
+    response = client.patch("/stories/1", json={"status": "published", "start_page_id": 2}, headers=HEADERS)
+    assert response.status_code == 200
+
+    listing = client.get("/stories?ids=1&fields=ending_count,max_depth,path_count").get_json()
+    assert listing == [{"id": 1, "ending_count": 1, "max_depth": 0, "path_count": "1"}]
+
+
+##############################  Batch lookups  ##############################
+
+def test_pages_by_ids(client, sql):
+    response = client.get("/pages?ids=4,2,999,2&fields=ending_label")
+
+    assert response.get_json() == [{"id": 2, "ending_label": "Inside"}, {"id": 4, "ending_label": "Liftoff"}]
+    assert len(sql) == 1
+    assert client.get("/pages?ids=").get_json() == []
+
+
+def test_stories_by_ids(client):
+    assert client.get("/stories?ids=2,1&fields=title").get_json() == [
+        {"id": 1, "title": "The Haunted Mansion"}, {"id": 2, "title": "Space Adventure"},
+    ]
+
+
+def test_bad_id_lists_are_rejected(client):
+    assert client.get("/pages?ids=1,two").status_code == 400
+    too_many = ",".join(str(i) for i in range(501))
+    assert client.get(f"/stories?ids={too_many}").get_json()["error"] == "At most 500 ids per request"
+
+
+##############################  Schema  ##############################
+
+def test_migrations_create_lookup_indexes(app):
+    inspector = inspect(db.engine)
+    indexed = {
+        (table, tuple(index["column_names"]))
+        for table in ("story", "page", "choice")
+        for index in inspector.get_indexes(table)
+    }
+    assert {
+        ("story", ("status",)), ("story", ("author_id",)), ("page", ("story_id",)),
+        ("choice", ("page_id",)), ("choice", ("next_page_id",)),
+    } <= indexed
+
+
+# What db.create_all() made before the schema was migration-managed
+BASELINE_SCHEMA = [
+    """CREATE TABLE story (
+        id INTEGER NOT NULL, title VARCHAR(100) NOT NULL, description VARCHAR(500), status VARCHAR(20),
+        start_page_id INTEGER, author_id INTEGER NOT NULL, PRIMARY KEY (id))""",
+    """CREATE TABLE page (
+        id INTEGER NOT NULL, story_id INTEGER NOT NULL, text TEXT NOT NULL, is_ending BOOLEAN,
+        ending_label VARCHAR(100), PRIMARY KEY (id), FOREIGN KEY(story_id) REFERENCES story (id))""",
+    """CREATE TABLE choice (
+        id INTEGER NOT NULL, page_id INTEGER NOT NULL, text VARCHAR(200) NOT NULL, next_page_id INTEGER,
+        PRIMARY KEY (id), FOREIGN KEY(page_id) REFERENCES page (id))""",
+    "INSERT INTO story VALUES (1, 'Old story', 'From before migrations', 'published', 1, 1)",
+    "INSERT INTO page VALUES (1, 1, 'Once upon a time', 1, 'The End')",
+]
+
+
+def test_upgrade_from_baseline_database(tmp_path):
+    path = tmp_path / "baseline.sqlite3"
+    with sqlite3.connect(path) as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(statement)
+
+    class BaselineConfig(MemoryConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+
+    app = create_app(BaselineConfig)
+    with app.app_context():
+        client = app.test_client()
+        response = client.get("/stories?fields=title,page_count")
+
+        assert response.status_code == 200
+        assert response.get_json() == [{"id": 1, "title": "Old story", "page_count": None}]
+        assert client.get("/stories/1/bundle").get_json()["story"]["revision"] == 1
+        assert "ix_story_status" in {index["name"] for index in inspect(db.engine).get_indexes("story")}
+        assert db.session.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'story'")).scalar() == 1
+        assert db.session.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_deleting_target_page_clears_choice(client):
+    assert client.delete("/pages/3", headers=HEADERS).status_code == 200
+
+    assert db.session.get(Choice, 2).next_page_id is None
+    report = client.get("/stories/1/validate").get_json()
+    assert "Page 1 has a choice with no target page." in report["errors"]
+
+
+def test_deleting_target_page_refreshes_other_stories(client):
+    # Written before choice targets were checked: story 2 links into story 1
+    db.session.add(Choice(id=3, page_id=4, text="Wormhole", next_page_id=3))
+    db.session.commit()
+    before = client.get("/stories/2/bundle").get_json()
+    assert before["choices"]["4"][0]["next_page_id"] == 3
+
+    assert client.delete("/pages/3", headers=HEADERS).status_code == 200
+
+    after = client.get("/stories/2/bundle").get_json()
+    assert after["story"]["revision"] == before["story"]["revision"] + 1
+    assert after["choices"]["4"][0]["next_page_id"] is None
+
+
+def test_choice_target_must_be_in_same_story(client):
+    def create(next_page_id):
+        return client.post("/pages/1/choices", json={"text": "Go", "next_page_id": next_page_id}, headers=HEADERS)
+
+    assert create(999).status_code == 400
+    assert create(4).status_code == 400  # Page of story 2
+    assert create("2").status_code == 400
+    assert create(2).status_code == 201
+    assert create(None).status_code == 201
+
+
+##############################  Query plans  ##############################
+# A bare "SCAN <table>" means SQLite reads the whole table: a missing index on a hot path.
+
+FULL_SCAN = re.compile(r"^SCAN (story|page|choice)\b(?! USING COVERING INDEX)")
+
+HOT_READS = [
+    ("get", "/stories?status=published&limit=20", None),
+    ("get", "/stories?author_id=1&limit=20", None),
+    ("get", "/stories/1", None),
+    ("get", "/stories/1/bundle", None),
+    ("get", "/pages/2", None),
+    ("get", "/pages?ids=1,2,4", None),
+    ("get", "/stories/1/structure", None),
+    ("get", "/stories/1/validate", None),
+    ("post", "/stories/1/advance", {"from_page_id": 1, "choice_id": 2}),
+]
+
+
+@pytest.mark.parametrize("method, url, body", HOT_READS)
+def test_hot_reads_use_indexes(client, sql, method, url, body):
+    story_cache.clear()  # Force the DB path instead of the compiled graph
+
+    response = getattr(client, method)(url, json=body)
+
+    assert response.status_code == 200
+    selects = [(statement, parameters) for statement, parameters in sql if statement.lstrip().upper().startswith("SELECT")]
+    assert selects
+    for statement, parameters in selects:
+        plan = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        scans = [row[3] for row in plan if FULL_SCAN.match(row[3])]
+        assert not scans, f"{statement}\n-> {scans}"
+
+
+##############################  Query counts  ##############################
+# Read routes are served from the compiled story graph: 1 query to build it on a miss, 0 afterwards.
+
+ONE_QUERY_READS = [
+    "/stories/1",
+    "/stories/1/start",
+    "/stories/1/bundle",
+    "/stories/1/structure",
+    "/pages/2",
+]
+
+
+@pytest.mark.parametrize("url", ONE_QUERY_READS)
+def test_cold_read_is_one_query(client, sql, url):
+    story_cache.clear()
+
+    assert client.get(url).status_code == 200
+    assert len(sql) == 1
+
+    sql.clear()
+    assert client.get(url).status_code == 200
+    assert sql == []
+
+
+def test_page_of_cached_story_needs_no_query(client, sql):
+    story_cache.clear()
+    client.get("/stories/1/structure")
+    sql.clear()
+
+    response = client.get("/pages/3")
+
+    assert response.get_json()["ending_label"] == "Coward"
+    assert sql == []
+
+
+def test_advance_is_one_query(client, sql):
+    story_cache.clear()
+
+    response = client.post("/stories/1/advance", json={"from_page_id": 1, "choice_id": 1})
+
+    assert response.get_json()["page"]["id"] == 2
+    assert len(sql) == 1
+
+
+def test_unknown_page_is_one_query(client, sql):
+    story_cache.clear()
+
+    assert client.get("/pages/999").status_code == 404
+    assert len(sql) == 1
+
+
+##############################  Streamed structure  ##############################
+
+def test_structure_topology_only(client):
+    response = client.get("/stories/1/structure?text=none")
+
+    assert response.is_streamed
+    data = response.get_json()
+    assert data["start_page_id"] == 1
+    assert [p["id"] for p in data["pages"]] == [1, 2, 3]
+    assert "text" not in data["pages"][0] and "text" not in data["choices"][0]
+    assert [(c["page_id"], c["next_page_id"]) for c in data["choices"]] == [(1, 2), (1, 3)]
+
+
+def test_structure_snippets_are_cut_server_side(client):
+    data = client.get("/stories/1/structure?text=snippet&snippet=10").get_json()
+
+    assert data["pages"][0]["text"] == "You stand …"
+    assert data["pages"][2]["text"] == "You run aw…"
+
+
+def test_structure_ndjson_matches_cached_snapshot(client):
+    story_cache.clear()
+    streamed = client.get("/stories/1/structure?text=full&format=ndjson").get_data(as_text=True)
+    client.get("/stories/1")  # Compile: the next response is built from the snapshot
+    from_cache = client.get("/stories/1/structure?text=full&format=ndjson").get_data(as_text=True)
+
+    assert streamed == from_cache
+    records = [json.loads(line) for line in streamed.splitlines()]
+    assert [r["type"] for r in records] == ["story", "page", "page", "page", "choice", "choice"]
+
+
+def test_structure_stream_does_not_compile_story(client):
+    story_cache.clear()
+
+    client.get("/stories/1/structure?text=none").get_data()
+
+    assert story_cache.peek(1) is None
+
+
+def test_structure_stream_revalidates(client):
+    etag = client.get("/stories/1/structure?text=none").headers["ETag"]
+
+    assert client.get("/stories/1/structure?text=none", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/stories/99/structure?text=none").status_code == 404
+    assert client.get("/stories/1/structure?text=everything").status_code == 400
+
+
+##############################  Import / export  ##############################
+
+def graph_shape(doc):
+    """Pages and edges with ids replaced by positions, to compare a story with its re-imported copy"""
+    position = {p["id"]: i for i, p in enumerate(doc["pages"])}
+    pages = [(p["text"], p["is_ending"], p["ending_label"]) for p in doc["pages"]]
+    edges = sorted((position[c["page_id"]], position.get(c["next_page_id"]), c["text"]) for c in doc["choices"])
+    return pages, edges, position[doc["story"]["start_page_id"]]
+
+
+def test_export_import_round_trip(client):
+    exported = client.get("/stories/1/export").get_json()
+
+    response = client.post("/stories/import", json=exported, headers=HEADERS)
+
+    assert response.status_code == 201
+    report = response.get_json()
+    assert (report["pages"], report["choices"]) == (3, 2)
+    copy = client.get(f"/stories/{report['id']}/export").get_json()
+    assert copy["story"]["title"] == "The Haunted Mansion"
+    assert copy["story"]["status"] == "published"
+    assert graph_shape(copy) == graph_shape(exported)
+    assert client.get(f"/stories/{report['id']}/validate").get_json()["valid"]
+
+
+def test_import_ndjson_with_local_ids(client):
+    lines = [
+        {"type": "story", "title": "Tiny", "start_page_id": "start"},
+        {"type": "page", "id": "start", "text": "Begin"},
+        {"type": "page", "id": "end", "text": "Fin", "is_ending": True, "ending_label": "The End"},
+        {"type": "choice", "page_id": "start", "next_page_id": "end", "text": "Go"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+
+    response = client.post("/stories/import", data=body, content_type="application/x-ndjson", headers=HEADERS)
+
+    assert response.status_code == 201
+    report = response.get_json()
+    page = client.get(f"/pages/{report['start_page_id']}").get_json()
+    assert page["text"] == "Begin"
+    assert page["story_status"] == "draft"
+    assert client.get(f"/pages/{page['choices'][0]['next_page_id']}").get_json()["ending_label"] == "The End"
+
+
+def test_bad_import_writes_nothing(client):
+    doc = {
+        "story": {"title": "Broken"},
+        "pages": [{"id": 1, "text": "Only page"}],
+        "choices": [{"page_id": 1, "next_page_id": 2, "text": "Nowhere"}],
+    }
+
+    response = client.post("/stories/import", json=doc, headers=HEADERS)
+
+    assert response.status_code == 400
+    assert "unknown page" in response.get_json()["error"]
+    assert db.session.query(Story).count() == 2
+    assert client.post("/stories/import", json=doc).status_code == 401
+
+
+@pytest.mark.parametrize("pages, choices", [
+    (["not a page"], []),
+    ([{"id": 1, "text": "Only page"}], [42]),
+    ({"id": 1, "text": "Only page"}, []),
+])
+def test_import_rejects_records_that_are_not_objects(client, pages, choices):
+    doc = {"story": {"title": "Odd"}, "pages": pages, "choices": choices}
+
+    response = client.post("/stories/import", json=doc, headers=HEADERS)
+
+    assert response.status_code == 400
+    assert "must be a JSON object" in response.get_json()["error"]
+    assert db.session.query(Story).count() == 2
+
+
+def test_suspended_export_imports_as_draft(client):
+    client.patch("/stories/1", json={"status": "suspended"}, headers=HEADERS)
+    exported = client.get("/stories/1/export").get_json()
+
+    response = client.post("/stories/import", json=exported, headers=HEADERS)
+
+    assert response.status_code == 201
+    assert client.get(f"/stories/{response.get_json()['id']}").get_json()["status"] == "draft"
+
+
+##############################  Synthetic data  ##############################
+
+def test_seed_synthetic(app, client, tmp_path):
+    manifest = tmp_path / "stories.ndjson"
+
+    result = app.test_cli_runner().invoke(args=[
+        "seed-synthetic", "--stories", "4", "--pages", "50", "--shape", "mixed", "--manifest", str(manifest),
+    ])
+
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in manifest.read_text().splitlines()]
+    assert [line["shape"] for line in lines] == ["binary_tree", "layered_dag", "chain", "with_cycles"]
+    assert db.session.query(Page).count() == 4 + 4 * 50
+    chain = client.get(f"/stories/{lines[2]['story_id']}/analysis").get_json()
+    assert (chain["page_count"], chain["ending_count"], chain["max_depth"]) == (50, 1, 49)
+
+
+##############################  Metrics  ##############################
+
+def scrape(client):
+    """/metrics as {sample name with labels: value}"""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_per_route(client):
+    story_cache.clear()
+    client.get("/stories/1")
+    client.get("/stories/1")
+    client.get("/stories/99")
+    client.get("/nowhere")
+
+    samples = scrape(client)
+
+    route = 'method="GET",route="/stories/<int:story_id>"'
+    assert samples[f'nahb_http_requests_total{{{route},status="200"}}'] == 2
+    assert samples[f'nahb_http_requests_total{{{route},status="404"}}'] == 1
+    assert samples['nahb_http_requests_total{method="GET",route="unmatched",status="404"}'] == 1
+    assert samples[f'nahb_http_request_duration_seconds_count{{{route}}}'] == 3
+    assert samples[f'nahb_http_request_duration_seconds_bucket{{{route},le="+Inf"}}'] == 3
+    assert samples[f'nahb_http_response_bytes_total{{{route}}}'] > 0
+    # Cold read: 1 compile query; warm read: none; missing story: 1 query
+    assert samples['nahb_sql_statements_total{route="/stories/<int:story_id>"}'] == 2
+    assert samples['nahb_sql_seconds_total{route="/stories/<int:story_id>"}'] > 0
+    assert samples['nahb_cache_hits_total{cache="story"}'] == 1
+    assert samples['nahb_http_requests_in_flight'] == 1  # The scrape itself
+
+
+def test_metrics_count_streamed_and_request_bytes(client):
+    body = client.get("/stories/1/structure?text=full&format=ndjson").get_data()
+    client.patch("/pages/2", json={"text": "The door swings open."}, headers=HEADERS)
+
+    samples = scrape(client)
+
+    assert samples['nahb_http_response_bytes_total{method="GET",route="/stories/<int:story_id>/structure"}'] == len(body)
+    assert samples['nahb_http_request_bytes_total{method="PATCH",route="/pages/<int:page_id>"}'] > 0